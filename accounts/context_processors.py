@@ -0,0 +1,22 @@
+from .permissions import get_access
+
+
+def user_menu(request):
+    """
+    Role-based sidebar menu and permission flags for templates
+    """
+    if not hasattr(request, 'user') or not request.user.is_authenticated:
+        return {}
+    
+    access = get_access(request)
+    menu = access.menu
+    active = max(
+        (item['url'] for item in menu if request.path.startswith(item['url'])),
+        key=len,
+        default=None,
+    )
+    return {
+        'access': access,
+        'menu': menu,
+        'active_menu_url': active,
+    }
@@ -0,0 +1,32 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib import messages
+from django.shortcuts import redirect
+
+from .permissions import aget_access, get_access
+
+
+def role_required(permission, redirect_to='dashboard'):
+    """
+    Allow the view only for roles holding ``permission`` in the role matrix.
+    Works on sync and async views.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _async_wrapped(request, *args, **kwargs):
+                if permission not in await aget_access(request):
+                    messages.error(request, 'Access denied')
+                    return redirect(redirect_to)
+                return await view_func(request, *args, **kwargs)
+            return markcoroutinefunction(_async_wrapped)
+
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if permission not in get_access(request):
+                messages.error(request, 'Access denied')
+                return redirect(redirect_to)
+            return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
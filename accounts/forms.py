@@ -1,7 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from baringo_hms.forms import styled_fields
 from .models import User
 
+@styled_fields()
 class CustomUserCreationForm(UserCreationForm):
     """
     Form for creating new users
@@ -10,23 +12,16 @@ class CustomUserCreationForm(UserCreationForm):
         model = User
         fields = ('username', 'email', 'first_name', 'last_name', 
                  'role', 'employee_id', 'department', 'phone_number')
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields:
-            self.fields[field].widget.attrs.update({'class': 'form-control'})
 
 
+@styled_fields()
 class CustomAuthenticationForm(AuthenticationForm):
     """
     Custom login form
     """
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fields['username'].widget.attrs.update({'class': 'form-control'})
-        self.fields['password'].widget.attrs.update({'class': 'form-control'})
 
 
+@styled_fields()
 class UserProfileForm(forms.ModelForm):
     """
     Form for editing user profile
@@ -35,11 +30,6 @@ class UserProfileForm(forms.ModelForm):
         model = User
         fields = ('first_name', 'last_name', 'email', 'phone_number', 
                  'department', 'profile_picture')
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields:
-            self.fields[field].widget.attrs.update({'class': 'form-control'})
 
 
 class PasswordChangeCustomForm(forms.Form):
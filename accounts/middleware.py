@@ -0,0 +1,29 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .presence import registry
+
+
+class PresenceMiddleware:
+    """
+    Keep the online-presence registry fresh for authenticated users
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.user.is_authenticated:
+            registry.heartbeat(request.user)
+        return self.get_response(request)
+    
+    async def __acall__(self, request):
+        user = await request.auser()
+        if user.is_authenticated:
+            await registry.aheartbeat(user)
+        return await self.get_response(request)
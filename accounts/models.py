@@ -37,14 +37,19 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} - {self.get_role_display()}"
     
+    @property
+    def access(self):
+        from .permissions import access_for_role
+        return access_for_role(self.role)
+    
     def has_perm_patient_view(self):
-        return self.role in ['admin', 'doctor', 'nurse', 'records_officer']
+        return 'patient_view' in self.access
     
     def has_perm_patient_edit(self):
-        return self.role in ['admin', 'doctor', 'nurse']
+        return 'patient_edit' in self.access
     
     def has_perm_report_view(self):
-        return self.role in ['admin', 'records_officer']
+        return 'report_view' in self.access
 
 
 class UserSession(models.Model):
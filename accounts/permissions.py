@@ -0,0 +1,111 @@
+from functools import lru_cache
+
+from django.urls import reverse
+
+# Permission -> roles that hold it. Edit this table, not the views.
+PERMISSION_ROLES = {
+    'patient_view': ['admin', 'doctor', 'nurse', 'records_officer'],
+    'patient_edit': ['admin', 'doctor', 'nurse'],
+    'document_upload': ['admin', 'doctor', 'nurse', 'records_officer'],
+    'consultation_view': ['admin', 'doctor', 'nurse'],
+    'consultation_edit': ['admin', 'doctor', 'nurse'],
+    'prescription_view': ['admin', 'doctor', 'pharmacist'],
+    'appointment_manage': ['admin', 'doctor', 'nurse', 'records_officer'],
+    'lab_work': ['admin', 'lab_technician'],
+    'report_view': ['admin', 'records_officer'],
+    'claims_manage': ['admin', 'records_officer'],
+    'offline_sync': ['admin', 'doctor', 'nurse', 'records_officer'],
+    'sync_manage': ['admin', 'records_officer'],
+    'integrations_view': ['admin'],
+    'security_view': ['admin'],
+    'user_manage': ['admin'],
+}
+
+# Sidebar entries: (url name, label, icon, required permission or None)
+MENU_ITEMS = [
+    ('dashboard', 'Dashboard', 'fa-dashboard', None),
+    ('on_shift', 'On Shift', 'fa-user-clock', None),
+    ('patient_list', 'Patients', 'fa-users', None),
+    ('consultation_list', 'Consultations', 'fa-stethoscope', 'consultation_view'),
+    ('queue_board', 'Queue Board', 'fa-list-ol', 'consultation_view'),
+    ('appointment_list', 'Appointments', 'fa-calendar-alt', 'appointment_manage'),
+    ('deteriorating_patients', 'Early Warning', 'fa-heartbeat', 'consultation_view'),
+    ('lab_worklist', 'Lab Worklist', 'fa-flask', 'lab_work'),
+    ('prescription_list', 'Prescriptions', 'fa-prescription', 'prescription_view'),
+    ('report_dashboard', 'Reports', 'fa-chart-bar', 'report_view'),
+    ('claim_batch_list', 'Insurance Claims', 'fa-file-invoice-dollar', 'claims_manage'),
+    ('sync_device_list', 'Offline Sync', 'fa-sync-alt', 'sync_manage'),
+    ('outbox_status', 'Integrations', 'fa-project-diagram', 'integrations_view'),
+    ('audit_logs', 'Security Logs', 'fa-shield-alt', 'security_view'),
+    ('user_list', 'User Management', 'fa-user-cog', 'user_manage'),
+]
+
+ROLE_MATRIX = {}
+for _permission, _roles in PERMISSION_ROLES.items():
+    for _role in _roles:
+        ROLE_MATRIX.setdefault(_role, set()).add(_permission)
+ROLE_MATRIX = {role: frozenset(perms) for role, perms in ROLE_MATRIX.items()}
+
+
+class RoleAccess:
+    """
+    Compiled permissions and menu for a single role.
+
+    Supports ``'patient_edit' in access`` in Python and
+    ``{% if access.patient_edit %}`` in templates.
+    """
+    __slots__ = ('role', 'permissions', '_menu')
+
+    def __init__(self, role):
+        self.role = role
+        self.permissions = ROLE_MATRIX.get(role, frozenset())
+        self._menu = None
+
+    def __contains__(self, permission):
+        return permission in self.permissions
+
+    def __getitem__(self, permission):
+        return permission in self.permissions
+
+    def has(self, permission):
+        return permission is None or permission in self.permissions
+
+    @property
+    def menu(self):
+        # URLs are reversed once per role, on first render
+        if self._menu is None:
+            self._menu = tuple(
+                {'url_name': url_name, 'url': reverse(url_name), 'label': label, 'icon': icon}
+                for url_name, label, icon, permission in MENU_ITEMS
+                if self.has(permission)
+            )
+        return self._menu
+
+
+@lru_cache(maxsize=None)
+def access_for_role(role):
+    return RoleAccess(role)
+
+
+def get_access(request):
+    """
+    RoleAccess for the current user, memoised on the request
+    """
+    access = getattr(request, '_role_access', None)
+    if access is None:
+        role = getattr(request.user, 'role', None) if request.user.is_authenticated else None
+        access = access_for_role(role)
+        request._role_access = access
+    return access
+
+
+async def aget_access(request):
+    """
+    get_access for async views, which must not touch the lazy request.user
+    """
+    access = getattr(request, '_role_access', None)
+    if access is None:
+        user = await request.auser()
+        access = access_for_role(getattr(user, 'role', None) if user.is_authenticated else None)
+        request._role_access = access
+    return access
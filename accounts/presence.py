@@ -0,0 +1,144 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from baringo_hms.batching import BatchWriter
+
+PRESENCE_TIMEOUT = getattr(settings, 'PRESENCE_TIMEOUT', 5 * 60)
+HEARTBEAT_INTERVAL = getattr(settings, 'PRESENCE_HEARTBEAT_INTERVAL', 60)
+INDEX_KEY = 'presence:index'
+
+
+class PresenceRegistry:
+    """
+    Who is online, held in the cache.
+
+    Each user has an entry that expires PRESENCE_TIMEOUT seconds after their
+    last heartbeat, so users who close the browser without logging out drop
+    off on their own. A small index key lists the user ids to look up.
+    """
+    def __init__(self, cache_alias='default', timeout=PRESENCE_TIMEOUT):
+        self.cache = caches[cache_alias]
+        self.timeout = timeout
+        self._last_beat = {}
+
+    def _key(self, user_id):
+        return f"presence:user:{user_id}"
+
+    def _entry(self, user):
+        return {
+            'user_id': user.pk,
+            'username': user.username,
+            'name': user.get_full_name() or user.username,
+            'role': user.role,
+            'role_display': user.get_role_display(),
+            'department': user.department,
+            'last_seen': time.time(),
+        }
+
+    def mark_online(self, user):
+        self.cache.set(self._key(user.pk), self._entry(user), timeout=self.timeout)
+        self._last_beat[user.pk] = time.monotonic()
+        index = self.cache.get(INDEX_KEY) or set()
+        if user.pk not in index:
+            index.add(user.pk)
+            self.cache.set(INDEX_KEY, index, timeout=None)
+
+    def heartbeat(self, user):
+        """
+        Refresh a user's entry, at most once per HEARTBEAT_INTERVAL per process
+        """
+        last = self._last_beat.get(user.pk)
+        if last is not None and time.monotonic() - last < HEARTBEAT_INTERVAL:
+            return False
+        self.mark_online(user)
+        return True
+
+    async def aheartbeat(self, user):
+        """
+        heartbeat for async middleware; only a due refresh leaves the event loop
+        """
+        last = self._last_beat.get(user.pk)
+        if last is not None and time.monotonic() - last < HEARTBEAT_INTERVAL:
+            return False
+        await sync_to_async(self.mark_online)(user)
+        return True
+
+    def mark_offline(self, user):
+        self.cache.delete(self._key(user.pk))
+        self._last_beat.pop(user.pk, None)
+        index = self.cache.get(INDEX_KEY) or set()
+        if user.pk in index:
+            index.discard(user.pk)
+            self.cache.set(INDEX_KEY, index, timeout=None)
+
+    def online_users(self):
+        index = self.cache.get(INDEX_KEY) or set()
+        if not index:
+            return []
+        entries = self.cache.get_many([self._key(pk) for pk in index])
+        live = {entry['user_id'] for entry in entries.values()}
+        if live != index:
+            # Drop users whose heartbeat expired
+            self.cache.set(INDEX_KEY, live, timeout=None)
+        return sorted(entries.values(), key=lambda e: (e['department'], e['name']))
+
+    def is_online(self, user_id):
+        return self.cache.get(self._key(user_id)) is not None
+
+
+class SessionHistoryWriter(BatchWriter):
+    """
+    Persists UserSession opens and closes in batches.
+
+    Opens become one bulk INSERT (login_time is stamped at flush, at most
+    flush_interval late); closes become one UPDATE with a CASE on
+    session_key. The queue is FIFO, so a close is never applied before its open.
+    """
+    name = 'session-history-writer'
+
+    def session_opened(self, user, session_key, ip_address, user_agent):
+        self.submit(('open', {
+            'user_id': user.pk,
+            'session_key': session_key or '',
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+        }))
+
+    def session_closed(self, user, session_key):
+        self.submit(('close', {
+            'user_id': user.pk,
+            'session_key': session_key or '',
+            'logout_time': timezone.now(),
+        }))
+
+    def write_batch(self, batch):
+        from .models import UserSession
+
+        opens = [UserSession(**data) for kind, data in batch if kind == 'open']
+        closes = {data['session_key']: data for kind, data in batch if kind == 'close'}
+        with transaction.atomic():
+            if opens:
+                UserSession.objects.bulk_create(opens)
+            if closes:
+                UserSession.objects.filter(
+                    session_key__in=list(closes),
+                    user_id__in={data['user_id'] for data in closes.values()},
+                    is_active=True,
+                ).update(
+                    is_active=False,
+                    logout_time=Case(
+                        *[When(session_key=key, then=Value(data['logout_time']))
+                          for key, data in closes.items()],
+                        default=Value(timezone.now()),
+                    ),
+                )
+
+
+registry = PresenceRegistry()
+session_history = SessionHistoryWriter()
@@ -0,0 +1,20 @@
+from baringo_hms.rows import Row, full_name
+
+from .models import User
+
+ROLE_LABELS = dict(User.ROLE_CHOICES)
+
+
+class UserRow(Row):
+    """
+    User management list entry
+    """
+    __slots__ = ('id', 'username', 'first_name', 'last_name', 'email', 'role', 'department',
+                 'employee_id', 'is_active', 'account_locked', 'last_login', 'date_joined')
+
+    @property
+    def full_name(self):
+        return full_name(self.first_name, self.last_name)
+
+    def get_role_display(self):
+        return ROLE_LABELS.get(self.role, self.role)
@@ -11,8 +11,13 @@ urlpatterns = [
     
     # Dashboard and Profile
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/tiles/', views.dashboard_tiles, name='dashboard_tiles'),
     path('profile/', views.profile, name='profile'),
     
+    # Online presence
+    path('heartbeat/', views.heartbeat, name='heartbeat'),
+    path('on-shift/', views.on_shift, name='on_shift'),
+    
     # User Management (Admin only)
     path('users/', views.user_list, name='user_list'),
     
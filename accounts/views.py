@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
@@ -6,7 +7,13 @@ from django.contrib.auth.views import LoginView
 from django.urls import reverse_lazy
 from django.utils import timezone
 from .forms import CustomUserCreationForm, CustomAuthenticationForm, UserProfileForm
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from .models import User, UserSession
+from .presence import registry, session_history
+from .rows import UserRow
+from .decorators import role_required
+from security.throttling import client_ip, get_login_throttle, get_attempt_recorder
 
 class CustomLoginView(LoginView):
     """
@@ -15,6 +22,19 @@ class CustomLoginView(LoginView):
     form_class = CustomAuthenticationForm
     template_name = 'accounts/login.html'
     
+    def post(self, request, *args, **kwargs):
+        # Reject throttled usernames/IPs before paying for password hashing
+        username = request.POST.get('username', '')
+        ip = client_ip(request)
+        retry_after = get_login_throttle().retry_after(username, ip)
+        if retry_after:
+            get_attempt_recorder().record(username, ip, False)
+            messages.error(request, f'Too many failed attempts. Try again in {retry_after} seconds.')
+            response = self.render_to_response(self.get_context_data(form=self.get_form()), status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        return super().post(request, *args, **kwargs)
+    
     def form_valid(self, form):
         # Get user
         user = form.get_user()
@@ -26,44 +46,36 @@ class CustomLoginView(LoginView):
         
         # Log the login
         response = super().form_valid(form)
+        ip = client_ip(self.request)
+        get_login_throttle().register_success(user.username)
+        get_attempt_recorder().record(user.username, ip, True)
         
-        # Create session record
-        UserSession.objects.create(
-            user=user,
+        # Queue session record (written in batches)
+        session_history.session_opened(
+            user,
             session_key=self.request.session.session_key,
-            ip_address=self.get_client_ip(),
+            ip_address=ip,
             user_agent=self.request.META.get('HTTP_USER_AGENT', ''),
         )
         
-        # Update user online status
+        # Update user online status - only the columns we touch
         user.is_online = True
-        user.last_login_ip = self.get_client_ip()
+        user.last_login_ip = ip
         user.login_attempts = 0
-        user.save()
+        user.save(update_fields=['is_online', 'last_login_ip', 'login_attempts'])
+        registry.mark_online(user)
         
         messages.success(self.request, f'Welcome back, {user.get_full_name()}!')
         return response
     
-    def get_client_ip(self):
-        x_forwarded_for = self.request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = self.request.META.get('REMOTE_ADDR')
-        return ip
-    
     def form_invalid(self, form):
-        # Track failed login attempts
-        username = form.cleaned_data.get('username')
-        try:
-            user = User.objects.get(username=username)
-            user.login_attempts += 1
-            if user.login_attempts >= 5:
-                user.account_locked = True
-                messages.warning(self.request, 'Account locked due to too many failed attempts')
-            user.save()
-        except User.DoesNotExist:
-            pass
+        # Track failed login attempts in the cache; the audit row is written in the background
+        username = form.cleaned_data.get('username', '')
+        ip = client_ip(self.request)
+        retry_after = get_login_throttle().register_failure(username, ip)
+        get_attempt_recorder().record(username, ip, False)
+        if retry_after >= get_login_throttle().config['LOCKOUT']:
+            messages.warning(self.request, 'Too many failed attempts. Login temporarily locked.')
         
         messages.error(self.request, 'Invalid username or password')
         return super().form_invalid(form)
@@ -74,64 +86,83 @@ def custom_logout(request):
     """
     Custom logout to update session
     """
-    # Update session record
-    try:
-        session = UserSession.objects.filter(
-            user=request.user, 
-            session_key=request.session.session_key,
-            is_active=True
-        ).latest('login_time')
-        session.logout_time = timezone.now()
-        session.is_active = False
-        session.save()
-    except UserSession.DoesNotExist:
-        pass
+    # Close session record (written in batches)
+    session_history.session_closed(request.user, request.session.session_key)
     
     # Update user online status
     request.user.is_online = False
-    request.user.save()
+    request.user.save(update_fields=['is_online'])
+    registry.mark_offline(request.user)
     
     logout(request)
     messages.info(request, 'You have been logged out successfully')
     return redirect('login')
 
 
+async def _dashboard_tiles(user):
+    """
+    Counters shown on the dashboard cards for ``user``'s role
+    """
+    from patients.models import Patient
+    from consultations.models import Consultation
+    
+    today = timezone.now().date()
+    if user.role == 'admin':
+        return {
+            'total_patients': await Patient.objects.acount(),
+            'today_consultations': await Consultation.objects.filter(visit_date=today).acount(),
+            'staff_online': len(await sync_to_async(registry.online_users)()),
+        }
+    if user.role == 'doctor':
+        return {
+            'my_appointments': await Consultation.objects.filter(doctor=user, visit_date=today).acount(),
+        }
+    return {}
+
+
 @login_required
-def dashboard(request):
+async def dashboard(request):
     """
     Main dashboard based on user role
     """
+    user = await request.auser()
     context = {
-        'user': request.user,
+        'user': user,
         'today': timezone.now().date(),
     }
     
     # Role-specific dashboard data
-    if request.user.role == 'admin':
+    if user.role == 'admin':
         # Admin dashboard data
         from patients.models import Patient
         from consultations.models import Consultation
         
+        context.update(await _dashboard_tiles(user))
         context.update({
-            'total_patients': Patient.objects.count(),
-            'today_consultations': Consultation.objects.filter(
-                visit_date=timezone.now().date()
-            ).count(),
-            'recent_patients': Patient.objects.order_by('-created_at')[:5],
-            'recent_consultations': Consultation.objects.order_by('-created_at')[:5],
+            'recent_patients': [p async for p in Patient.objects.order_by('-created_at')[:5]],
+            'recent_consultations': [c async for c in Consultation.objects.order_by('-created_at')[:5]],
         })
     
-    elif request.user.role == 'doctor':
+    elif user.role == 'doctor':
         # Doctor dashboard - show today's appointments
         from consultations.models import Consultation
-        context['my_appointments'] = Consultation.objects.filter(
-            doctor=request.user,
+        context['my_appointments'] = [c async for c in Consultation.objects.filter(
+            doctor=user,
             visit_date=timezone.now().date()
-        ).select_related('patient')
+        ).select_related('patient')]
     
     # Add more role-specific dashboards
     
-    return render(request, 'accounts/dashboard.html', context)
+    # Context processors and templates are sync code
+    return await sync_to_async(render)(request, 'accounts/dashboard.html', context)
+
+
+@login_required
+async def dashboard_tiles(request):
+    """
+    Dashboard counters as JSON, for refreshing the cards without a page load
+    """
+    return JsonResponse(await _dashboard_tiles(await request.auser()))
 
 
 @login_required
@@ -159,13 +190,36 @@ def profile(request):
 
 
 @login_required
+@role_required('user_manage')
 def user_list(request):
     """
     Admin view for managing users
     """
-    if request.user.role != 'admin':
-        messages.error(request, 'Access denied')
-        return redirect('dashboard')
+    users = UserRow.fetch(User.objects.order_by('-date_joined'))
+    return render(request, 'accounts/user_list.html', {'users': users})
+
+
+@login_required
+@require_POST
+def heartbeat(request):
+    """
+    Keep-alive ping from open pages so idle users stay on the presence board
+    """
+    registry.mark_online(request.user)
+    return JsonResponse({'status': 'ok'})
+
+
+@login_required
+def on_shift(request):
+    """
+    Staff currently online, grouped by department
+    """
+    departments = {}
+    for entry in registry.online_users():
+        departments.setdefault(entry['department'] or 'Unassigned', []).append(entry)
     
-    users = User.objects.all().order_by('-date_joined')
-    return render(request, 'accounts/user_list.html', {'users': users})
\ No newline at end of file
+    context = {
+        'departments': sorted(departments.items()),
+        'online_count': sum(len(staff) for staff in departments.values()),
+    }
+    return render(request, 'accounts/on_shift.html', context)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('patients/<str:mrn>/lab-trend/', views.lab_trend, name='api_lab_trend'),
+    path('patients/<str:mrn>/vitals-trend/', views.vitals_trend, name='api_vitals_trend'),
+    path('icd10/', views.icd10_search, name='api_icd10_search'),
+]
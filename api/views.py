@@ -1,3 +1,49 @@
-from django.shortcuts import render
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from consultations import vitals
+from consultations.icd10 import index as icd10_index
+from consultations.lab_results import trend_series, patient_analytes
+from consultations.models import PatientVitalsSummary
+from patients.models import Patient
 
-# Create your views here.
+
+@login_required
+def lab_trend(request, mrn):
+    """
+    Lab result time series for charting.
+    
+    ?analyte=HbA1c&analyte=CD4 returns one column set per analyte; with no
+    analyte the response lists what is available for the patient.
+    """
+    patient_id = get_object_or_404(Patient.objects.values_list('pk', flat=True), mrn=mrn)
+    analytes = request.GET.getlist('analyte')
+    if not analytes:
+        return JsonResponse({'mrn': mrn, 'analytes': patient_analytes(patient_id)})
+    
+    return JsonResponse({'mrn': mrn, 'series': trend_series(patient_id, analytes)})
+
+
+@login_required
+def vitals_trend(request, mrn):
+    """
+    Vital-sign series with per-series statistics and the rolling summary
+    """
+    patient_id = get_object_or_404(Patient.objects.values_list('pk', flat=True), mrn=mrn)
+    fields = [f for f in request.GET.getlist('field') if f in vitals.VITAL_FIELDS + ('news2_score',)]
+    data = vitals.trend_series(patient_id, tuple(fields) or vitals.VITAL_FIELDS + ('news2_score',))
+    
+    summary = PatientVitalsSummary.objects.filter(patient_id=patient_id).first()
+    data['summary'] = vitals.summary_statistics(summary) if summary else {}
+    return JsonResponse({'mrn': mrn, **data})
+
+
+@login_required
+async def icd10_search(request):
+    """
+    ICD-10 lookup for coders: ?q=J18 (code prefix) or ?q=acute resp (title words)
+    """
+    # The first search builds the index from the database, so it runs in the sync thread
+    results = await sync_to_async(icd10_index.search)(request.GET.get('q', ''))
+    return JsonResponse({'results': results})
@@ -0,0 +1,81 @@
+import logging
+import queue
+import threading
+import time
+
+from django.db import DatabaseError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """
+    Queue records in memory and persist them in batches from a daemon thread.
+
+    Subclasses implement write_batch(); request handlers only pay for a
+    queue append. When the queue is full new records are dropped and logged
+    rather than blocking the request.
+    """
+    name = 'batch-writer'
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def write_batch(self, batch):
+        raise NotImplementedError
+
+    def submit(self, item):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning("%s buffer full, dropping record", self.name)
+
+    def _ensure_started(self):
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _drain(self, first=None, block=True):
+        batch = [first] if first is not None else []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if block and timeout > 0:
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.write_batch(batch)
+        except DatabaseError:
+            logger.exception("%s failed to persist %d records", self.name, len(batch))
+
+    def _run(self):
+        while True:
+            batch = self._drain(self._queue.get())
+            try:
+                self._write(batch)
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """
+        Synchronously write everything still queued (used on shutdown/tests)
+        """
+        while not self._queue.empty():
+            self._write(self._drain(block=False))
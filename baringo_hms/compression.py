@@ -0,0 +1,100 @@
+import gzip
+import mimetypes
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.text import compress_string
+
+DEFAULT_COMPRESSION_SETTINGS = {
+    # Bodies smaller than this gain less than the encoding costs
+    'MIN_SIZE': 1024,
+    # Static files are compressed once at build time, at the best quality
+    'STATIC_BROTLI_QUALITY': 11,
+    'TYPES': (
+        'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+        'application/javascript', 'application/json', 'application/xml',
+        'image/svg+xml', 'image/x-icon', 'font/ttf', 'font/otf', 'application/vnd.ms-fontobject',
+    ),
+    # Content-hashed static names never change, so browsers keep them a
+    # year; files without a hash are revalidated after this many seconds
+    'STATIC_MAX_AGE': 365 * 24 * 60 * 60,
+    'STATIC_UNHASHED_MAX_AGE': 60 * 60,
+}
+
+# Content-Encoding to the suffix of the precompressed static copy
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def get_compression_settings():
+    config = dict(DEFAULT_COMPRESSION_SETTINGS)
+    config.update(getattr(settings, 'COMPRESSION', {}))
+    return config
+
+
+@lru_cache(maxsize=None)
+def brotli_module():
+    """
+    The brotli package, or None when it is not installed (gzip only then)
+    """
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def compressible(content_type, config=None):
+    config = config or get_compression_settings()
+    return content_type.split(';')[0].strip().lower() in config['TYPES']
+
+
+def compressible_name(name, config=None):
+    return compressible(mimetypes.guess_type(name)[0] or '', config)
+
+
+def accepted_encodings(request):
+    """
+    Codings the client accepts from its Accept-Encoding header ('br', 'gzip')
+    """
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = params.strip().lower()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    if '*' in accepted:
+        accepted.update(SUFFIXES)
+    return accepted
+
+
+def choose_encoding(request, available=('br', 'gzip')):
+    """
+    Best of ``available`` the client accepts: Brotli, then gzip, else None
+    """
+    accepted = accepted_encodings(request)
+    for coding in ('br', 'gzip'):
+        if coding in available and coding in accepted and (coding != 'br' or brotli_module()):
+            return coding
+    return None
+
+
+def compress(data, coding, static=False, config=None):
+    """
+    ``data`` encoded with ``coding``. Dynamic output is always gzip, which
+    carries Django's random padding against BREACH-style length probing;
+    Brotli has no field to pad, so it is only used for static files, which
+    hold no secrets and are compressed deterministically.
+    """
+    config = config or get_compression_settings()
+    if coding == 'br':
+        if not static:
+            raise ValueError('Dynamic responses are gzip-encoded only')
+        return brotli_module().compress(data, quality=config['STATIC_BROTLI_QUALITY'])
+    if static:
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return compress_string(data, max_random_bytes=100)
@@ -0,0 +1,74 @@
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.contrib import messages
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+@lru_cache(maxsize=None)
+def template_version(*names):
+    """
+    Digest of the page's template sources, so a deploy that changes them
+    does not leave browsers on an old page
+    """
+    digest = hashlib.md5()
+    for name in names:
+        try:
+            digest.update(get_template(name).template.source.encode())
+        except (TemplateDoesNotExist, AttributeError):
+            digest.update(name.encode())
+    return digest.hexdigest()[:8]
+
+
+class PageState:
+    """
+    Validators for a rendered page.
+
+    ``modified`` are the updated_at values of the rows the page shows and
+    ``versions`` the stamps of its related sections (baringo_hms.versions).
+    The ETag covers both; Last-Modified is the latest of them, stamps being
+    nanosecond times of the last change.
+    """
+    __slots__ = ('etag', 'last_modified')
+
+    def __init__(self, request, templates, modified=(), versions=None):
+        versions = versions or {}
+        times = [value for value in modified if value is not None]
+        times += [datetime.fromtimestamp(stamp / 1e9, tz=dt_timezone.utc) for stamp in versions.values()]
+        self.last_modified = max(times) if times else None
+        # Pages show the user's name and role menu, so the ETag is per user.
+        # They also embed a CSRF token, which logging in rotates: a page
+        # from an earlier login must not be revalidated, or its forms fail
+        session = getattr(request, 'session', None)
+        parts = (request.user.pk, session.session_key if session else None, request.META.get('CSRF_COOKIE'),
+                 template_version(*templates), *modified, *sorted(versions.items()))
+        self.etag = quote_etag(hashlib.md5('|'.join(str(part) for part in parts).encode()).hexdigest())
+
+    def _timestamp(self):
+        if self.last_modified is None:
+            return None
+        return int(self.last_modified.astimezone(dt_timezone.utc).timestamp())
+
+    def not_modified(self, request):
+        """
+        A 304 when the client's copy is current, otherwise None
+        """
+        if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+            # A pending flash message has to be rendered
+            return None
+        response = get_conditional_response(request, etag=self.etag, last_modified=self._timestamp())
+        if response is not None:
+            self.add_headers(response)
+        return response
+
+    def add_headers(self, response):
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self._timestamp())
+        # Patient data: browsers may keep it but must check back, proxies may not
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
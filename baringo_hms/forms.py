@@ -0,0 +1,74 @@
+from django import forms
+from django.conf import settings
+from django.core.validators import EMPTY_VALUES
+
+from crispy_forms.templatetags.crispy_forms_filters import as_crispy_field, as_crispy_form
+
+
+def styled_fields(css_class='form-control', skip=(), optional=()):
+    """
+    Class decorator: give every widget ``css_class`` (except ``skip``
+    widget types) and make ``optional`` fields not required.
+
+    This is done once on the class's base_fields, which each form instance
+    deep-copies, instead of on every instance in __init__.
+    """
+    def decorate(form_class):
+        for field in form_class.base_fields.values():
+            if not isinstance(field.widget, skip):
+                field.widget.attrs.update({'class': css_class})
+        for name in optional:
+            form_class.base_fields[name].required = False
+        return form_class
+    return decorate
+
+
+class FormSkeletons:
+    """
+    Crispy HTML of untouched form fields, rendered once per form class and
+    role and then reused.
+
+    A field without a value or errors renders the same for everyone with a
+    role, whether the form is blank or a POST failed on other fields.
+    Fields with a value or errors, and choice fields fed by a queryset,
+    are rendered on each request. Off in DEBUG (see FORM_SKELETONS) so
+    template edits show up.
+    """
+    def __init__(self):
+        self._html = {}
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'FORM_SKELETONS', not settings.DEBUG)
+
+    def _pristine(self, bound_field):
+        return (not bound_field.errors
+                and bound_field.value() in EMPTY_VALUES
+                and not isinstance(bound_field.field, forms.ModelChoiceField))
+
+    def _key(self, form, role, name):
+        return (type(form), role, form.prefix, form.auto_id, name)
+
+    def field(self, bound_field, role=None):
+        if not self.enabled or not self._pristine(bound_field):
+            return as_crispy_field(bound_field)
+        key = self._key(bound_field.form, role, bound_field.name)
+        html = self._html.get(key)
+        if html is None:
+            html = self._html[key] = as_crispy_field(bound_field)
+        return html
+
+    def form(self, form, role=None):
+        if not self.enabled or form.is_bound or not all(self._pristine(field) for field in form):
+            return as_crispy_form(form)
+        key = self._key(form, role, None)
+        html = self._html.get(key)
+        if html is None:
+            html = self._html[key] = as_crispy_form(form)
+        return html
+
+    def clear(self):
+        self._html.clear()
+
+
+skeletons = FormSkeletons()
@@ -0,0 +1,142 @@
+import json
+import mimetypes
+import os
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date, quote_etag
+
+from .compression import SUFFIXES, choose_encoding, compress, compressible, get_compression_settings
+
+MANIFEST_NAME = 'staticfiles.json'
+
+
+class StaticFile:
+    __slots__ = ('path', 'content_type', 'etag', 'last_modified', 'cache_control', 'variants')
+
+    def __init__(self, path, cache_control):
+        stat = os.stat(path)
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+        self.last_modified = http_date(stat.st_mtime)
+        self.cache_control = cache_control
+        # Content-Encoding -> (path, size) of the precompressed copies
+        self.variants = {None: (path, stat.st_size)}
+        for coding, suffix in SUFFIXES.items():
+            if os.path.exists(path + suffix):
+                self.variants[coding] = (path + suffix, os.path.getsize(path + suffix))
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files collected into STATIC_ROOT without a separate web server.
+
+    The directory is indexed once at startup (restart after collectstatic).
+    Content-hashed names from the manifest get a year-long immutable
+    Cache-Control, other files a short one, and clients that accept it are
+    sent the .br or .gz copy written by CompressedManifestStaticFilesStorage.
+    Requests for anything else pass through.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        url = urlsplit(settings.STATIC_URL or '')
+        if url.netloc or not settings.STATIC_ROOT or not os.path.isdir(settings.STATIC_ROOT):
+            # Static files come from a CDN, or have not been collected here
+            raise MiddlewareNotUsed
+        self.prefix = '/' + url.path.strip('/') + '/'
+        self.files = self._index(settings.STATIC_ROOT, get_compression_settings())
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _index(self, root, config):
+        hashed = set()
+        manifest = os.path.join(root, MANIFEST_NAME)
+        if os.path.exists(manifest):
+            with open(manifest, encoding='utf-8') as handle:
+                hashed = set(json.load(handle).get('paths', {}).values())
+        immutable = f"public, max-age={config['STATIC_MAX_AGE']}, immutable"
+        short = f"public, max-age={config['STATIC_UNHASHED_MAX_AGE']}"
+        suffixes = tuple(SUFFIXES.values())
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                url = os.path.relpath(path, root).replace(os.sep, '/')
+                if name == MANIFEST_NAME or (name.endswith(suffixes) and os.path.exists(path.rsplit('.', 1)[0])):
+                    continue
+                files[url] = StaticFile(path, immutable if url in hashed else short)
+        return files
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        static = self.files.get(request.path_info[len(self.prefix):])
+        if static is None:
+            return None
+
+        if static.etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+            response = HttpResponseNotModified()
+        else:
+            coding = choose_encoding(request, static.variants)
+            path, size = static.variants[coding]
+            response = FileResponse(open(path, 'rb'), content_type=static.content_type)
+            response['Content-Length'] = size
+            response['Last-Modified'] = static.last_modified
+            if coding:
+                response['Content-Encoding'] = coding
+        response['ETag'] = static.etag
+        response['Cache-Control'] = static.cache_control
+        if len(static.variants) > 1:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    gzip for HTML, JSON and other text responses of at least
+    COMPRESSION['MIN_SIZE'] bytes; not Brotli, which cannot carry the
+    BREACH padding (see compression.compress). Streaming responses (event
+    streams, document downloads) are left alone.
+    """
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        config = get_compression_settings()
+        if len(response.content) < config['MIN_SIZE'] or not compressible(response.get('Content-Type', ''), config):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_encoding(request, available=('gzip',))
+        if coding is None:
+            return response
+        compressed = compress(response.content, coding, config=config)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        # The encoded body is no longer byte-identical to what a strong ETag named
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,176 @@
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+APPROXIMATE_COUNT_TIMEOUT = 60
+
+
+def encode_cursor(values):
+    """
+    Encode a tuple of ordering values into an opaque URL-safe cursor
+    """
+    payload = []
+    for value in values:
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload.append(value)
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor, returning None if it is invalid
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list):
+            return None
+        return [parse_datetime(v) or v if isinstance(v, str) else v for v in values]
+    except (ValueError, TypeError):
+        return None
+
+
+def approximate_count(queryset, timeout=APPROXIMATE_COUNT_TIMEOUT):
+    """
+    Cheap row count for display purposes.
+
+    Unfiltered tables on PostgreSQL use the planner statistics; everything
+    else falls back to a COUNT(*) cached for a short period, keyed on the SQL.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+    key = f"approx_count:{queryset.model._meta.db_table}:{digest}"
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class KeysetPage:
+    """
+    A single page of keyset-paginated results
+    """
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self.paginator.cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.cursor_for(self.object_list[0])
+        return None
+
+    @property
+    def approximate_count(self):
+        return self.paginator.approximate_count
+
+
+class KeysetPaginator:
+    """
+    Cursor-based paginator ordered on a column plus the primary key.
+
+    Unlike django.core.paginator.Paginator it never issues OFFSET queries,
+    so fetching a deep page costs the same as fetching the first one.
+    Pages are addressed with ``after`` / ``before`` cursors.
+    """
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [f.lstrip('-') for f in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+
+    def cursor_for(self, obj):
+        return encode_cursor([getattr(obj, field) for field in self.fields])
+
+    def _clean_cursor(self, values):
+        # A cursor comes from the URL: each value must convert to its ordering field
+        if not values or len(values) != len(self.fields):
+            return None
+        model = self.queryset.model
+        try:
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            return None
+
+    def _seek_filter(self, values, forward):
+        # Build (a < x) OR (a = x AND b < y) ... for the lexicographic seek
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.fields, values):
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [f[1:] if f.startswith('-') else f'-{f}' for f in self.ordering]
+
+    def get_page(self, after=None, before=None):
+        after_values = self._clean_cursor(decode_cursor(after))
+        before_values = self._clean_cursor(decode_cursor(before))
+
+        if before_values:
+            queryset = self.queryset.filter(self._seek_filter(before_values, forward=False))
+            rows = list(queryset.order_by(*self._reversed_ordering())[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset
+        if after_values:
+            queryset = queryset.filter(self._seek_filter(after_values, forward=True))
+        rows = list(queryset.order_by(*self.ordering)[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next=has_next,
+                          has_previous=after_values is not None)
+
+    @property
+    def approximate_count(self):
+        if not hasattr(self, '_approximate_count'):
+            self._approximate_count = approximate_count(self.queryset.order_by())
+        return self._approximate_count
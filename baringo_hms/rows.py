@@ -0,0 +1,24 @@
+class Row:
+    """
+    Read-only row for list pages, holding only the columns the page shows.
+
+    Subclasses name their attributes in ``__slots__``; ``columns`` maps an
+    attribute to the ORM lookup or expression that fills it when the two
+    differ. ``fetch`` selects exactly those columns with ``values_list``,
+    so no model instances or unused text columns are loaded.
+    """
+    __slots__ = ()
+    columns = {}
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def fetch(cls, queryset):
+        lookups = [cls.columns.get(name, name) for name in cls.__slots__]
+        return [cls(*values) for values in queryset.values_list(*lookups)]
+
+
+def full_name(first_name, last_name):
+    return f"{first_name or ''} {last_name or ''}".strip()
@@ -28,14 +28,21 @@ INSTALLED_APPS = [
     'reports',
     'security',
     'api',
+    'claims',
+    'sync',
+    'integrations',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Collected static files (hashed, precompressed) and compressed responses
+    'baringo_hms.middleware.StaticFilesMiddleware',
+    'baringo_hms.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.PresenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Custom middleware for audit logs
@@ -57,11 +64,29 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'accounts.context_processors.user_menu',  # Custom context processor
             ],
+            'libraries': {
+                'form_skeleton': 'baringo_hms.templatetags.form_skeleton',
+            },
         },
     },
 ]
 
+# Compiled templates are kept in memory outside development, as is the
+# rendered HTML of untouched form fields (baringo_hms/forms.py)
+FORM_SKELETONS = not DEBUG
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'baringo_hms.wsgi.application'
+# Serve with an ASGI server (e.g. `uvicorn baringo_hms.asgi:application`) for
+# long-lived streams such as the consultation queue board
+ASGI_APPLICATION = 'baringo_hms.asgi.application'
 
 DATABASES = {
     'default': {
@@ -93,12 +118,98 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# `manage.py collectstatic` writes content-hashed names plus .gz/.br copies
+# (.br needs the brotli package); StaticFilesMiddleware serves them with
+# far-future caching
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'baringo_hms.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
+# HTML/JSON responses at least this large are sent gzip-encoded
+# (see baringo_hms/compression.py for all options)
+COMPRESSION = {
+    'MIN_SIZE': 1024,
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache (local memory by default; point at Redis/Memcached when running several workers)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'baringo-hms',
+    }
+}
+
+# Login throttling (see security/throttling.py for all options)
+LOGIN_THROTTLE = {
+    'USERNAME_LIMIT': 5,
+    'IP_LIMIT': 20,
+    'LOCKOUT': 15 * 60,
+}
+
+# Consultation autosave: saves of a draft within this many seconds are
+# written together (see consultations/drafts.py for all options)
+CONSULTATION_DRAFTS = {
+    'COALESCE_SECONDS': 2.0,
+}
+
+# Online presence: users drop off this many seconds after their last heartbeat
+PRESENCE_TIMEOUT = 5 * 60
+PRESENCE_HEARTBEAT_INTERVAL = 60
+
+# Insurance claims (see claims/pipeline.py for all options). Leave SUBMIT_URL
+# empty to submit to the local insurer stand-in. Batches requested from the
+# claims pages are built by `manage.py build_claims --worker --loop 5`.
+CLAIMS = {
+    'PROVIDER_CODE': os.environ.get('CLAIMS_PROVIDER_CODE', ''),
+    'SUBMIT_URL': os.environ.get('CLAIMS_SUBMIT_URL', ''),
+    'WORKERS': 4,
+}
+
+# DHIS2 aggregate reporting (see reports/indicators.py for all options). Map
+# indicator codes and category option combos to the county instance's UIDs.
+DHIS2 = {
+    'ORG_UNIT': os.environ.get('DHIS2_ORG_UNIT', ''),
+    'DATA_SET': os.environ.get('DHIS2_DATA_SET', ''),
+}
+
+# Offline sync for outreach devices (see sync/protocol.py for all options)
+SYNC = {
+    'MRN_BLOCK_SIZE': 100,
+}
+
+# Change events for downstream systems (see integrations/outbox.py for all
+# options). Run `manage.py dispatch_events --loop 5` to deliver them; a
+# webhook sink without a URL holds its events until one is set (under
+# DEBUG it delivers to a local stand-in).
+OUTBOX = {
+    'SINKS': {
+        'events-file': {
+            'CLASS': 'integrations.sinks.FileSink',
+            'DIRECTORY': os.path.join(BASE_DIR, 'outbox'),
+        },
+        'lab-middleware': {
+            'CLASS': 'integrations.sinks.WebhookSink',
+            'URL': os.environ.get('LAB_MIDDLEWARE_WEBHOOK_URL', ''),
+            'SECRET': os.environ.get('LAB_MIDDLEWARE_WEBHOOK_SECRET', ''),
+            'TOPICS': ['lab_order.'],
+        },
+    },
+}
+
+# Patient documents (see patients/storage.py for all options). Files live
+# outside MEDIA_ROOT and are only reachable through signed links; set
+# SENDFILE to 'x-accel' (nginx) or 'x-sendfile' (Apache) in production.
+DOCUMENTS = {
+    'ROOT': os.environ.get('DOCUMENTS_ROOT', os.path.join(BASE_DIR, 'private_documents')),
+    'SENDFILE': os.environ.get('DOCUMENTS_SENDFILE') or None,
+}
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -0,0 +1,41 @@
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import SUFFIXES, brotli_module, compress, compressible_name, get_compression_settings
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic storage: content-hashed copies of every file (so they can
+    be cached for a year) plus .gz and, with the brotli package, .br
+    copies of the compressible ones for StaticFilesMiddleware to send.
+    """
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # A template naming a file that was never collected keeps its
+            # plain URL rather than failing the page
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        config = get_compression_settings()
+        codings = [coding for coding in SUFFIXES if coding != 'br' or brotli_module()]
+        for name in sorted(set(self.hashed_files) | set(self.hashed_files.values())):
+            if not compressible_name(name, config):
+                continue
+            with self.open(name) as handle:
+                data = handle.read()
+            if len(data) < config['MIN_SIZE']:
+                continue
+            for coding in codings:
+                compressed = compress(data, coding, static=True, config=config)
+                target = name + SUFFIXES[coding]
+                if self.exists(target):
+                    self.delete(target)
+                if len(compressed) < len(data):
+                    self._save(target, ContentFile(compressed))
+                    yield name, target, True
@@ -0,0 +1,22 @@
+from django import template
+
+from baringo_hms.forms import skeletons
+
+register = template.Library()
+
+
+@register.filter
+def skeleton_field(bound_field, role=None):
+    """
+    {{ form.field|skeleton_field:user.role }}: as_crispy_field, reusing the
+    cached HTML of untouched fields
+    """
+    return skeletons.field(bound_field, role)
+
+
+@register.filter
+def skeleton_form(form, role=None):
+    """
+    {{ form|skeleton_form:user.role }}: crispy, cached while the form is untouched
+    """
+    return skeletons.form(form, role)
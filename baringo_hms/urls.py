@@ -21,6 +21,9 @@ urlpatterns = [
     path('reports/', include('reports.urls')),
     path('security/', include('security.urls')),
     path('api/', include('api.urls')),
+    path('claims/', include('claims.urls')),
+    path('sync/', include('sync.urls')),
+    path('integrations/', include('integrations.urls')),
 ]
 
 if settings.DEBUG:
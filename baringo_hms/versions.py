@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import cache
+
+# Version stamps for rows that change through related models (a patient's
+# consultations, a consultation's lab orders). Signals and bulk writers
+# call touch(); fragment cache keys and ETags include the stamps.
+
+
+def _key(scope, object_id, section):
+    return f"version:{scope}:{section}:{object_id}"
+
+
+def get_versions(scope, object_id, sections):
+    """
+    Current stamp of each section of one object
+    """
+    keys = {section: _key(scope, object_id, section) for section in sections}
+    found = cache.get_many(keys.values())
+    versions, missing = {}, {}
+    for section, key in keys.items():
+        if key in found:
+            versions[section] = found[key]
+        else:
+            # A fresh stamp, never a reused number, in case the key was evicted
+            versions[section] = missing[key] = time.time_ns()
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return versions
+
+
+def touch(scope, object_ids, *sections):
+    """
+    Start new versions of some sections for one or more objects
+    """
+    if not isinstance(object_ids, (list, set, tuple)):
+        object_ids = [object_ids]
+    stamp = time.time_ns()
+    cache.set_many({_key(scope, object_id, section): stamp
+                    for object_id in object_ids for section in sections}, timeout=None)
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Tariff
+
+
+@admin.register(Tariff)
+class TariffAdmin(admin.ModelAdmin):
+    list_display = ('category', 'code', 'description', 'amount')
+    list_filter = ('category',)
+    search_fields = ('code', 'description')
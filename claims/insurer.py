@@ -0,0 +1,66 @@
+import json
+import urllib.error
+import urllib.request
+import uuid
+from datetime import date
+
+from django.utils import timezone
+
+from .pipeline import apply_response, get_claims_settings
+from .validation import validate_bundle
+
+
+class SubmissionError(Exception):
+    pass
+
+
+class LocalInsurer:
+    """
+    Stand-in for the insurer claims endpoint, used when no SUBMIT_URL is
+    configured. It re-validates every claim the way the scheme would and
+    answers in the same shape as the real endpoint.
+    """
+    def process(self, document):
+        config = get_claims_settings()
+        rules = {
+            'member_patterns': config['MEMBER_NUMBER_PATTERNS'],
+            'period_start': document['period_start'],
+            'period_end': document['period_end'],
+            'max_amount': config['MAX_CLAIM_AMOUNT'],
+        }
+        reference = f"{document['scheme'].upper()}-{date.today():%Y%m%d}-{uuid.uuid4().hex[:8].upper()}"
+        results = []
+        for claim in document['claims']:
+            _, errors = validate_bundle(claim, rules)
+            results.append({
+                'claim_id': claim['claim_id'],
+                'status': 'rejected' if errors else 'accepted',
+                'reference': f"{reference}-{claim['claim_id']}",
+                'reason': '; '.join(errors),
+            })
+        return {'reference': reference, 'received_at': timezone.now().isoformat(), 'results': results}
+
+
+def _post(url, handle, timeout):
+    request = urllib.request.Request(url, data=handle.read(), method='POST',
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except (urllib.error.URLError, ValueError) as exc:
+        raise SubmissionError(f"Insurer endpoint failed: {exc}") from exc
+
+
+def submit_batch(batch):
+    """
+    Send a batch's submission file to the insurer and record the outcome
+    """
+    if batch.status != 'ready' or not batch.submission_file:
+        raise SubmissionError('Generate the submission file before submitting')
+    config = get_claims_settings()
+    with batch.submission_file.open('rb') as handle:
+        if config['SUBMIT_URL']:
+            response = _post(config['SUBMIT_URL'], handle, config['SUBMIT_TIMEOUT'])
+        else:
+            response = LocalInsurer().process(json.load(handle))
+    return apply_response(batch, response)
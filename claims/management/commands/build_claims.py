@@ -0,0 +1,56 @@
+import calendar
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from claims.insurer import SubmissionError, submit_batch
+from claims.models import SCHEME_CHOICES
+from claims.pipeline import build_batch, build_queued, write_submission_file
+
+
+class Command(BaseCommand):
+    help = ('Build (and optionally submit) the month-end claim batch for a scheme, or with --worker '
+            'build the batches queued from the claims pages')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scheme', choices=[value for value, _ in SCHEME_CHOICES], default='sha')
+        parser.add_argument('--month', help='YYYY-MM')
+        parser.add_argument('--submit', action='store_true', help='Write the submission file and submit it')
+        parser.add_argument('--worker', action='store_true', help='Build queued batches')
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='With --worker, keep running, polling for queued batches every SECONDS')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            while True:
+                built = build_queued()
+                if built:
+                    self.stdout.write(f'Built {built} queued batch(es)')
+                if not options['loop']:
+                    break
+                time.sleep(options['loop'])
+            return
+        if not options['month']:
+            raise CommandError('--month is required unless --worker is given')
+
+        try:
+            year, month = (int(part) for part in options['month'].split('-'))
+            period_start = date(year, month, 1)
+        except ValueError:
+            raise CommandError('--month must be YYYY-MM')
+        period_end = date(year, month, calendar.monthrange(year, month)[1])
+
+        batch = build_batch(options['scheme'], period_start, period_end)
+        self.stdout.write(
+            f'{batch}: {batch.total_claims} claim(s), {batch.valid_claims} valid, '
+            f'{batch.total_amount} total in {batch.build_seconds}s'
+        )
+        if options['submit']:
+            write_submission_file(batch)
+            try:
+                outcomes = submit_batch(batch)
+            except SubmissionError as exc:
+                raise CommandError(exc)
+            self.stdout.write(f'Submitted {batch.submission_reference}: {outcomes}')
+        self.stdout.write(self.style.SUCCESS(f'Claim batch {batch.pk} done'))
@@ -0,0 +1,109 @@
+from django.db import models
+from accounts.models import User
+from consultations.models import Consultation
+from patients.models import Patient
+
+SCHEME_CHOICES = [
+    ('nhif', 'NHIF'),
+    ('sha', 'SHA'),
+]
+
+
+class Tariff(models.Model):
+    """
+    Billable amount for a consultation type, lab test or medication
+    """
+    CATEGORY_CHOICES = [
+        ('consultation', 'Consultation'),
+        ('lab', 'Laboratory'),
+        ('medication', 'Medication (per unit)'),
+    ]
+    
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES)
+    code = models.CharField(max_length=200, help_text="Visit type, lab test name or medication generic name")
+    description = models.CharField(max_length=255, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        db_table = 'tariffs'
+        unique_together = [('category', 'code')]
+        ordering = ['category', 'code']
+    
+    def __str__(self):
+        return f"{self.get_category_display()} - {self.code}: {self.amount}"
+    
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().lower()
+        super().save(*args, **kwargs)
+
+
+class ClaimBatch(models.Model):
+    """
+    All claims for one scheme and period, built and submitted together
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('building', 'Building'),
+        ('ready', 'Ready'),
+        ('submitted', 'Submitted'),
+        ('failed', 'Failed'),
+    ]
+    
+    scheme = models.CharField(max_length=10, choices=SCHEME_CHOICES)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='building')
+    total_claims = models.IntegerField(default=0)
+    valid_claims = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    submission_file = models.FileField(upload_to='claims/%Y/%m/', null=True, blank=True)
+    submission_reference = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    build_seconds = models.FloatField(null=True, blank=True)
+    # Touched by the build after each stored chunk; a build that stops
+    # touching it has died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'claim_batches'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_scheme_display()} {self.period_start} - {self.period_end}"
+
+
+class Claim(models.Model):
+    """
+    One visit's claim bundle. A consultation is claimed at most once.
+    """
+    STATUS_CHOICES = [
+        ('valid', 'Valid'),
+        ('invalid', 'Invalid'),
+        ('submitted', 'Submitted'),
+        ('accepted', 'Accepted'),
+        ('rejected', 'Rejected'),
+    ]
+    
+    batch = models.ForeignKey(ClaimBatch, on_delete=models.CASCADE, related_name='claims')
+    consultation = models.OneToOneField(Consultation, on_delete=models.PROTECT, related_name='claim')
+    patient = models.ForeignKey(Patient, on_delete=models.PROTECT, related_name='claims')
+    member_number = models.CharField(max_length=20)
+    visit_date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    bundle = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='valid')
+    errors = models.JSONField(default=list, blank=True)
+    insurer_reference = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        db_table = 'claims'
+        ordering = ['visit_date', 'id']
+        indexes = [
+            models.Index(fields=['batch', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.member_number} - {self.visit_date} - {self.amount}"
@@ -0,0 +1,367 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from consultations.models import Consultation, Diagnosis, LabOrder
+from prescriptions.models import PrescriptionItem
+
+from .models import Claim, ClaimBatch, Tariff
+from .validation import validate_bundle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLAIMS_SETTINGS = {
+    'PROVIDER_CODE': '',
+    'BATCH_SIZE': 500,              # consultations assembled per streaming batch
+    'WORKERS': 4,                   # validation processes; 1 validates inline
+    'VALIDATION_CHUNKSIZE': 50,
+    'MAX_CLAIM_AMOUNT': 200000,
+    'MEMBER_NUMBER_PATTERNS': {
+        'nhif': r'^\d{6,12}$',
+        'sha': r'^[A-Z0-9]{8,20}$',
+    },
+    'SUBMIT_URL': '',               # empty: use the local insurer stand-in
+    'SUBMIT_TIMEOUT': 60,
+    'STALE_BUILD_MINUTES': 30,      # a build that stored nothing for this long has died
+}
+
+
+def get_claims_settings():
+    config = dict(DEFAULT_CLAIMS_SETTINGS)
+    config.update(getattr(settings, 'CLAIMS', {}))
+    return config
+
+
+def load_tariffs():
+    return {(category, code): amount
+            for category, code, amount in Tariff.objects.values_list('category', 'code', 'amount')}
+
+
+def eligible_consultations(period_start, period_end):
+    """
+    Ids of completed, insured, not yet claimed visits in the period
+    """
+    return (Consultation.objects
+            .filter(visit_date__range=(period_start, period_end), status='completed', claim__isnull=True)
+            .exclude(patient__nhif_number='')
+            .order_by('id')
+            .values_list('id', flat=True))
+
+
+def _line(kind, code, description, quantity, unit_price):
+    return {
+        'type': kind,
+        'code': code,
+        'description': description,
+        'quantity': quantity,
+        'unit_price': str(unit_price) if unit_price is not None else None,
+        'amount': str(unit_price * quantity) if unit_price is not None else None,
+    }
+
+
+def assemble(consultation_ids, scheme, tariffs, provider=''):
+    """
+    Claim bundles for a batch of consultations from four queries: the visits,
+    their diagnoses, completed lab orders and dispensed medication.
+    Bundles are plain JSON-ready dicts.
+    """
+    diagnoses = defaultdict(list)
+    for consultation_id, code, description, is_primary in (
+            Diagnosis.objects.filter(consultation_id__in=consultation_ids)
+            .values_list('consultation_id', 'code', 'description', 'is_primary')):
+        diagnoses[consultation_id].append({'code': code, 'description': description, 'primary': is_primary})
+
+    labs = defaultdict(list)
+    for consultation_id, test_name in (
+            LabOrder.objects.filter(consultation_id__in=consultation_ids, status='completed')
+            .values_list('consultation_id', 'test_name')):
+        labs[consultation_id].append(test_name)
+
+    medications = defaultdict(list)
+    for row in (PrescriptionItem.objects
+                .filter(prescription__consultation_id__in=consultation_ids, is_dispensed=True)
+                .values_list('prescription__consultation_id', 'medication__generic_name',
+                             'medication__name', 'medication__strength', 'quantity')):
+        medications[row[0]].append(row[1:])
+
+    bundles = []
+    visits = (Consultation.objects.filter(pk__in=consultation_ids).order_by('id')
+              .values('id', 'visit_date', 'visit_type', 'patient_id', 'patient__mrn',
+                      'patient__first_name', 'patient__last_name', 'patient__date_of_birth',
+                      'patient__gender', 'patient__nhif_number',
+                      'doctor__first_name', 'doctor__last_name'))
+    for visit in visits:
+        pk = visit['id']
+        lines = [_line('consultation', visit['visit_type'], f"{visit['visit_type']} consultation", 1,
+                       tariffs.get(('consultation', visit['visit_type'])))]
+        for test_name in labs[pk]:
+            lines.append(_line('lab', test_name, test_name, 1, tariffs.get(('lab', test_name.strip().lower()))))
+        for generic_name, name, strength, quantity in medications[pk]:
+            unit_price = (tariffs.get(('medication', (generic_name or '').strip().lower()))
+                          or tariffs.get(('medication', name.strip().lower())))
+            lines.append(_line('medication', generic_name or name, f"{name} {strength}", quantity, unit_price))
+        total = sum((Decimal(line['amount']) for line in lines if line['amount'] is not None), Decimal('0'))
+
+        bundles.append({
+            'consultation_id': pk,
+            'patient_id': visit['patient_id'],
+            'scheme': scheme,
+            'provider': provider,
+            'member_number': visit['patient__nhif_number'].strip().upper(),
+            'patient': {
+                'mrn': visit['patient__mrn'],
+                'name': f"{visit['patient__first_name']} {visit['patient__last_name']}",
+                'dob': visit['patient__date_of_birth'].isoformat() if visit['patient__date_of_birth'] else None,
+                'gender': visit['patient__gender'],
+            },
+            'visit_date': visit['visit_date'].isoformat(),
+            'visit_type': visit['visit_type'],
+            'practitioner': f"{visit['doctor__first_name'] or ''} {visit['doctor__last_name'] or ''}".strip(),
+            'diagnoses': diagnoses[pk],
+            'lines': lines,
+            'total': str(total),
+        })
+    return bundles
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_batch(scheme, period_start, period_end, user=None, batch=None):
+    """
+    Assemble, validate and store every claim for a scheme and period.
+
+    Consultations are processed in BATCH_SIZE chunks: each chunk is assembled
+    with a fixed number of queries, validated across a process pool and bulk
+    inserted before the next is read, so only one chunk of bundles is ever
+    held in memory. Run it from a management command, never a web worker.
+    If the batch stops being 'building' (it was released as stale) the
+    build stops storing claims and returns the batch as it is.
+    """
+    config = get_claims_settings()
+    if batch is None:
+        batch = ClaimBatch.objects.create(scheme=scheme, period_start=period_start, period_end=period_end,
+                                          created_by=user, heartbeat_at=timezone.now())
+    started = time.monotonic()
+    rules = {
+        'member_patterns': config['MEMBER_NUMBER_PATTERNS'],
+        'period_start': period_start.isoformat(),
+        'period_end': period_end.isoformat(),
+        'max_amount': config['MAX_CLAIM_AMOUNT'],
+    }
+    check = partial(validate_bundle, rules=rules)
+    tariffs = load_tariffs()
+    executor = ProcessPoolExecutor(max_workers=config['WORKERS']) if config['WORKERS'] > 1 else None
+
+    try:
+        # Only the ids are fetched up front; inserting claims while a cursor
+        # over the eligibility query is still open would race with it
+        ids = list(eligible_consultations(period_start, period_end))
+        for chunk in _chunks(ids, config['BATCH_SIZE']):
+            bundles = assemble(chunk, scheme, tariffs, config['PROVIDER_CODE'])
+            if executor:
+                results = dict(executor.map(check, bundles, chunksize=config['VALIDATION_CHUNKSIZE']))
+            else:
+                results = dict(map(check, bundles))
+            with transaction.atomic():
+                # The heartbeat UPDATE locks the batch row, so a release
+                # cannot slip in between the check and the insert
+                if not _heartbeat(batch):
+                    logger.warning("Claim batch %s is no longer building; stopping", batch.pk)
+                    batch.refresh_from_db()
+                    return batch
+                Claim.objects.bulk_create([
+                    Claim(
+                        batch=batch,
+                        consultation_id=bundle['consultation_id'],
+                        patient_id=bundle['patient_id'],
+                        member_number=bundle['member_number'][:20],
+                        visit_date=bundle['visit_date'],
+                        amount=Decimal(bundle['total']),
+                        bundle=bundle,
+                        status='invalid' if results[bundle['consultation_id']] else 'valid',
+                        errors=results[bundle['consultation_id']],
+                    ) for bundle in bundles
+                ], ignore_conflicts=True)
+    except Exception as exc:
+        logger.exception("Claim batch %s failed", batch.pk)
+        release_batch(batch, str(exc))
+        raise
+    finally:
+        if executor:
+            executor.shutdown()
+
+    with transaction.atomic():
+        if not _heartbeat(batch):
+            batch.refresh_from_db()
+            return batch
+        refresh_totals(batch)
+        batch.status = 'ready'
+        batch.build_seconds = round(time.monotonic() - started, 2)
+        batch.save(update_fields=['status', 'build_seconds'])
+    return batch
+
+
+def _heartbeat(batch):
+    return ClaimBatch.objects.filter(pk=batch.pk, status='building').update(heartbeat_at=timezone.now())
+
+
+def build_queued():
+    """
+    Release dead builds, then build every queued batch in the order they
+    were requested. Returns the batches built.
+    """
+    release_stale_builds()
+    built = 0
+    for batch in ClaimBatch.objects.filter(status='queued').order_by('created_at'):
+        # Conditional UPDATE: one worker per batch
+        claimed = ClaimBatch.objects.filter(pk=batch.pk, status='queued').update(
+            status='building', heartbeat_at=timezone.now())
+        if not claimed:
+            continue
+        batch.status = 'building'
+        try:
+            build_batch(batch.scheme, batch.period_start, batch.period_end, batch=batch)
+        except Exception:
+            continue  # recorded on the batch by build_batch
+        built += 1
+    return built
+
+
+def refresh_totals(batch):
+    totals = batch.claims.aggregate(
+        total=Count('id'),
+        valid=Count('id', filter=Q(status__in=['valid', 'submitted', 'accepted'])),
+        amount=Sum('amount', filter=Q(status__in=['valid', 'submitted', 'accepted'])),
+    )
+    batch.total_claims = totals['total']
+    batch.valid_claims = totals['valid']
+    batch.total_amount = totals['amount'] or 0
+    batch.save(update_fields=['total_claims', 'valid_claims', 'total_amount'])
+
+
+def release_batch(batch, error=''):
+    """
+    Mark a batch failed and drop all its claims, so the visits chunks had
+    already stored are picked up again by the next batch
+    """
+    with transaction.atomic():
+        # Status first: it waits for a chunk being stored, and the build
+        # stores nothing more once it sees the batch is not building
+        batch.status = 'failed'
+        if error:
+            batch.error = error[:2000]
+        batch.save(update_fields=['status', 'error'])
+        batch.claims.all().delete()
+        refresh_totals(batch)
+
+
+def release_stale_builds():
+    """
+    Fail batches whose build died (the worker was killed or restarted)
+    and release their claims. A live build touches its heartbeat after
+    every chunk, so only builds with no progress for STALE_BUILD_MINUTES
+    are released.
+    """
+    cutoff = timezone.now() - timedelta(minutes=get_claims_settings()['STALE_BUILD_MINUTES'])
+    stale = list(ClaimBatch.objects.filter(status='building', heartbeat_at__lt=cutoff))
+    for batch in stale:
+        release_batch(batch, 'The build did not finish')
+    return len(stale)
+
+
+def release_invalid(batch):
+    """
+    Drop invalid claims so the visits are picked up again by the next batch
+    once their records have been corrected
+    """
+    deleted, _ = batch.claims.filter(status='invalid').delete()
+    refresh_totals(batch)
+    return deleted
+
+
+def write_submission_file(batch):
+    """
+    Stream the batch's valid claims into a JSON submission document.
+
+    Claims are read with an iterator and written one at a time, so memory
+    stays flat however large the month is.
+    """
+    header = {
+        'scheme': batch.scheme,
+        'provider': get_claims_settings()['PROVIDER_CODE'],
+        'batch': batch.pk,
+        'period_start': batch.period_start.isoformat(),
+        'period_end': batch.period_end.isoformat(),
+        'generated_at': timezone.now().isoformat(),
+        'claim_count': batch.valid_claims,
+        'total_amount': str(batch.total_amount),
+    }
+    claims = batch.claims.filter(status='valid').order_by('id').values_list('id', 'bundle')
+    with tempfile.NamedTemporaryFile('w+', suffix='.json', encoding='utf-8', delete=False) as handle:
+        try:
+            handle.write(json.dumps(header)[:-1] + ', "claims": [')
+            for index, (claim_id, bundle) in enumerate(claims.iterator(chunk_size=1000)):
+                if index:
+                    handle.write(',')
+                handle.write(json.dumps({'claim_id': claim_id, **bundle}))
+            handle.write(']}')
+            handle.flush()
+            handle.seek(0)
+            name = f"{batch.scheme}_{batch.period_start:%Y%m%d}_{batch.period_end:%Y%m%d}_{batch.pk}.json"
+            batch.submission_file.save(name, File(handle), save=False)
+        finally:
+            os.unlink(handle.name)
+    batch.save(update_fields=['submission_file'])
+    return batch.submission_file
+
+
+def apply_response(batch, response):
+    """
+    Record the insurer's per-claim decisions: one UPDATE per outcome plus a
+    bulk update for references and rejection reasons
+    """
+    outcomes = defaultdict(list)
+    details = []
+    for result in response.get('results', []):
+        if result.get('status') not in ('accepted', 'rejected', 'submitted'):
+            continue
+        outcomes[result['status']].append(result['claim_id'])
+        details.append(Claim(
+            pk=result['claim_id'],
+            insurer_reference=(result.get('reference') or '')[:100],
+            errors=[result['reason']] if result.get('reason') else [],
+        ))
+
+    with transaction.atomic():
+        for status, claim_ids in outcomes.items():
+            batch.claims.filter(pk__in=claim_ids).update(status=status)
+        # Scoped to the batch, so a stray claim id can't touch another batch's claims
+        batch.claims.bulk_update(details, ['insurer_reference', 'errors'], batch_size=1000)
+        batch.status = 'submitted'
+        batch.submission_reference = (response.get('reference') or '')[:100]
+        batch.submitted_at = timezone.now()
+        batch.save(update_fields=['status', 'submission_reference', 'submitted_at'])
+    refresh_totals(batch)
+    return {status: len(claim_ids) for status, claim_ids in outcomes.items()}
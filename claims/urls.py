@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.batch_list, name='claim_batch_list'),
+    path('<int:pk>/', views.batch_detail, name='claim_batch_detail'),
+    path('<int:pk>/action/', views.batch_action, name='claim_batch_action'),
+    path('<int:pk>/download/', views.download_submission, name='claim_batch_download'),
+]
@@ -0,0 +1,65 @@
+"""
+Claim bundle validation.
+
+Kept free of Django imports: bundles are plain dicts and the rules a plain
+dict, so this module can run in worker processes without app setup.
+"""
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+ICD10_CODE = re.compile(r'^[A-Z]\d{2}(\.\d{1,2})?$')
+
+
+def validate_bundle(bundle, rules):
+    """
+    Return (consultation id, list of errors) for one claim bundle
+    """
+    errors = []
+    pattern = rules['member_patterns'].get(bundle['scheme'])
+    member = bundle.get('member_number') or ''
+    if not member:
+        errors.append('Missing member number')
+    elif pattern and not re.match(pattern, member):
+        errors.append(f'Member number {member!r} is not a valid {bundle["scheme"].upper()} number')
+
+    patient = bundle.get('patient') or {}
+    if not patient.get('name', '').strip() or not patient.get('dob'):
+        errors.append('Patient name and date of birth are required')
+
+    visit = date.fromisoformat(bundle['visit_date'])
+    if not rules['period_start'] <= bundle['visit_date'] <= rules['period_end']:
+        errors.append(f'Visit date {visit} is outside the claim period')
+
+    diagnoses = bundle.get('diagnoses') or []
+    if not diagnoses:
+        errors.append('No coded diagnosis')
+    for diagnosis in diagnoses:
+        if not ICD10_CODE.match(diagnosis.get('code') or ''):
+            errors.append(f'Invalid ICD-10 code {diagnosis.get("code")!r}')
+    if diagnoses and not any(d.get('primary') for d in diagnoses):
+        errors.append('No primary diagnosis')
+
+    total = Decimal('0')
+    for line in bundle.get('lines') or []:
+        if line.get('unit_price') is None:
+            errors.append(f'No tariff for {line["type"]} {line["description"]!r}')
+            continue
+        try:
+            amount = Decimal(line['amount'])
+            expected = Decimal(line['unit_price']) * line['quantity']
+        except (InvalidOperation, TypeError):
+            errors.append(f'Unreadable amount on {line["description"]!r}')
+            continue
+        if line['quantity'] <= 0 or amount != expected:
+            errors.append(f'Line amount mismatch on {line["description"]!r}')
+        total += amount
+
+    if not bundle.get('lines'):
+        errors.append('No billable lines')
+    elif Decimal(bundle['total']) != total:
+        errors.append('Claim total does not match its lines')
+    elif total > Decimal(str(rules['max_amount'])):
+        errors.append(f'Claim total {total} exceeds the {rules["max_amount"]} limit')
+
+    return bundle['consultation_id'], errors
@@ -0,0 +1,136 @@
+import calendar
+from datetime import date
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from accounts.decorators import role_required
+from baringo_hms.pagination import KeysetPaginator
+from security.models import AuditLog
+
+from .insurer import SubmissionError, submit_batch
+from .models import SCHEME_CHOICES, Claim, ClaimBatch
+from .pipeline import release_batch, release_invalid, write_submission_file
+
+
+@login_required
+@role_required('claims_manage')
+def batch_list(request):
+    """
+    Claim batches; POST queues a new batch for a scheme and month, built
+    by the claims worker (manage.py build_claims --worker)
+    """
+    if request.method == 'POST':
+        scheme = request.POST.get('scheme')
+        try:
+            year, month = (int(part) for part in request.POST.get('month', '').split('-'))
+            period_start = date(year, month, 1)
+        except ValueError:
+            messages.error(request, 'Select a valid month')
+            return redirect('claim_batch_list')
+        if scheme not in dict(SCHEME_CHOICES):
+            messages.error(request, 'Select a scheme')
+            return redirect('claim_batch_list')
+        
+        period_end = date(year, month, calendar.monthrange(year, month)[1])
+        batch = ClaimBatch.objects.create(scheme=scheme, period_start=period_start, period_end=period_end,
+                                          status='queued', created_by=request.user)
+        
+        AuditLog.objects.create(
+            user=request.user,
+            action='CREATE',
+            model_name='ClaimBatch',
+            object_id=batch.id,
+            details=f"Claim batch {batch}"
+        )
+        messages.success(request, f'Queued {batch}. Refresh to follow progress.')
+        return redirect('claim_batch_detail', pk=batch.pk)
+    
+    context = {
+        'batches': ClaimBatch.objects.select_related('created_by')[:50],
+        'schemes': SCHEME_CHOICES,
+    }
+    return render(request, 'claims/batch_list.html', context)
+
+
+@login_required
+@role_required('claims_manage')
+def batch_detail(request, pk):
+    """
+    Claims in a batch, filterable by status
+    """
+    batch = get_object_or_404(ClaimBatch, pk=pk)
+    claims = batch.claims.select_related('patient').only(
+        'id', 'member_number', 'visit_date', 'amount', 'status', 'errors', 'insurer_reference',
+        'consultation_id', 'patient__mrn', 'patient__first_name', 'patient__last_name',
+    )
+    status = request.GET.get('status')
+    if status:
+        claims = claims.filter(status=status)
+    
+    page_obj = KeysetPaginator(claims, 50, ordering=('id',)).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'batch': batch,
+        'claims': page_obj,
+        'page_obj': page_obj,
+        'status': status,
+        'statuses': Claim.STATUS_CHOICES,
+    }
+    return render(request, 'claims/batch_detail.html', context)
+
+
+@login_required
+@role_required('claims_manage')
+@require_POST
+def batch_action(request, pk):
+    """
+    Generate the submission file, submit it, or release invalid claims (all
+    claims of a failed batch)
+    """
+    batch = get_object_or_404(ClaimBatch, pk=pk)
+    action = request.POST.get('action')
+    
+    if batch.status in ('queued', 'building'):
+        messages.warning(request, 'The batch is still building')
+    elif action == 'generate':
+        write_submission_file(batch)
+        messages.success(request, f'Submission file written with {batch.valid_claims} claim(s)')
+    elif action == 'submit':
+        try:
+            outcomes = submit_batch(batch)
+        except SubmissionError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, 'Submitted: ' + ', '.join(f'{n} {status}' for status, n in outcomes.items()))
+            AuditLog.objects.create(
+                user=request.user,
+                action='EXPORT',
+                model_name='ClaimBatch',
+                object_id=batch.id,
+                details=f"Submitted claim batch {batch} ({batch.submission_reference})"
+            )
+    elif action == 'release' and batch.status == 'failed':
+        release_batch(batch)
+        messages.success(request, 'Claims from the failed build released')
+    elif action == 'release':
+        released = release_invalid(batch)
+        messages.success(request, f'{released} invalid claim(s) released for correction')
+    else:
+        messages.error(request, 'Unknown action')
+    return redirect('claim_batch_detail', pk=pk)
+
+
+@login_required
+@role_required('claims_manage')
+def download_submission(request, pk):
+    batch = get_object_or_404(ClaimBatch, pk=pk)
+    if not batch.submission_file:
+        raise Http404
+    return FileResponse(batch.submission_file.open('rb'), as_attachment=True,
+                        filename=batch.submission_file.name.rsplit('/', 1)[-1])
@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AppointmentSlot, SlotTemplate
+
+
+@admin.register(SlotTemplate)
+class SlotTemplateAdmin(admin.ModelAdmin):
+    list_display = ('department', 'doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes', 'capacity', 'overbook_limit', 'is_active')
+    list_filter = ('department', 'weekday', 'is_active')
+
+
+@admin.register(AppointmentSlot)
+class AppointmentSlotAdmin(admin.ModelAdmin):
+    list_display = ('department', 'doctor', 'start', 'booked', 'capacity', 'is_blocked', 'is_available')
+    list_filter = ('department', 'is_blocked', 'is_available')
+    date_hierarchy = 'start'
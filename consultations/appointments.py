@@ -0,0 +1,240 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .models import Appointment, AppointmentSlot, Consultation, SlotTemplate
+from .queue import UNASSIGNED_DEPARTMENT
+
+SLOT_HORIZON_DAYS = 28
+FREE_SLOT_LIMIT = 20
+
+
+class BookingError(Exception):
+    pass
+
+
+def _aware(day, clock):
+    return timezone.make_aware(datetime.combine(day, clock))
+
+
+def generate_slots(start_date=None, days=SLOT_HORIZON_DAYS):
+    """
+    Expand active slot templates into AppointmentSlot rows for the next
+    ``days`` days. Existing slots are left untouched (unique on template +
+    start), so this is safe to run nightly. Returns the number of slots in the window.
+    """
+    start_date = start_date or timezone.localdate()
+    templates = list(SlotTemplate.objects.filter(is_active=True))
+    slots = []
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        for template in templates:
+            if template.weekday != day.weekday():
+                continue
+            current = _aware(day, template.start_time)
+            session_end = _aware(day, template.end_time)
+            step = timedelta(minutes=template.slot_minutes)
+            while current + step <= session_end:
+                slots.append(AppointmentSlot(
+                    template=template,
+                    doctor_id=template.doctor_id,
+                    department=template.department or UNASSIGNED_DEPARTMENT,
+                    start=current,
+                    end=current + step,
+                    capacity=template.capacity,
+                    overbook_limit=template.overbook_limit,
+                ))
+                current += step
+    AppointmentSlot.objects.bulk_create(slots, batch_size=1000, ignore_conflicts=True)
+    return len(slots)
+
+
+def free_slots(department=None, doctor=None, after=None, limit=FREE_SLOT_LIMIT, overbook=False):
+    """
+    Earliest open slots for a department or doctor, served from the
+    (department|doctor, is_available, start) index. With ``overbook``, full
+    slots that still have overbooking headroom are included as well.
+    """
+    queryset = AppointmentSlot.objects.filter(start__gte=after or timezone.now())
+    if overbook:
+        queryset = queryset.filter(is_blocked=False, booked__lt=F('capacity') + F('overbook_limit'))
+    else:
+        queryset = queryset.filter(is_available=True, is_blocked=False)
+    if doctor is not None:
+        queryset = queryset.filter(doctor=doctor)
+    if department:
+        queryset = queryset.filter(department=department)
+    return list(queryset.select_related('doctor').order_by('start')[:limit])
+
+
+def next_free_slot(department=None, doctor=None, after=None):
+    slots = free_slots(department=department, doctor=doctor, after=after, limit=1)
+    return slots[0] if slots else None
+
+
+def _adjust_booked(slot_id, delta):
+    # One UPDATE moves the count and recomputes availability from the
+    # pre-update values: available when booked + delta < capacity
+    AppointmentSlot.objects.filter(pk=slot_id, booked__gte=max(0, -delta)).update(
+        booked=F('booked') + delta,
+        is_available=Case(
+            When(is_blocked=False, booked__lt=F('capacity') - delta, then=Value(True)),
+            default=Value(False),
+        ),
+    )
+
+
+def book(slot_id, patient, user, reason='', follow_up_of=None, overbook=False):
+    """
+    Book ``patient`` into a slot.
+
+    The slot row is locked while the count is checked, so concurrent
+    bookings cannot exceed capacity. Past capacity a booking is only
+    accepted with ``overbook`` and within the slot's overbook limit.
+    """
+    with transaction.atomic():
+        slot = AppointmentSlot.objects.select_for_update().get(pk=slot_id)
+        if slot.is_blocked:
+            raise BookingError('This slot is blocked')
+        if slot.end <= timezone.now():
+            raise BookingError('This slot has already passed')
+        if Appointment.objects.filter(slot=slot, patient=patient, status='booked').exists():
+            raise BookingError(f'{patient.full_name} is already booked in this slot')
+
+        is_overbooked = slot.booked >= slot.capacity
+        if is_overbooked and not (overbook and slot.can_overbook):
+            raise BookingError('This slot is full')
+
+        appointment = Appointment.objects.create(
+            slot=slot,
+            patient=patient,
+            doctor_id=slot.doctor_id,
+            department=slot.department,
+            start=slot.start,
+            follow_up_of=follow_up_of,
+            reason=reason,
+            is_overbooked=is_overbooked,
+            created_by=user,
+        )
+        _adjust_booked(slot.pk, 1)
+    return appointment
+
+
+def _release(appointment, status):
+    with transaction.atomic():
+        updated = (Appointment.objects
+                   .filter(pk=appointment.pk, status='booked')
+                   .update(status=status))
+        if not updated:
+            raise BookingError('Only booked appointments can be changed')
+        _adjust_booked(appointment.slot_id, -1)
+    appointment.status = status
+
+
+def cancel(appointment):
+    _release(appointment, 'cancelled')
+
+
+def book_follow_up(consultation, user, overbook=False):
+    """
+    Book the follow-up requested on a consultation into the first free
+    slot on or after ``follow_up_date``: the same doctor if they run
+    sessions, otherwise their department
+    """
+    if not consultation.follow_up_date:
+        raise BookingError('No follow-up date set on this consultation')
+    existing = consultation.follow_up_appointments.filter(status='booked').first()
+    if existing:
+        return existing
+
+    after = max(_aware(consultation.follow_up_date, time.min), timezone.now())
+    slot = None
+    if consultation.doctor_id:
+        slot = next_free_slot(doctor=consultation.doctor, after=after)
+        if slot is None and consultation.doctor.department:
+            slot = next_free_slot(department=consultation.doctor.department, after=after)
+    else:
+        slot = next_free_slot(after=after)
+    if slot is None:
+        raise BookingError('No free slot available after the follow-up date')
+
+    return book(slot.pk, consultation.patient, user,
+                reason=consultation.follow_up_notes[:255] or 'Follow-up',
+                follow_up_of=consultation, overbook=overbook)
+
+
+def check_in(appointment, user):
+    """
+    Patient has arrived: open a waiting consultation so they join the queue
+    """
+    if appointment.status != 'booked':
+        raise BookingError('Only booked appointments can be checked in')
+    with transaction.atomic():
+        visit = Consultation.objects.create(
+            patient=appointment.patient,
+            doctor=appointment.doctor,
+            visit_type='follow_up' if appointment.follow_up_of_id else 'review',
+            status='waiting',
+            chief_complaint=appointment.reason or 'Scheduled appointment',
+            created_by=user,
+        )
+        appointment.status = 'checked_in'
+        appointment.visit = visit
+        appointment.save(update_fields=['status', 'visit'])
+    return visit
+
+
+def _on_day(day):
+    start = _aware(day, time.min)
+    return {'start__gte': start, 'start__lt': start + timedelta(days=1)}
+
+
+def day_book(day, department=None):
+    queryset = (Appointment.objects
+                .filter(**_on_day(day))
+                .exclude(status='cancelled')
+                .select_related('patient', 'doctor'))
+    if department:
+        queryset = queryset.filter(department=department)
+    return list(queryset.order_by('start', 'id'))
+
+
+def reminder_rows(day):
+    """
+    Booked appointments on ``day`` that have not been reminded yet, as flat
+    rows ready for an SMS gateway or a call sheet (one query)
+    """
+    return (Appointment.objects
+            .filter(status='booked', reminder_sent_at__isnull=True, **_on_day(day))
+            .order_by('start')
+            .values('id', 'start', 'department', 'reason',
+                    'patient__mrn', 'patient__first_name', 'patient__last_name',
+                    'patient__phone_number', 'doctor__first_name', 'doctor__last_name'))
+
+
+def reminder_list(day):
+    return list(reminder_rows(day))
+
+
+def mark_reminded(appointment_ids):
+    return (Appointment.objects
+            .filter(pk__in=appointment_ids, reminder_sent_at__isnull=True)
+            .update(reminder_sent_at=timezone.now()))
+
+
+def mark_no_shows(before=None):
+    """
+    Booked appointments whose slot ended before ``before`` become no-shows
+    """
+    before = before or timezone.now()
+    return (Appointment.objects
+            .filter(status='booked', slot__end__lt=before)
+            .update(status='no_show'))
+
+
+def department_names():
+    return list(AppointmentSlot.objects
+                .filter(start__gte=timezone.now())
+                .values_list('department', flat=True).distinct().order_by('department'))
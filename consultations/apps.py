@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ConsultationsConfig(AppConfig):
     name = 'consultations'
+
+    def ready(self):
+        from . import signals  # noqa: F401
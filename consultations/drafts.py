@@ -0,0 +1,181 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from baringo_hms.batching import BatchWriter
+from .forms import ConsultationForm
+from .models import ConsultationDraft
+
+DEFAULT_DRAFT_SETTINGS = {
+    # Saves arriving within this window are merged into one write per draft
+    'COALESCE_SECONDS': 2.0,
+    'MAX_PENDING': 20000,
+    'MAX_VALUE_LENGTH': 20000,
+    # A form page left open longer than this has to be reloaded to autosave
+    'TOKEN_MAX_AGE': 24 * 60 * 60,
+    # Drafts nobody has touched for this long are deleted
+    'RETENTION_DAYS': 7,
+    'PRUNE_INTERVAL': 60 * 60,
+}
+SIGNING_SALT = 'consultations.drafts'
+EDITABLE_FIELDS = frozenset(ConsultationForm.base_fields)
+
+
+class DraftError(Exception):
+    pass
+
+
+def get_draft_settings():
+    config = dict(DEFAULT_DRAFT_SETTINGS)
+    config.update(getattr(settings, 'CONSULTATION_DRAFTS', {}))
+    return config
+
+
+def issue_token(key, patient, user):
+    """
+    Token the form page sends with each save: names the draft, patient and
+    author, so saves need no lookups and cannot touch another user's draft
+    """
+    return signing.dumps({'k': str(key), 'p': patient.pk, 'u': user.pk}, salt=SIGNING_SALT)
+
+
+def read_token(token, user):
+    try:
+        payload = signing.loads(token, salt=SIGNING_SALT, max_age=get_draft_settings()['TOKEN_MAX_AGE'])
+    except signing.BadSignature:
+        raise DraftError('This draft has expired; reload the form to keep autosaving')
+    if payload.get('u') != user.pk:
+        raise DraftError('This draft belongs to another user')
+    return uuid.UUID(payload['k']), payload['p']
+
+
+def clean_delta(fields):
+    """
+    The posted {field: text} changes, limited to the form's fields
+    """
+    if not isinstance(fields, dict) or not fields:
+        raise DraftError('No fields to save')
+    unknown = set(fields) - EDITABLE_FIELDS
+    if unknown:
+        raise DraftError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    limit = get_draft_settings()['MAX_VALUE_LENGTH']
+    cleaned = {}
+    for name, value in fields.items():
+        value = '' if value is None else value
+        if not isinstance(value, str) or len(value) > limit:
+            raise DraftError(f"Invalid value for {name}")
+        cleaned[name] = value
+    return cleaned
+
+
+def open_draft(patient, user):
+    """
+    The user's latest unsubmitted draft for ``patient``, or None
+    """
+    return (ConsultationDraft.objects
+            .filter(patient=patient, author=user, consultation__isnull=True)
+            .order_by('-updated_at')
+            .first())
+
+
+def last_revision(key):
+    """
+    Revision of the draft as written so far (0 if nothing is written yet)
+    """
+    return ConsultationDraft.objects.filter(key=key).values_list('revision', flat=True).first() or 0
+
+
+def link(key, patient, user, consultation):
+    """
+    Mark a draft as submitted, so saves still in flight are ignored. The
+    row is created if none of its saves has been written yet.
+    """
+    ConsultationDraft.objects.update_or_create(
+        key=key,
+        defaults={'patient': patient, 'author': user, 'consultation': consultation},
+    )
+
+
+def prune():
+    """
+    Delete abandoned drafts and submitted ones whose tokens have expired
+    """
+    config = get_draft_settings()
+    now = timezone.now()
+    deleted, _ = ConsultationDraft.objects.filter(
+        Q(consultation__isnull=False, updated_at__lt=now - timedelta(seconds=config['TOKEN_MAX_AGE']))
+        | Q(updated_at__lt=now - timedelta(days=config['RETENTION_DAYS']))
+    ).delete()
+    return deleted
+
+
+class DraftWriter(BatchWriter):
+    """
+    Applies autosaved deltas in batches: every save of a draft queued
+    within COALESCE_SECONDS becomes a single UPDATE (or INSERT), applied
+    in revision order
+    """
+    name = 'consultation-drafts'
+
+    def __init__(self):
+        config = get_draft_settings()
+        super().__init__(batch_size=1000, flush_interval=config['COALESCE_SECONDS'],
+                         max_pending=config['MAX_PENDING'])
+        self.prune_interval = config['PRUNE_INTERVAL']
+        self._pruned_at = None
+
+    def save(self, key, patient_id, author_id, revision, fields):
+        self.submit((key, patient_id, author_id, revision, fields))
+
+    def _apply(self, draft, deltas, now):
+        for revision, fields in deltas:
+            if revision > draft.revision:
+                draft.fields.update(fields)
+                draft.revision = revision
+        draft.updated_at = now
+
+    def write_batch(self, batch):
+        saves = {}
+        for key, patient_id, author_id, revision, fields in sorted(batch, key=lambda item: item[3]):
+            saves.setdefault(key, (patient_id, author_id, []))[2].append((revision, fields))
+
+        existing = {draft.key: draft for draft in ConsultationDraft.objects.filter(key__in=saves)}
+        now = timezone.now()
+        created, updated = [], []
+        for key, (patient_id, author_id, deltas) in saves.items():
+            draft = existing.get(key)
+            if draft is None:
+                draft = ConsultationDraft(key=key, patient_id=patient_id, author_id=author_id)
+                created.append(draft)
+            elif draft.consultation_id is None:
+                updated.append(draft)
+            else:
+                continue
+            self._apply(draft, deltas, now)
+
+        with transaction.atomic():
+            ConsultationDraft.objects.bulk_create(created, ignore_conflicts=True)
+            ConsultationDraft.objects.bulk_update(updated, ['fields', 'revision', 'updated_at'])
+
+        if created:
+            # Another worker may have inserted some of these drafts first;
+            # apply this batch's saves on top of what it wrote
+            ours = {draft.key: (draft.revision, draft.fields) for draft in created}
+            raced = [draft for draft in ConsultationDraft.objects.filter(key__in=ours)
+                     if (draft.revision, draft.fields) != ours[draft.key] and draft.consultation_id is None]
+            for draft in raced:
+                self._apply(draft, saves[draft.key][2], now)
+            ConsultationDraft.objects.bulk_update(raced, ['fields', 'revision', 'updated_at'])
+
+        if self._pruned_at is None or time.monotonic() - self._pruned_at > self.prune_interval:
+            self._pruned_at = time.monotonic()
+            prune()
+
+
+writer = DraftWriter()
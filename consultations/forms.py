@@ -1,16 +1,19 @@
 from django import forms
+from baringo_hms.forms import styled_fields
 from .models import Consultation, Diagnosis, LabOrder
 
+@styled_fields(skip=(forms.CheckboxInput, forms.RadioSelect),
+               optional=['temperature', 'heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic'])
 class ConsultationForm(forms.ModelForm):
     """
     Form for creating/editing consultations
     """
     class Meta:
         model = Consultation
-        exclude = ['created_by', 'created_at', 'updated_at', 'bmi']
+        # The view sets patient and doctor; as fields they rendered a select
+        # of every patient on each page
+        exclude = ['patient', 'doctor', 'created_by', 'created_at', 'updated_at', 'bmi']
         widgets = {
-            'visit_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
-            'visit_time': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
             'follow_up_date': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'chief_complaint': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
             'history_presenting_illness': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
@@ -19,20 +22,9 @@ class ConsultationForm(forms.ModelForm):
             'treatment_plan': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
             'notes': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
         }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields:
-            if not isinstance(self.fields[field].widget, (forms.CheckboxInput, forms.RadioSelect)):
-                self.fields[field].widget.attrs.update({'class': 'form-control'})
-        
-        # Make some fields optional
-        self.fields['temperature'].required = False
-        self.fields['heart_rate'].required = False
-        self.fields['blood_pressure_systolic'].required = False
-        self.fields['blood_pressure_diastolic'].required = False
 
 
+@styled_fields()
 class LabOrderForm(forms.ModelForm):
     """
     Form for ordering lab tests
@@ -43,8 +35,3 @@ class LabOrderForm(forms.ModelForm):
         widgets = {
             'clinical_notes': forms.Textarea(attrs={'rows': 3}),
         }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields:
-            self.fields[field].widget.attrs.update({'class': 'form-control'})
\ No newline at end of file
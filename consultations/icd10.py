@@ -0,0 +1,233 @@
+import re
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from baringo_hms import versions
+from sync import changes as sync_changes
+
+from .models import ICD10_CHAPTERS, Diagnosis, ICD10Code, icd10_chapter
+
+CATALOGUE_VERSION_KEY = 'icd10:version'
+SEARCH_LIMIT = 20
+MAP_BATCH_SIZE = 500
+
+WORD = re.compile(r'[a-z0-9]+')
+CODE_LIKE = re.compile(r'^[A-Za-z]\d')
+STOP_WORDS = {'and', 'of', 'or', 'the', 'with', 'without', 'in', 'by', 'to', 'not', 'other', 'unspecified'}
+
+# Common free-text spellings seen in consultations -> code
+SYNONYMS = {
+    'malaria': 'B54',
+    'uncomplicated malaria': 'B50.9',
+    'hypertension': 'I10',
+    'htn': 'I10',
+    'diabetes': 'E14.9',
+    'dm': 'E14.9',
+    'type 2 diabetes': 'E11.9',
+    'urti': 'J06.9',
+    'upper respiratory infection': 'J06.9',
+    'upper respiratory tract infection': 'J06.9',
+    'common cold': 'J00',
+    'pneumonia': 'J18.9',
+    'gastroenteritis': 'A09',
+    'diarrhoea': 'A09.9',
+    'diarrhea': 'A09.9',
+    'uti': 'N39.0',
+    'urinary tract infection': 'N39.0',
+    'typhoid': 'A01.0',
+    'asthma': 'J45.9',
+    'anaemia': 'D64.9',
+    'anemia': 'D64.9',
+    'pud': 'K29.7',
+    'gastritis': 'K29.7',
+    'hiv': 'B24',
+    'tb': 'A16.9',
+    'ptb': 'A15.0',
+}
+
+
+def _words(text):
+    return [w for w in WORD.findall((text or '').lower()) if w not in STOP_WORDS]
+
+
+class TrieNode:
+    __slots__ = ('children', 'codes')
+
+    def __init__(self):
+        self.children = {}
+        self.codes = set()
+
+
+class Trie:
+    """
+    Prefix tree where every node keeps the codes reachable beneath it, so a
+    prefix lookup is one walk down the tree with no subtree traversal
+    """
+    def __init__(self):
+        self.root = TrieNode()
+
+    def insert(self, key, code):
+        node = self.root
+        for char in key:
+            node = node.children.setdefault(char, TrieNode())
+            node.codes.add(code)
+
+    def prefixed(self, prefix):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return set()
+        return node.codes
+
+
+class ICD10Index:
+    """
+    In-memory search over the ICD-10 catalogue: a trie on codes and a trie
+    on title words. Built once per process, rebuilt when the catalogue
+    version in the shared cache changes.
+    """
+    def __init__(self):
+        self._version = None
+        self._built = False
+        self._lock = threading.Lock()
+        self.titles = {}
+        self.code_trie = Trie()
+        self.word_trie = Trie()
+
+    def _build(self):
+        titles = dict(ICD10Code.objects.values_list('code', 'title'))
+        code_trie, word_trie = Trie(), Trie()
+        for code, title in titles.items():
+            code_trie.insert(code.replace('.', ''), code)
+            for word in set(_words(title)):
+                word_trie.insert(word, code)
+        self.titles, self.code_trie, self.word_trie = titles, code_trie, word_trie
+
+    def ensure_built(self):
+        version = cache.get(CATALOGUE_VERSION_KEY, 0)
+        if not self._built or version != self._version:
+            with self._lock:
+                if not self._built or version != self._version:
+                    self._build()
+                    self._version = version
+                    self._built = True
+
+    def search(self, term, limit=SEARCH_LIMIT):
+        """
+        Codes matching a code prefix ("J18", "j189") or every word prefix of
+        a title query ("acute resp"), best matches first
+        """
+        self.ensure_built()
+        term = (term or '').strip()
+        if not term:
+            return []
+        if CODE_LIKE.match(term):
+            matches = self.code_trie.prefixed(term.upper().replace('.', ''))
+            ranked = sorted(matches, key=lambda code: (len(code), code))
+        else:
+            words = _words(term)
+            if not words:
+                return []
+            sets = sorted((self.word_trie.prefixed(word) for word in words), key=len)
+            matches = set(sets[0]).intersection(*sets[1:])
+            lowered = term.lower()
+            ranked = sorted(matches, key=lambda code: (
+                not self.titles[code].lower().startswith(lowered),
+                len(self.titles[code]),
+                code,
+            ))
+        return [{'code': code, 'title': self.titles[code], 'chapter': icd10_chapter(code)}
+                for code in ranked[:limit]]
+
+    def best_match(self, text):
+        """
+        Single code for a free-text diagnosis, or None: synonyms, exact code
+        or title, then the shortest title containing every word
+        """
+        self.ensure_built()
+        cleaned = ' '.join(WORD.findall((text or '').lower()))
+        if not cleaned:
+            return None
+        code = SYNONYMS.get(cleaned)
+        if code and code in self.titles:
+            return code
+        candidate = text.strip().upper()
+        if candidate in self.titles:
+            return candidate
+        results = self.search(text, limit=1)
+        return results[0]['code'] if results else None
+
+
+index = ICD10Index()
+
+
+def invalidate_index():
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, 1, timeout=None)
+
+
+def code_consultations(consultations):
+    """
+    Create a primary coded Diagnosis for each consultation that has none,
+    mapping its free-text diagnosis. Identical texts are matched once.
+    Returns (coded, unmatched texts with counts).
+    """
+    matched, unmatched, rows = {}, Counter(), []
+    for consultation in consultations:
+        text = (consultation.diagnosis or '').strip()
+        if not text:
+            continue
+        key = text.lower()
+        if key not in matched:
+            matched[key] = index.best_match(text)
+        code = matched[key]
+        if code is None:
+            unmatched[text] += 1
+            continue
+        rows.append(Diagnosis(
+            consultation_id=consultation.pk,
+            code=code,
+            description=index.titles[code],
+            is_primary=True,
+            chapter=icd10_chapter(code),
+            diagnosed_on=consultation.visit_date,
+        ))
+    Diagnosis.objects.bulk_create(rows, batch_size=MAP_BATCH_SIZE)
+    # bulk_create sends no signals; log the rows for offline devices
+    sync_changes.record('diagnosis', [row.pk for row in rows])
+    versions.touch('consultation', {row.consultation_id for row in rows}, 'related')
+    return len(rows), unmatched
+
+
+def top_codes(start_date, end_date, limit=10):
+    """
+    Most frequent primary diagnosis codes in a date range
+    """
+    rows = list(Diagnosis.objects
+                .filter(diagnosed_on__range=(start_date, end_date), is_primary=True)
+                .exclude(code='')
+                .values('code')
+                .annotate(count=Count('code'))
+                .order_by('-count', 'code')[:limit])
+    titles = dict(ICD10Code.objects.filter(code__in=[r['code'] for r in rows]).values_list('code', 'title'))
+    return [{**row, 'title': titles.get(row['code'], '')} for row in rows]
+
+
+def chapter_counts(start_date, end_date):
+    """
+    Primary diagnoses per ICD-10 chapter in a date range, in chapter order
+    """
+    counts = dict(Diagnosis.objects
+                  .filter(diagnosed_on__range=(start_date, end_date), is_primary=True)
+                  .exclude(chapter='')
+                  .values_list('chapter')
+                  .annotate(count=Count('chapter'))
+                  .order_by())
+    return [{'chapter': numeral, 'title': title, 'count': counts[numeral]}
+            for numeral, _, _, title in ICD10_CHAPTERS if numeral in counts]
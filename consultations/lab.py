@@ -0,0 +1,171 @@
+import statistics
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from baringo_hms import versions
+from integrations import outbox
+
+from .models import LabOrder
+
+# Highest priority first; each is served by its own index range scan
+PRIORITY_ORDER = ('stat', 'urgent', 'routine')
+
+# action -> (statuses it applies to, resulting status)
+TRANSITIONS = {
+    'collect': (('ordered',), 'collected'),
+    'process': (('collected',), 'processing'),
+    'complete': (('collected', 'processing'), 'completed'),
+    'cancel': (('ordered', 'collected', 'processing'), 'cancelled'),
+}
+
+WORKLIST_STAGES = ('ordered', 'collected', 'processing')
+TURNAROUND_CACHE_TIMEOUT = 300
+TURNAROUND_PERIODS = (7, 30, 90)
+
+
+class TransitionError(Exception):
+    pass
+
+
+def worklist(stage='ordered', limit=100):
+    """
+    Pending orders for one stage, STAT first, then urgent, then routine,
+    oldest first within each priority.
+
+    Each priority is fetched separately so every query is an ordered range
+    scan on the (status, priority, ordered_date) index that stops after
+    ``limit`` rows, instead of sorting the whole backlog on a CASE expression.
+    """
+    orders = []
+    base = (LabOrder.objects
+            .filter(status=stage)
+            .select_related('consultation__patient', 'ordered_by')
+            .only('id', 'test_name', 'priority', 'status', 'ordered_date', 'collected_date',
+                  'clinical_notes', 'consultation__id', 'consultation__patient__mrn',
+                  'consultation__patient__first_name', 'consultation__patient__last_name',
+                  'ordered_by__first_name', 'ordered_by__last_name', 'ordered_by__username'))
+    for priority in PRIORITY_ORDER:
+        remaining = limit - len(orders)
+        if remaining <= 0:
+            break
+        orders.extend(base.filter(priority=priority).order_by('ordered_date')[:remaining])
+    return orders
+
+
+def worklist_counts():
+    """
+    Number of pending orders per (stage, priority)
+    """
+    counts = defaultdict(dict)
+    rows = (LabOrder.objects
+            .filter(status__in=WORKLIST_STAGES)
+            .values_list('status', 'priority')
+            .annotate(n=Count('id'))
+            .order_by())
+    for status, priority, n in rows:
+        counts[status][priority] = n
+    return counts
+
+
+def transition(order_ids, action, user, results=None):
+    """
+    Apply ``action`` to a rack of orders in one transaction.
+
+    Rows are locked, every order must be in a state the action applies to
+    (otherwise nothing changes), and the status/timestamp update is a single
+    UPDATE. ``results`` optionally maps order id -> result text for 'complete'.
+    Returns the number of orders updated.
+    """
+    if action not in TRANSITIONS:
+        raise TransitionError(f"Unknown action: {action}")
+    allowed_from, new_status = TRANSITIONS[action]
+    order_ids = {int(pk) for pk in order_ids}
+    if not order_ids:
+        return 0
+
+    now = timezone.now()
+    with transaction.atomic():
+        current = dict(
+            LabOrder.objects.select_for_update()
+            .filter(pk__in=order_ids)
+            .values_list('pk', 'status')
+        )
+        missing = order_ids - current.keys()
+        invalid = sorted(pk for pk, status in current.items() if status not in allowed_from)
+        if missing or invalid:
+            raise TransitionError(
+                f"Cannot {action} orders {sorted(missing | set(invalid))}: "
+                f"not found or not in {', '.join(allowed_from)}"
+            )
+
+        changes = {'status': new_status}
+        if action == 'collect':
+            changes['collected_date'] = now
+        elif action == 'complete':
+            changes.update(result_date=now, performed_by=user)
+        updated = LabOrder.objects.filter(pk__in=order_ids).update(**changes)
+        changed = set(changes)
+
+        if action == 'complete' and results:
+            with_results = [LabOrder(pk=int(pk), results=text)
+                            for pk, text in results.items() if int(pk) in order_ids and text]
+            LabOrder.objects.bulk_update(with_results, ['results'])
+            changed.add('results')
+        # Queryset updates send no signals: publish the orders to the outbox
+        # in this transaction and refresh their consultations by hand
+        orders = list(LabOrder.objects.filter(pk__in=order_ids))
+        outbox.emit_many('lab_order', orders, 'updated', changed)
+        versions.touch('consultation', {order.consultation_id for order in orders}, 'related')
+
+    if action == 'complete':
+        cache.delete_many([_turnaround_key(days) for days in TURNAROUND_PERIODS])
+    return updated
+
+
+def _percentile(sorted_values, fraction):
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return statistics.quantiles(sorted_values, n=100, method='inclusive')[int(fraction * 100) - 1]
+
+
+def _turnaround_key(days):
+    return f"lab:turnaround:{days}"
+
+
+def turnaround_stats(days=30):
+    """
+    Turnaround time (order to result, in minutes) percentiles per test
+    over the last ``days`` days, cached for a few minutes.
+    """
+    key = _turnaround_key(days)
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    since = timezone.now() - timedelta(days=days)
+    durations = defaultdict(list)
+    rows = (LabOrder.objects
+            .filter(status='completed', result_date__gte=since)
+            .values_list('test_name', 'ordered_date', 'result_date')
+            .iterator(chunk_size=2000))
+    for test_name, ordered, resulted in rows:
+        durations[test_name].append((resulted - ordered).total_seconds() / 60)
+
+    stats = []
+    for test_name, values in sorted(durations.items()):
+        values.sort()
+        stats.append({
+            'test_name': test_name,
+            'count': len(values),
+            'p50': round(_percentile(values, 0.50), 1),
+            'p90': round(_percentile(values, 0.90), 1),
+            'p95': round(_percentile(values, 0.95), 1),
+            'max': round(values[-1], 1),
+        })
+    cache.set(key, stats, TURNAROUND_CACHE_TIMEOUT)
+    return stats
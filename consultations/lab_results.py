@@ -0,0 +1,172 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from baringo_hms import versions
+
+from .models import LabOrder, LabResult
+
+IMPORT_BATCH_SIZE = 500
+
+# Accepted header spellings from the analyzer exports
+COLUMN_ALIASES = {
+    'order_id': ('order_id', 'order', 'sample_id', 'accession'),
+    'analyte': ('analyte', 'test', 'parameter'),
+    'value': ('value', 'result'),
+    'unit': ('unit', 'units'),
+    'reference_low': ('ref_low', 'reference_low', 'low'),
+    'reference_high': ('ref_high', 'reference_high', 'high'),
+    'result_date': ('timestamp', 'result_date', 'date'),
+}
+
+
+NOT_UTF8 = 'The file is not UTF-8 text; export it from the analyzer as CSV (UTF-8)'
+
+# The widest value LabResult's decimal columns hold
+MAX_VALUE = Decimal('1e8')
+
+
+def _decimal(value):
+    if value is None or str(value).strip() == '':
+        return None
+    number = Decimal(str(value).strip())
+    if not number.is_finite() or abs(number) >= MAX_VALUE:
+        # NaN and Infinity parse, but cannot be compared or stored
+        raise InvalidOperation(value)
+    return number
+
+
+def _column_map(fieldnames):
+    normalized = {name.strip().lower(): name for name in fieldnames or []}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                mapping[field] = normalized[alias]
+                break
+    return mapping
+
+
+def import_analyzer_csv(uploaded_file, user):
+    """
+    Bulk-load analyzer CSV results.
+
+    Order -> patient ids are resolved with one query per batch, flags are
+    computed in Python and rows are written with bulk_create, so a
+    thousand-line export costs a handful of statements. A result already
+    stored for the same order, analyte and time is skipped, so importing
+    a file twice adds nothing. Returns ``(created, errors)`` where errors
+    is a list of (line number, message).
+    """
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    try:
+        columns = _column_map(reader.fieldnames)
+    except UnicodeDecodeError:
+        return 0, [(1, NOT_UTF8)]
+    # The result time is part of the re-import key, so it is required
+    missing = {'order_id', 'analyte', 'value', 'result_date'} - columns.keys()
+    if missing:
+        return 0, [(1, f"Missing column(s): {', '.join(sorted(COLUMN_ALIASES[field][0] for field in missing))}")]
+
+    created, errors, batch, seen = 0, [], [], set()
+
+    def flush(rows):
+        order_ids = {row['lab_order_id'] for _, row in rows}
+        orders = list(LabOrder.objects.filter(pk__in=order_ids)
+                      .values_list('pk', 'consultation__patient_id', 'consultation_id'))
+        patients = {pk: patient_id for pk, patient_id, _ in orders}
+        consultations = {pk: consultation_id for pk, _, consultation_id in orders}
+        stored = set(LabResult.objects.filter(lab_order_id__in=order_ids)
+                     .values_list('lab_order_id', 'analyte', 'result_date'))
+        results = []
+        for line, row in rows:
+            patient_id = patients.get(row['lab_order_id'])
+            if patient_id is None:
+                errors.append((line, f"Unknown lab order {row['lab_order_id']}"))
+                continue
+            key = (row['lab_order_id'], row['analyte'], row['result_date'])
+            if key in stored or key in seen:
+                errors.append((line, 'Already imported'))
+                continue
+            seen.add(key)
+            result = LabResult(patient_id=patient_id, entered_by=user, **row)
+            result.flag = result.compute_flag()
+            results.append(result)
+        LabResult.objects.bulk_create(results)
+        versions.touch('consultation', {consultations[result.lab_order_id] for result in results}, 'related')
+        return len(results)
+
+    try:
+        with transaction.atomic():
+            for line, raw in enumerate(reader, start=2):
+                def cell(field):
+                    return (raw.get(columns[field]) or '').strip() if field in columns else ''
+                try:
+                    result_date = parse_datetime(cell('result_date'))
+                    if result_date is None:
+                        errors.append((line, 'Missing or unreadable timestamp'))
+                        continue
+                    if timezone.is_naive(result_date):
+                        result_date = timezone.make_aware(result_date)
+                    row = {
+                        'lab_order_id': int(cell('order_id')),
+                        'analyte': cell('analyte'),
+                        'value': _decimal(cell('value')),
+                        'unit': cell('unit'),
+                        'reference_low': _decimal(cell('reference_low')),
+                        'reference_high': _decimal(cell('reference_high')),
+                        'result_date': result_date,
+                    }
+                except (ValueError, TypeError, InvalidOperation):
+                    errors.append((line, 'Unreadable value'))
+                    continue
+                if not row['analyte'] or row['value'] is None:
+                    errors.append((line, 'Analyte and value are required'))
+                    continue
+                batch.append((line, row))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    created += flush(batch)
+                    batch = []
+            if batch:
+                created += flush(batch)
+    except UnicodeDecodeError:
+        # Rolled back: nothing from the file is kept
+        return 0, [(reader.line_num + 1, NOT_UTF8)]
+    return created, errors
+
+
+def trend_series(patient_id, analytes):
+    """
+    Column-oriented time series for charting, from a single indexed query:
+    ``{analyte: {'unit', 'dates', 'values', 'flags', 'reference_low', 'reference_high'}}``
+    """
+    series = {}
+    rows = (LabResult.objects
+            .filter(patient_id=patient_id, analyte__in=analytes)
+            .order_by('analyte', 'result_date')
+            .values_list('analyte', 'result_date', 'value', 'flag', 'unit',
+                         'reference_low', 'reference_high'))
+    for analyte, result_date, value, flag, unit, low, high in rows:
+        column = series.get(analyte)
+        if column is None:
+            column = series[analyte] = {
+                'unit': unit, 'dates': [], 'values': [], 'flags': [],
+                'reference_low': None, 'reference_high': None,
+            }
+        column['dates'].append(result_date.isoformat())
+        column['values'].append(float(value))
+        column['flags'].append(flag)
+        # Latest reference range wins
+        column['reference_low'] = float(low) if low is not None else column['reference_low']
+        column['reference_high'] = float(high) if high is not None else column['reference_high']
+    return series
+
+
+def patient_analytes(patient_id):
+    return list(LabResult.objects.filter(patient_id=patient_id)
+                .values_list('analyte', flat=True).distinct().order_by('analyte'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from consultations.appointments import SLOT_HORIZON_DAYS, generate_slots, mark_no_shows
+
+
+class Command(BaseCommand):
+    help = 'Expand slot templates into bookable slots ahead of time and close out missed appointments (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=SLOT_HORIZON_DAYS)
+
+    def handle(self, *args, **options):
+        slots = generate_slots(days=options['days'])
+        no_shows = mark_no_shows()
+        self.stdout.write(self.style.SUCCESS(
+            f'{slots} slot(s) scheduled over the next {options["days"]} days; {no_shows} no-show(s) recorded'
+        ))
@@ -0,0 +1,41 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consultations.icd10 import invalidate_index
+from consultations.models import ICD10Code, icd10_chapter
+
+DEFAULT_FILE = Path(__file__).resolve().parents[2] / 'data' / 'icd10.csv'
+
+
+class Command(BaseCommand):
+    help = 'Load or update the ICD-10 catalogue from a CSV with code and title columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_FILE))
+
+    def handle(self, *args, **options):
+        try:
+            handle = open(options['path'], newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        codes = {}
+        with handle:
+            for row in csv.DictReader(handle):
+                code = (row.get('code') or '').strip().upper()
+                title = (row.get('title') or '').strip()
+                if code and title:
+                    codes[code] = ICD10Code(code=code, title=title[:255], chapter=icd10_chapter(code))
+
+        ICD10Code.objects.bulk_create(
+            codes.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['code'],
+            update_fields=['title', 'chapter'],
+        )
+        # bulk_create sends no signals
+        invalidate_index()
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(codes)} ICD-10 codes'))
@@ -0,0 +1,62 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from consultations.icd10 import MAP_BATCH_SIZE, code_consultations, index
+from consultations.models import Consultation
+
+
+class Command(BaseCommand):
+    help = ('Code free-text consultation diagnoses against the ICD-10 catalogue, in batches. '
+            'Lists the proposed codes for review; nothing is written without --apply')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--apply', action='store_true',
+                            help='Create the coded diagnoses after reviewing the proposals')
+        parser.add_argument('--show-unmatched', type=int, default=20,
+                            help='Number of unmatched diagnosis texts to list')
+
+    def handle(self, *args, **options):
+        consultations = (Consultation.objects
+                         .filter(diagnoses__isnull=True)
+                         .only('id', 'diagnosis', 'visit_date')
+                         .order_by('id'))
+        if not options['apply']:
+            self.propose(consultations, options['show_unmatched'])
+            return
+
+        coded, unmatched, batch = 0, Counter(), []
+        for consultation in consultations.iterator(chunk_size=MAP_BATCH_SIZE):
+            batch.append(consultation)
+            if len(batch) >= MAP_BATCH_SIZE:
+                count, missed = code_consultations(batch)
+                coded += count
+                unmatched.update(missed)
+                batch = []
+        count, missed = code_consultations(batch)
+        coded += count
+        unmatched.update(missed)
+
+        self.stdout.write(self.style.SUCCESS(f'Coded {coded} consultation(s)'))
+        for text, count in unmatched.most_common(options['show_unmatched']):
+            self.stdout.write(f'  unmatched ({count}): {text}')
+
+    def propose(self, consultations, show_unmatched):
+        # One line per distinct text, most frequent first, so a coder can check each mapping
+        texts = (consultations.exclude(diagnosis='')
+                 .values('diagnosis')
+                 .annotate(count=Count('id'))
+                 .order_by('-count', 'diagnosis'))
+        matched, unmatched = 0, Counter()
+        for row in texts:
+            code = index.best_match(row['diagnosis'])
+            if code is None:
+                unmatched[row['diagnosis']] += row['count']
+                continue
+            matched += row['count']
+            self.stdout.write(f"  ({row['count']}) {row['diagnosis']} -> {code} {index.titles[code]}")
+        self.stdout.write(self.style.WARNING(
+            f'{matched} consultation(s) would be coded. Review the mappings above, then re-run with --apply'))
+        for text, count in unmatched.most_common(show_unmatched):
+            self.stdout.write(f'  unmatched ({count}): {text}')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from consultations.models import Consultation, VitalSigns
+from consultations.vitals import news2, rebuild_summary, vitals_from_consultation, VITAL_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Backfill the vital_signs table and per-patient summaries from existing consultations'
+
+    def handle(self, *args, **options):
+        consultations = (Consultation.objects
+                         .only('id', 'patient_id', 'created_at', 'temperature', 'heart_rate',
+                               'respiratory_rate', 'blood_pressure_systolic',
+                               'blood_pressure_diastolic', 'oxygen_saturation',
+                               'weight', 'height', 'bmi')
+                         .order_by('id'))
+        existing = set(VitalSigns.objects.values_list('consultation_id', flat=True))
+        batch, patients = [], set()
+        for consultation in consultations.iterator(chunk_size=2000):
+            if consultation.pk in existing:
+                continue
+            vitals = vitals_from_consultation(consultation)
+            if all(vitals[field] is None for field in VITAL_FIELDS):
+                continue
+            score, risk = news2(vitals)
+            batch.append(VitalSigns(
+                consultation_id=consultation.pk,
+                patient_id=consultation.patient_id,
+                recorded_at=consultation.created_at,
+                news2_score=score,
+                news2_risk=risk,
+                **vitals,
+            ))
+            patients.add(consultation.patient_id)
+            if len(batch) >= 1000:
+                VitalSigns.objects.bulk_create(batch)
+                batch = []
+        VitalSigns.objects.bulk_create(batch)
+        
+        for patient_id in patients:
+            rebuild_summary(patient_id)
+        
+        self.stdout.write(self.style.SUCCESS(f'Vitals rebuilt for {len(patients)} patients'))
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from patients.models import Patient
 from accounts.models import User
@@ -79,6 +79,64 @@ class Consultation(models.Model):
         if self.weight and self.height:
             height_m = self.height / 100
             self.bmi = self.weight / (height_m * height_m)
+        # post_save handlers (outbox events, sync log) commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+# ICD-10 chapters: (numeral, first block, last block, title)
+ICD10_CHAPTERS = [
+    ('I', 'A00', 'B99', 'Certain infectious and parasitic diseases'),
+    ('II', 'C00', 'D48', 'Neoplasms'),
+    ('III', 'D50', 'D89', 'Diseases of the blood and blood-forming organs and certain disorders involving the immune mechanism'),
+    ('IV', 'E00', 'E90', 'Endocrine, nutritional and metabolic diseases'),
+    ('V', 'F00', 'F99', 'Mental and behavioural disorders'),
+    ('VI', 'G00', 'G99', 'Diseases of the nervous system'),
+    ('VII', 'H00', 'H59', 'Diseases of the eye and adnexa'),
+    ('VIII', 'H60', 'H95', 'Diseases of the ear and mastoid process'),
+    ('IX', 'I00', 'I99', 'Diseases of the circulatory system'),
+    ('X', 'J00', 'J99', 'Diseases of the respiratory system'),
+    ('XI', 'K00', 'K93', 'Diseases of the digestive system'),
+    ('XII', 'L00', 'L99', 'Diseases of the skin and subcutaneous tissue'),
+    ('XIII', 'M00', 'M99', 'Diseases of the musculoskeletal system and connective tissue'),
+    ('XIV', 'N00', 'N99', 'Diseases of the genitourinary system'),
+    ('XV', 'O00', 'O99', 'Pregnancy, childbirth and the puerperium'),
+    ('XVI', 'P00', 'P96', 'Certain conditions originating in the perinatal period'),
+    ('XVII', 'Q00', 'Q99', 'Congenital malformations, deformations and chromosomal abnormalities'),
+    ('XVIII', 'R00', 'R99', 'Symptoms, signs and abnormal clinical and laboratory findings, not elsewhere classified'),
+    ('XIX', 'S00', 'T98', 'Injury, poisoning and certain other consequences of external causes'),
+    ('XX', 'V01', 'Y98', 'External causes of morbidity and mortality'),
+    ('XXI', 'Z00', 'Z99', 'Factors influencing health status and contact with health services'),
+    ('XXII', 'U00', 'U99', 'Codes for special purposes'),
+]
+
+
+def icd10_chapter(code):
+    block = (code or '').strip().upper()[:3]
+    for numeral, first, last, _ in ICD10_CHAPTERS:
+        if first <= block <= last:
+            return numeral
+    return ''
+
+
+class ICD10Code(models.Model):
+    """
+    ICD-10 catalogue entry, loaded from consultations/data/icd10.csv
+    """
+    code = models.CharField(max_length=10, unique=True)
+    title = models.CharField(max_length=255)
+    chapter = models.CharField(max_length=5, db_index=True)
+    
+    class Meta:
+        db_table = 'icd10_codes'
+        ordering = ['code']
+    
+    def __str__(self):
+        return f"{self.code} - {self.title}"
+    
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        self.chapter = icd10_chapter(self.code)
         super().save(*args, **kwargs)
 
 
@@ -91,12 +149,27 @@ class Diagnosis(models.Model):
     description = models.CharField(max_length=500)
     is_primary = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
+    # Denormalised from the code and the consultation so report aggregates
+    # are answered from the (diagnosed_on, is_primary, chapter, code) index alone
+    chapter = models.CharField(max_length=5, blank=True)
+    diagnosed_on = models.DateField(null=True, blank=True)
     
     class Meta:
         db_table = 'diagnoses'
+        indexes = [
+            models.Index(fields=['diagnosed_on', 'is_primary', 'chapter', 'code']),
+            models.Index(fields=['consultation', 'is_primary']),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.description}"
+    
+    def save(self, *args, **kwargs):
+        self.code = self.code.strip().upper()
+        self.chapter = icd10_chapter(self.code)
+        if self.diagnosed_on is None:
+            self.diagnosed_on = self.consultation.visit_date
+        super().save(*args, **kwargs)
 
 
 class LabOrder(models.Model):
@@ -124,6 +197,7 @@ class LabOrder(models.Model):
     ordered_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='ordered_tests')
     ordered_date = models.DateTimeField(auto_now_add=True)
     clinical_notes = models.TextField(blank=True)
+    collected_date = models.DateTimeField(null=True, blank=True)
     
     # Results
     results = models.TextField(blank=True)
@@ -132,6 +206,277 @@ class LabOrder(models.Model):
     
     class Meta:
         db_table = 'lab_orders'
+        indexes = [
+            # Worklist: pending orders by priority, oldest first
+            models.Index(fields=['status', 'priority', 'ordered_date']),
+            # Turnaround statistics over completed orders
+            models.Index(fields=['status', 'result_date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.test_name} - {self.consultation.patient.mrn}"
+    
+    def save(self, *args, **kwargs):
+        # post_save handlers (outbox events) commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class LabResult(models.Model):
+    """
+    Structured, numeric lab result (one analyte of a lab order)
+    """
+    FLAG_CHOICES = [
+        ('N', 'Normal'),
+        ('L', 'Low'),
+        ('H', 'High'),
+    ]
+    
+    lab_order = models.ForeignKey(LabOrder, on_delete=models.CASCADE, related_name='structured_results')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='lab_results')
+    analyte = models.CharField(max_length=100, help_text="e.g., HbA1c, CD4, Hb")
+    value = models.DecimalField(max_digits=12, decimal_places=4)
+    unit = models.CharField(max_length=30, blank=True)
+    reference_low = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    reference_high = models.DecimalField(max_digits=12, decimal_places=4, null=True, blank=True)
+    flag = models.CharField(max_length=1, choices=FLAG_CHOICES, default='N')
+    result_date = models.DateTimeField()
+    entered_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='entered_lab_results')
+    
+    class Meta:
+        db_table = 'lab_results'
+        ordering = ['result_date']
+        indexes = [
+            # Longitudinal trend: one patient, one analyte, in date order
+            models.Index(fields=['patient', 'analyte', 'result_date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.analyte} {self.value} {self.unit}"
+    
+    def compute_flag(self):
+        if self.reference_low is not None and self.value < self.reference_low:
+            return 'L'
+        if self.reference_high is not None and self.value > self.reference_high:
+            return 'H'
+        return 'N'
+    
+    def save(self, *args, **kwargs):
+        self.flag = self.compute_flag()
+        super().save(*args, **kwargs)
+
+
+class VitalSigns(models.Model):
+    """
+    Compact per-visit vitals with the NEWS2 early-warning score, maintained
+    from Consultation saves so trend views never read full consultation rows
+    """
+    RISK_CHOICES = [
+        ('low', 'Low'),
+        ('low_medium', 'Low-Medium'),
+        ('medium', 'Medium'),
+        ('high', 'High'),
+    ]
+    
+    consultation = models.OneToOneField(Consultation, on_delete=models.CASCADE, related_name='vital_signs')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='vital_signs')
+    recorded_at = models.DateTimeField()
+    temperature = models.FloatField(null=True, blank=True)
+    heart_rate = models.SmallIntegerField(null=True, blank=True)
+    respiratory_rate = models.SmallIntegerField(null=True, blank=True)
+    systolic = models.SmallIntegerField(null=True, blank=True)
+    diastolic = models.SmallIntegerField(null=True, blank=True)
+    oxygen_saturation = models.SmallIntegerField(null=True, blank=True)
+    weight = models.FloatField(null=True, blank=True)
+    height = models.FloatField(null=True, blank=True)
+    bmi = models.FloatField(null=True, blank=True)
+    news2_score = models.SmallIntegerField(default=0)
+    news2_risk = models.CharField(max_length=20, choices=RISK_CHOICES, default='low')
+    
+    class Meta:
+        db_table = 'vital_signs'
+        ordering = ['recorded_at']
+        indexes = [
+            models.Index(fields=['patient', 'recorded_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient_id} - {self.recorded_at} - NEWS2 {self.news2_score}"
+
+
+class PatientVitalsSummary(models.Model):
+    """
+    Rolling per-patient vitals statistics, updated incrementally on each visit
+    """
+    patient = models.OneToOneField(Patient, on_delete=models.CASCADE, primary_key=True, related_name='vitals_summary')
+    visits = models.IntegerField(default=0)
+    # {vital: [count, mean, m2]} running accumulators (Welford)
+    stats = models.JSONField(default=dict)
+    last_recorded_at = models.DateTimeField(null=True, blank=True)
+    last_score = models.SmallIntegerField(default=0)
+    previous_score = models.SmallIntegerField(null=True, blank=True)
+    last_risk = models.CharField(max_length=20, choices=VitalSigns.RISK_CHOICES, default='low')
+    
+    class Meta:
+        db_table = 'patient_vitals_summary'
+        indexes = [
+            models.Index(fields=['last_score', 'last_recorded_at']),
+        ]
+    
+    @property
+    def score_change(self):
+        if self.previous_score is None:
+            return 0
+        return self.last_score - self.previous_score
+
+
+class SlotTemplate(models.Model):
+    """
+    Weekly clinic session for a doctor or department, expanded into
+    AppointmentSlot rows ahead of time
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                               limit_choices_to={'role': 'doctor'}, related_name='slot_templates')
+    department = models.CharField(max_length=100, blank=True, help_text="Defaults to the doctor's department")
+    weekday = models.SmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=15)
+    capacity = models.PositiveSmallIntegerField(default=1, help_text="Patients per slot")
+    overbook_limit = models.PositiveSmallIntegerField(default=0, help_text="Extra bookings allowed per slot when overbooking")
+    is_active = models.BooleanField(default=True)
+    
+    class Meta:
+        db_table = 'slot_templates'
+        ordering = ['department', 'weekday', 'start_time']
+    
+    def __str__(self):
+        return f"{self.department or self.doctor} - {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+    
+    def save(self, *args, **kwargs):
+        if not self.department and self.doctor_id:
+            self.department = self.doctor.department
+        super().save(*args, **kwargs)
+
+
+class AppointmentSlot(models.Model):
+    """
+    One bookable time slot with its running booking count.
+    
+    ``is_available`` is maintained on every booking/cancellation so "next
+    free slot" is a range scan on (department|doctor, is_available, start)
+    rather than a count over appointments.
+    """
+    template = models.ForeignKey(SlotTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='slots')
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='appointment_slots')
+    department = models.CharField(max_length=100)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    capacity = models.PositiveSmallIntegerField(default=1)
+    overbook_limit = models.PositiveSmallIntegerField(default=0)
+    booked = models.PositiveSmallIntegerField(default=0)
+    is_blocked = models.BooleanField(default=False)
+    is_available = models.BooleanField(default=True)
+    
+    class Meta:
+        db_table = 'appointment_slots'
+        ordering = ['start']
+        unique_together = [('template', 'start')]
+        indexes = [
+            models.Index(fields=['department', 'is_available', 'start']),
+            models.Index(fields=['doctor', 'is_available', 'start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.department} {self.start:%Y-%m-%d %H:%M} ({self.booked}/{self.capacity})"
+    
+    @property
+    def can_overbook(self):
+        return not self.is_blocked and self.booked < self.capacity + self.overbook_limit
+    
+    def save(self, *args, **kwargs):
+        # Blocking (or resizing) a slot in the admin changes its availability too
+        self.is_available = not self.is_blocked and self.booked < self.capacity
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'is_available' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'is_available']
+        super().save(*args, **kwargs)
+
+
+class Appointment(models.Model):
+    """
+    A patient booked into a slot, optionally as the follow-up of a consultation
+    """
+    STATUS_CHOICES = [
+        ('booked', 'Booked'),
+        ('checked_in', 'Checked In'),
+        ('cancelled', 'Cancelled'),
+        ('no_show', 'No Show'),
+    ]
+    
+    slot = models.ForeignKey(AppointmentSlot, on_delete=models.PROTECT, related_name='appointments')
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
+    doctor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='appointments')
+    department = models.CharField(max_length=100)
+    start = models.DateTimeField()
+    follow_up_of = models.ForeignKey(Consultation, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='follow_up_appointments')
+    visit = models.OneToOneField(Consultation, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='appointment')
+    reason = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='booked')
+    is_overbooked = models.BooleanField(default=False)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='booked_appointments')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'appointments'
+        ordering = ['start']
+        indexes = [
+            models.Index(fields=['status', 'start']),
+            models.Index(fields=['patient', 'start']),
+            models.Index(fields=['department', 'start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.mrn} - {self.start:%Y-%m-%d %H:%M} - {self.department}"
+
+
+class ConsultationDraft(models.Model):
+    """
+    Autosaved, unsubmitted consultation form of one clinician for one patient.
+
+    ``fields`` holds only the form fields typed so far, as submitted text;
+    ``revision`` is the client's save counter, so late or repeated saves
+    are not applied twice. Submitting the form links the draft to the
+    consultation it became, after which further saves are ignored.
+    """
+    key = models.UUIDField(unique=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='consultation_drafts')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='consultation_drafts')
+    fields = models.JSONField(default=dict)
+    revision = models.PositiveIntegerField(default=0)
+    consultation = models.OneToOneField(Consultation, on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='draft')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'consultation_drafts'
+        indexes = [
+            models.Index(fields=['patient', 'author', 'updated_at']),
+        ]
     
     def __str__(self):
-        return f"{self.test_name} - {self.consultation.patient.mrn}"
\ No newline at end of file
+        return f"Draft {self.key} - {self.patient_id} by {self.author_id} (rev {self.revision})"
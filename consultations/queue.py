@@ -0,0 +1,293 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from integrations.models import OutboxEvent
+from patients.summary import summaries
+
+ACTIVE_STATUSES = ('waiting', 'in_progress')
+UNASSIGNED_DEPARTMENT = 'General OPD'
+EVENT_HISTORY = 500
+SUBSCRIBER_BUFFER = 200
+# How often a process reads consultation changes saved by other processes
+# from the outbox, and how long an event may take to commit after its id
+POLL_SECONDS = 2
+SETTLE_SECONDS = 5
+
+# Event ids are "<process>-<seq>" so a client reconnecting after a restart,
+# or to another worker, gets a fresh snapshot instead of a bogus replay.
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def department_of(consultation):
+    doctor = consultation.doctor
+    return (doctor.department if doctor and doctor.department else UNASSIGNED_DEPARTMENT)
+
+
+def queue_entry(consultation, patient=None):
+    # The board only needs the patient's MRN and name, from the summary cache
+    patient = patient or summaries.get(consultation.patient_id)
+    doctor = consultation.doctor
+    return {
+        'id': consultation.pk,
+        'mrn': patient.mrn,
+        'patient': patient.full_name,
+        'status': consultation.status,
+        'visit_type': consultation.visit_type,
+        'doctor': (doctor.get_full_name() or doctor.username) if doctor else None,
+        'arrived': consultation.created_at.isoformat() if consultation.created_at else None,
+    }
+
+
+def queue_sort_key(entry):
+    # Emergencies first, then patients already being seen, then arrival order
+    return (
+        entry['visit_type'] != 'emergency',
+        entry['status'] != 'in_progress',
+        entry['arrived'] or '',
+        entry['id'],
+    )
+
+
+class Subscriber:
+    """
+    One connected SSE client: an asyncio queue bound to the client's event loop
+    """
+    __slots__ = ('loop', 'queue', 'stale')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self.stale = False
+
+    def _offer(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: it will be resent a full snapshot
+            self.stale = True
+
+    def publish(self, event):
+        # Called from whichever thread saved the consultation
+        self.loop.call_soon_threadsafe(self._offer, event)
+
+
+class DepartmentQueue:
+    """
+    Live queue for one department with a bounded event history for catch-up
+    """
+    def __init__(self, slug, name):
+        self.slug = slug
+        self.name = name
+        self.entries = {}
+        self.events = deque(maxlen=EVENT_HISTORY)
+        self.subscribers = set()
+        self._seq = itertools.count(1)
+        self.last_event_id = f"{BOOT_ID}-0"
+
+    def snapshot(self):
+        return sorted(self.entries.values(), key=queue_sort_key)
+
+    def _emit(self, action, payload):
+        event_id = f"{BOOT_ID}-{next(self._seq)}"
+        event = {'id': event_id, 'action': action, **payload}
+        self.events.append(event)
+        self.last_event_id = event_id
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.publish(event)
+            except RuntimeError:
+                # Event loop already closed
+                self.subscribers.discard(subscriber)
+
+    def upsert(self, entry):
+        if self.entries.get(entry['id']) == entry:
+            return
+        self.entries[entry['id']] = entry
+        self._emit('upsert', {'entry': entry})
+
+    def remove(self, consultation_id):
+        if self.entries.pop(consultation_id, None) is not None:
+            self._emit('remove', {'entry_id': consultation_id})
+
+    def events_since(self, last_event_id):
+        """
+        Events after last_event_id, or None if they are no longer buffered
+        """
+        if not last_event_id:
+            return None
+        if last_event_id == self.last_event_id:
+            return []
+        boot, _, seq = last_event_id.partition('-')
+        if boot != BOOT_ID or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if not self.events or int(self.events[0]['id'].split('-')[1]) > seq + 1:
+            return None
+        return [e for e in self.events if int(e['id'].split('-')[1]) > seq]
+
+
+class QueueBoard:
+    """
+    Per-process registry of department queues.
+
+    The first access loads every active consultation in a single query.
+    Saves in this process update the board once they commit; saves in
+    other worker processes are picked up by sync(), which reads the
+    consultation events in the outbox at most every POLL_SECONDS, so one
+    cheap query per process serves every connected screen.
+    """
+    def __init__(self):
+        self.departments = {}
+        self._placement = {}
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._loaded = False
+        self._cursor = 0
+        self._synced = 0.0
+
+    def _department(self, name):
+        slug = slugify(name)
+        queue = self.departments.get(slug)
+        if queue is None:
+            queue = self.departments[slug] = DepartmentQueue(slug, name)
+        return queue
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        from .models import Consultation
+
+        with self._lock:
+            if self._loaded:
+                return
+            # Changes after this point are replayed by sync()
+            self._cursor = self._settled_cursor()
+            self._synced = time.monotonic()
+            active = list(Consultation.objects
+                          .filter(status__in=ACTIVE_STATUSES)
+                          .select_related('doctor'))
+            patients = summaries.get_many(consultation.patient_id for consultation in active)
+            for consultation in active:
+                self._place(consultation, patients[consultation.patient_id])
+            self._loaded = True
+
+    def _place(self, consultation, patient=None):
+        queue = self._department(department_of(consultation))
+        previous = self._placement.get(consultation.pk)
+        if previous and previous != queue.slug:
+            self.departments[previous].remove(consultation.pk)
+        self._placement[consultation.pk] = queue.slug
+        queue.upsert(queue_entry(consultation, patient))
+
+    def consultation_changed(self, consultation):
+        if not self._loaded:
+            # Nobody is watching yet; the initial load will pick it up
+            return
+        with self._lock:
+            if consultation.status in ACTIVE_STATUSES:
+                self._place(consultation)
+            else:
+                self.consultation_removed(consultation.pk)
+
+    def consultation_removed(self, consultation_id):
+        with self._lock:
+            slug = self._placement.pop(consultation_id, None)
+            if slug:
+                self.departments[slug].remove(consultation_id)
+
+    def _settled_cursor(self):
+        # Events older than SETTLE_SECONDS have committed; newer ones may
+        # still be joined by lower ids, so they are read again next time
+        settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+        return (OutboxEvent.objects.filter(aggregate='consultation', created_at__lte=settled)
+                .aggregate(latest=Max('id'))['latest'] or 0)
+
+    def sync(self):
+        """
+        Apply consultation changes saved by other processes since the last
+        sync. Re-applying a change is harmless: rows are re-read and
+        unchanged entries emit nothing.
+        """
+        from .models import Consultation
+
+        if not self._loaded or time.monotonic() - self._synced < POLL_SECONDS:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return  # another thread is syncing
+        try:
+            self._synced = time.monotonic()
+            cursor = self._settled_cursor()
+            changed = set(OutboxEvent.objects
+                          .filter(aggregate='consultation', id__gt=self._cursor)
+                          .values_list('object_id', flat=True))
+            if changed:
+                consultations = {consultation.pk: consultation for consultation in
+                                 Consultation.objects.filter(pk__in=changed).select_related('doctor')}
+                for consultation_id in changed:
+                    if consultation_id in consultations:
+                        self.consultation_changed(consultations[consultation_id])
+                    else:
+                        self.consultation_removed(consultation_id)
+            self._cursor = max(self._cursor, cursor)
+        finally:
+            self._sync_lock.release()
+
+    def get(self, slug):
+        self.ensure_loaded()
+        self.sync()
+        with self._lock:
+            return self.departments.get(slug)
+
+    def summary(self):
+        self.ensure_loaded()
+        self.sync()
+        with self._lock:
+            return sorted(
+                ({'slug': q.slug, 'name': q.name, 'count': len(q.entries)}
+                 for q in self.departments.values()),
+                key=lambda d: d['name'],
+            )
+
+    def subscribe(self, slug, last_event_id=None):
+        """
+        Register a subscriber and return it with the catch-up payload, or
+        Nones for a department with no queue
+        """
+        loop = asyncio.get_running_loop()
+        self.ensure_loaded()
+        with self._lock:
+            queue = self.departments.get(slug)
+            if queue is None:
+                return None, None, None
+            subscriber = Subscriber(loop)
+            queue.subscribers.add(subscriber)
+            missed = queue.events_since(last_event_id)
+            if missed is None:
+                missed = [self.snapshot_event(queue)]
+        return queue, subscriber, missed
+
+    def unsubscribe(self, queue, subscriber):
+        with self._lock:
+            queue.subscribers.discard(subscriber)
+
+    def snapshot_event(self, queue):
+        # Signal handlers change the entries from other threads
+        with self._lock:
+            return {'id': queue.last_event_id, 'action': 'snapshot', 'entries': queue.snapshot()}
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: queue\ndata: {json.dumps(event)}\n\n"
+
+
+board = QueueBoard()
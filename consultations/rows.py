@@ -0,0 +1,41 @@
+from django.db.models.functions import Substr
+
+from baringo_hms.rows import Row, full_name
+
+from .models import Consultation
+
+STATUS_LABELS = dict(Consultation.STATUS_CHOICES)
+VISIT_TYPE_LABELS = dict(Consultation.VISIT_TYPE_CHOICES)
+COMPLAINT_PREVIEW = 80
+
+
+class ConsultationRow(Row):
+    """
+    Consultation list entry
+    """
+    __slots__ = ('id', 'visit_date', 'visit_time', 'visit_type', 'status', 'complaint',
+                 'patient_mrn', 'patient_first_name', 'patient_last_name',
+                 'doctor_first_name', 'doctor_last_name')
+    columns = {
+        # Only the start of the complaint is shown; the clinical text columns are never read
+        'complaint': Substr('chief_complaint', 1, COMPLAINT_PREVIEW),
+        'patient_mrn': 'patient__mrn',
+        'patient_first_name': 'patient__first_name',
+        'patient_last_name': 'patient__last_name',
+        'doctor_first_name': 'doctor__first_name',
+        'doctor_last_name': 'doctor__last_name',
+    }
+
+    @property
+    def patient_name(self):
+        return full_name(self.patient_first_name, self.patient_last_name)
+
+    @property
+    def doctor_name(self):
+        return full_name(self.doctor_first_name, self.doctor_last_name)
+
+    def get_status_display(self):
+        return STATUS_LABELS.get(self.status, self.status)
+
+    def get_visit_type_display(self):
+        return VISIT_TYPE_LABELS.get(self.visit_type, self.visit_type)
@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from baringo_hms import versions
+from patients import fragments
+
+from .icd10 import invalidate_index
+from .models import Consultation, Diagnosis, ICD10Code, LabOrder, VitalSigns
+from .queue import board
+from .vitals import record_vitals
+
+
+@receiver(post_save, sender=Consultation)
+def update_queue_board(sender, instance, **kwargs):
+    # A rolled-back save must not move the board
+    transaction.on_commit(lambda: board.consultation_changed(instance))
+
+
+@receiver(post_save, sender=Consultation)
+def update_vital_signs(sender, instance, update_fields=None, **kwargs):
+    # Status-only saves (queue moves) do not touch vitals
+    if update_fields and not set(update_fields) - {'status', 'doctor', 'updated_at'}:
+        return
+    record_vitals(instance)
+
+
+@receiver(post_save, sender=ICD10Code)
+@receiver(post_delete, sender=ICD10Code)
+def icd10_catalogue_changed(sender, **kwargs):
+    invalidate_index()
+
+
+@receiver(post_delete, sender=Consultation)
+def remove_from_queue_board(sender, instance, **kwargs):
+    consultation_id = instance.pk
+    transaction.on_commit(lambda: board.consultation_removed(consultation_id))
+
+
+@receiver(post_save, sender=Consultation)
+@receiver(post_delete, sender=Consultation)
+def refresh_chart_consultations(sender, instance, **kwargs):
+    fragments.touch(instance.patient_id, 'consultations')
+
+
+@receiver(post_save, sender=LabOrder)
+@receiver(post_delete, sender=LabOrder)
+@receiver(post_save, sender=Diagnosis)
+@receiver(post_delete, sender=Diagnosis)
+@receiver(post_save, sender=VitalSigns)
+def refresh_consultation_related(sender, instance, **kwargs):
+    versions.touch('consultation', instance.consultation_id, 'related')
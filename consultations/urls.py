@@ -5,5 +5,29 @@ urlpatterns = [
     path('', views.consultation_list, name='consultation_list'),
     path('<int:pk>/', views.consultation_detail, name='consultation_detail'),
     path('new/<str:mrn>/', views.new_consultation, name='new_consultation'),
+    path('drafts/autosave/', views.autosave_consultation, name='consultation_autosave'),
     path('<int:consultation_id>/lab/', views.order_lab_test, name='order_lab_test'),
+    path('<int:pk>/status/', views.update_consultation_status, name='update_consultation_status'),
+    
+    # Laboratory worklist
+    path('lab/worklist/', views.lab_worklist, name='lab_worklist'),
+    path('lab/worklist/batch/', views.lab_batch_transition, name='lab_batch_transition'),
+    path('lab/turnaround/', views.lab_turnaround, name='lab_turnaround'),
+    path('lab/results/upload/', views.lab_results_upload, name='lab_results_upload'),
+    
+    # Early warning
+    path('vitals/deteriorating/', views.deteriorating_patients, name='deteriorating_patients'),
+    
+    # Appointments
+    path('appointments/', views.appointment_list, name='appointment_list'),
+    path('appointments/book/<str:mrn>/', views.book_appointment, name='book_appointment'),
+    path('appointments/<int:pk>/action/', views.appointment_action, name='appointment_action'),
+    path('appointments/reminders/', views.appointment_reminders, name='appointment_reminders'),
+    path('<int:pk>/follow-up/', views.book_follow_up, name='book_follow_up'),
+    
+    # Live queue board
+    path('queue/', views.queue_board, name='queue_board'),
+    path('queue/<slug:department>/', views.queue_board, name='queue_board_department'),
+    path('queue/<slug:department>/snapshot/', views.queue_snapshot_api, name='queue_snapshot_api'),
+    path('queue/<slug:department>/stream/', views.queue_stream, name='queue_stream'),
 ]
\ No newline at end of file
@@ -0,0 +1,226 @@
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PatientVitalsSummary, VitalSigns
+
+VITAL_FIELDS = (
+    'temperature', 'heart_rate', 'respiratory_rate', 'systolic',
+    'diastolic', 'oxygen_saturation', 'weight', 'bmi',
+)
+
+# NEWS2 bands: (upper bound inclusive, points), checked in order
+NEWS2_BANDS = {
+    'respiratory_rate': [(8, 3), (11, 1), (20, 0), (24, 2), (math.inf, 3)],
+    'oxygen_saturation': [(91, 3), (93, 2), (95, 1), (math.inf, 0)],
+    'systolic': [(90, 3), (100, 2), (110, 1), (219, 0), (math.inf, 3)],
+    'heart_rate': [(40, 3), (50, 1), (90, 0), (110, 1), (130, 2), (math.inf, 3)],
+    'temperature': [(35.0, 3), (36.0, 1), (38.0, 0), (39.0, 1), (math.inf, 2)],
+}
+
+DETERIORATION_SCORE = 5
+DETERIORATION_RISE = 2
+
+
+def news2(vitals):
+    """
+    NEWS2 score and risk band from whichever parameters were recorded.
+
+    Consciousness and supplemental oxygen are not captured on the
+    consultation form and are scored as alert / room air.
+    """
+    score = 0
+    red_flag = False
+    for field, bands in NEWS2_BANDS.items():
+        value = vitals.get(field)
+        if value is None:
+            continue
+        for upper, points in bands:
+            if value <= upper:
+                score += points
+                red_flag = red_flag or points == 3
+                break
+    if score >= 7:
+        risk = 'high'
+    elif score >= 5:
+        risk = 'medium'
+    elif red_flag:
+        risk = 'low_medium'
+    else:
+        risk = 'low'
+    return score, risk
+
+
+def _float(value):
+    return float(value) if value is not None else None
+
+
+def vitals_from_consultation(consultation):
+    return {
+        'temperature': _float(consultation.temperature),
+        'heart_rate': consultation.heart_rate,
+        'respiratory_rate': consultation.respiratory_rate,
+        'systolic': consultation.blood_pressure_systolic,
+        'diastolic': consultation.blood_pressure_diastolic,
+        'oxygen_saturation': consultation.oxygen_saturation,
+        'weight': _float(consultation.weight),
+        'height': _float(consultation.height),
+        'bmi': _float(consultation.bmi),
+    }
+
+
+def _accumulate(stats, vitals):
+    # Welford's online mean/variance, one accumulator per vital
+    for field in VITAL_FIELDS:
+        value = vitals.get(field)
+        if value is None:
+            continue
+        count, mean, m2 = stats.get(field, (0, 0.0, 0.0))
+        count += 1
+        delta = value - mean
+        mean += delta / count
+        m2 += delta * (value - mean)
+        stats[field] = [count, mean, m2]
+    return stats
+
+
+def record_vitals(consultation):
+    """
+    Upsert the compact vitals row for a consultation and roll it into the
+    patient's summary. New visits update the summary incrementally; edits to
+    an existing visit rebuild it from the patient's vitals rows.
+    """
+    vitals = vitals_from_consultation(consultation)
+    if all(vitals[field] is None for field in VITAL_FIELDS):
+        return None
+
+    score, risk = news2(vitals)
+    with transaction.atomic():
+        row, created = VitalSigns.objects.update_or_create(
+            consultation_id=consultation.pk,
+            defaults={
+                'patient_id': consultation.patient_id,
+                'recorded_at': consultation.created_at or timezone.now(),
+                'news2_score': score,
+                'news2_risk': risk,
+                **vitals,
+            },
+        )
+        if not created:
+            rebuild_summary(consultation.patient_id)
+            return row
+
+        summary, _ = (PatientVitalsSummary.objects.select_for_update()
+                      .get_or_create(patient_id=consultation.patient_id))
+        summary.stats = _accumulate(summary.stats or {}, vitals)
+        summary.visits += 1
+        if summary.last_recorded_at is None or row.recorded_at >= summary.last_recorded_at:
+            summary.previous_score = summary.last_score if summary.last_recorded_at else None
+            summary.last_score = score
+            summary.last_risk = risk
+            summary.last_recorded_at = row.recorded_at
+        summary.save()
+    return row
+
+
+def rebuild_summary(patient_id):
+    rows = list(VitalSigns.objects.filter(patient_id=patient_id)
+                .order_by('recorded_at')
+                .values('recorded_at', 'news2_score', 'news2_risk', *VITAL_FIELDS))
+    if not rows:
+        PatientVitalsSummary.objects.filter(patient_id=patient_id).delete()
+        return None
+    stats = {}
+    for row in rows:
+        _accumulate(stats, row)
+    summary, _ = PatientVitalsSummary.objects.update_or_create(
+        patient_id=patient_id,
+        defaults={
+            'visits': len(rows),
+            'stats': stats,
+            'last_recorded_at': rows[-1]['recorded_at'],
+            'last_score': rows[-1]['news2_score'],
+            'last_risk': rows[-1]['news2_risk'],
+            'previous_score': rows[-2]['news2_score'] if len(rows) > 1 else None,
+        },
+    )
+    return summary
+
+
+def summary_statistics(summary):
+    """
+    Mean and standard deviation per vital from the running accumulators
+    """
+    result = {}
+    for field, (count, mean, m2) in (summary.stats or {}).items():
+        result[field] = {
+            'count': count,
+            'mean': round(mean, 2),
+            'sd': round(math.sqrt(m2 / (count - 1)), 2) if count > 1 else 0.0,
+        }
+    return result
+
+
+def latest_vitals(patient_id):
+    return (VitalSigns.objects.filter(patient_id=patient_id)
+            .order_by('-recorded_at').values(*VITAL_FIELDS, 'height').first())
+
+
+def trend_series(patient_id, fields=VITAL_FIELDS + ('news2_score',), since=None):
+    """
+    Vitals time series as arrays, with per-series statistics computed
+    vectorised over the whole history: latest, mean, min, max, a 3-visit
+    rolling mean and the least-squares slope per day.
+    """
+    queryset = VitalSigns.objects.filter(patient_id=patient_id)
+    if since:
+        queryset = queryset.filter(recorded_at__gte=since)
+    rows = list(queryset.order_by('recorded_at').values_list('recorded_at', *fields))
+    if not rows:
+        return {'dates': [], 'series': {}}
+
+    dates = [row[0] for row in rows]
+    days = np.array([d.timestamp() for d in dates]) / 86400.0
+    matrix = np.array([row[1:] for row in rows], dtype=float)  # None -> nan
+
+    series = {}
+    for index, field in enumerate(fields):
+        values = matrix[:, index]
+        present = ~np.isnan(values)
+        entry = {'values': [None if np.isnan(v) else float(v) for v in values]}
+        if present.any():
+            observed = values[present]
+            entry.update(
+                latest=float(observed[-1]),
+                mean=round(float(observed.mean()), 2),
+                min=float(observed.min()),
+                max=float(observed.max()),
+            )
+            window = min(3, observed.size)
+            rolling = np.convolve(observed, np.ones(window) / window, mode='valid')
+            entry['rolling_mean'] = [round(float(v), 2) for v in rolling]
+            if observed.size > 1 and np.ptp(days[present]) > 0:
+                entry['slope_per_day'] = round(float(np.polyfit(days[present], observed, 1)[0]), 4)
+        series[field] = entry
+    return {'dates': [d.isoformat() for d in dates], 'series': series}
+
+
+def deteriorating_patients(hours=24, min_score=DETERIORATION_SCORE,
+                           min_rise=DETERIORATION_RISE, limit=100):
+    """
+    Patients seen in the last ``hours`` whose latest NEWS2 is high or has
+    risen sharply since their previous visit, read from the summary table.
+    """
+    since = timezone.now() - timedelta(hours=hours)
+    return (PatientVitalsSummary.objects
+            .filter(last_recorded_at__gte=since)
+            .filter(Q(last_score__gte=min_score) |
+                    Q(previous_score__isnull=False, last_score__gte=F('previous_score') + min_rise))
+            .select_related('patient')
+            .only('patient__mrn', 'patient__first_name', 'patient__last_name',
+                  'last_score', 'previous_score', 'last_risk', 'last_recorded_at', 'visits')
+            .order_by('-last_score', '-last_recorded_at')[:limit])
@@ -0,0 +1,14 @@
+from django.contrib import admin
+
+from .models import OutboxEvent, SinkCursor
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'topic', 'object_id', 'created_at')
+    list_filter = ('aggregate', 'topic')
+
+
+@admin.register(SinkCursor)
+class SinkCursorAdmin(admin.ModelAdmin):
+    list_display = ('sink', 'last_event_id', 'delivered', 'last_delivered_at', 'failures', 'next_attempt_at')
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class IntegrationsConfig(AppConfig):
+    name = 'integrations'
+
+    def ready(self):
+        from . import signals  # noqa: F401
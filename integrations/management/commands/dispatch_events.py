@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from integrations.outbox import dispatch_all, lag_metrics, load_sinks, prune
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox events to the configured sinks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sink', action='append', help='Only these sinks (repeatable)')
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help='Keep running, polling for new events every SECONDS')
+        parser.add_argument('--max-seconds', type=float,
+                            help='Stop each round after this long even if sinks are behind')
+        parser.add_argument('--stats', action='store_true', help='Print lag per sink and exit')
+        parser.add_argument('--prune', action='store_true', help='Delete delivered events past retention')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            for sink in lag_metrics()['sinks']:
+                self.stdout.write(
+                    f"{sink['sink']}: at #{sink['position']}, {sink['behind']} behind, "
+                    f"lag {sink['lag_seconds']}s, {sink['failures']} failure(s) {sink['last_error']}"
+                )
+            return
+        if options['prune']:
+            self.stdout.write(f'Pruned {prune()} delivered event(s)')
+            return
+
+        sinks = load_sinks()
+        if options['sink']:
+            unknown = set(options['sink']) - {sink.name for sink in sinks}
+            if unknown:
+                raise CommandError(f"Unknown sink(s): {', '.join(sorted(unknown))}")
+            sinks = [sink for sink in sinks if sink.name in options['sink']]
+
+        while True:
+            delivered = dispatch_all(sinks, max_seconds=options['max_seconds'])
+            if any(delivered.values()):
+                self.stdout.write(', '.join(f'{name}: {count}' for name, count in delivered.items()))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+        self.stdout.write(self.style.SUCCESS('Outbox dispatched'))
@@ -0,0 +1,44 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class OutboxEvent(models.Model):
+    """
+    Change event for downstream systems, written in the same transaction as
+    the row it describes. Ids give the delivery order.
+    """
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=60, help_text="e.g. patient.created, lab_order.updated")
+    aggregate = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    changed = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'outbox_events'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"#{self.id} {self.topic} {self.object_id}"
+
+
+class SinkCursor(models.Model):
+    """
+    Delivery position of one sink: the last event it has acknowledged
+    """
+    sink = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    delivered = models.BigIntegerField(default=0)
+    last_delivered_at = models.DateTimeField(null=True, blank=True)
+    failures = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    lease_until = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'outbox_sink_cursors'
+        ordering = ['sink']
+    
+    def __str__(self):
+        return f"{self.sink} @ {self.last_event_id}"
@@ -0,0 +1,205 @@
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent, SinkCursor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_SETTINGS = {
+    'BATCH_SIZE': 500,
+    # Only events at least this old are dispatched, so an event whose
+    # transaction commits after a later id is not skipped
+    'SETTLE_SECONDS': 2,
+    'RETRY_DELAY': 5,               # seconds, doubled per consecutive failure
+    'MAX_RETRY_DELAY': 15 * 60,
+    'LEASE_SECONDS': 5 * 60,        # a dispatcher holds a sink this long at most
+    'RETENTION_DAYS': 30,           # delivered events older than this are pruned
+    'SINKS': {
+        'events-file': {
+            'CLASS': 'integrations.sinks.FileSink',
+            'DIRECTORY': os.path.join(settings.BASE_DIR, 'outbox'),
+        },
+    },
+}
+
+# Columns published per aggregate
+PAYLOAD_FIELDS = {
+    'patient': ('id', 'mrn', 'first_name', 'middle_name', 'last_name', 'date_of_birth', 'gender',
+                'phone_number', 'county', 'sub_county', 'village', 'national_id', 'nhif_number',
+                'is_active', 'updated_at'),
+    'consultation': ('id', 'patient_id', 'doctor_id', 'visit_date', 'visit_time', 'visit_type', 'status',
+                     'chief_complaint', 'diagnosis', 'follow_up_date', 'updated_at'),
+    'lab_order': ('id', 'consultation_id', 'test_name', 'priority', 'status', 'ordered_date',
+                  'collected_date', 'result_date', 'results'),
+}
+
+
+def get_outbox_settings():
+    config = dict(DEFAULT_OUTBOX_SETTINGS)
+    config.update(getattr(settings, 'OUTBOX', {}))
+    return config
+
+
+def _event(aggregate, instance, action, changed):
+    return OutboxEvent(
+        topic=f'{aggregate}.{action}',
+        aggregate=aggregate,
+        object_id=instance.pk,
+        payload={field: getattr(instance, field) for field in PAYLOAD_FIELDS[aggregate]},
+        changed=sorted(changed),
+    )
+
+
+def emit(aggregate, instance, action, changed=()):
+    """
+    Write an event for ``instance``. Call inside the transaction that
+    changes the row so the two commit or roll back together.
+    """
+    event = _event(aggregate, instance, action, changed)
+    event.save()
+    return event
+
+
+def emit_many(aggregate, instances, action, changed=()):
+    """
+    emit() for rows written by queryset updates or bulk writes, which send
+    no signals; one INSERT for all the events
+    """
+    return OutboxEvent.objects.bulk_create(
+        [_event(aggregate, instance, action, changed) for instance in instances], batch_size=1000)
+
+
+def envelope(event):
+    return {
+        'id': event.id,
+        'topic': event.topic,
+        'object_id': event.object_id,
+        'occurred_at': event.created_at,
+        'changed': event.changed,
+        'data': event.payload,
+    }
+
+
+def load_sinks():
+    return [import_string(options['CLASS'])(name, options)
+            for name, options in get_outbox_settings()['SINKS'].items()]
+
+
+def _acquire(name, config):
+    # Conditional UPDATE: one dispatcher per sink at a time
+    now = timezone.now()
+    SinkCursor.objects.get_or_create(sink=name)
+    return SinkCursor.objects.filter(
+        Q(lease_until__isnull=True) | Q(lease_until__lt=now),
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+        sink=name,
+    ).update(lease_until=now + timedelta(seconds=config['LEASE_SECONDS']))
+
+
+def dispatch(sink):
+    """
+    Deliver the next batch of events to one sink, in id order.
+
+    The cursor only moves once the sink has accepted the batch, so a
+    crash or failed delivery means the batch is sent again (at least
+    once). Failures back off exponentially. Returns events delivered,
+    or None when there was nothing to do.
+    """
+    config = get_outbox_settings()
+    if not _acquire(sink.name, config):
+        return None
+    cursor = SinkCursor.objects.get(pk=sink.name)
+    try:
+        settled = timezone.now() - timedelta(seconds=config['SETTLE_SECONDS'])
+        events = list(OutboxEvent.objects
+                      .filter(id__gt=cursor.last_event_id, created_at__lte=settled)
+                      .order_by('id')[:config['BATCH_SIZE']])
+        if not events:
+            return None
+        batch = [envelope(event) for event in events if sink.wants(event.topic)]
+        try:
+            if batch:
+                sink.deliver(batch)
+        except Exception as exc:
+            cursor.failures += 1
+            cursor.last_error = str(exc)[:2000]
+            delay = min(config['RETRY_DELAY'] * 2 ** (cursor.failures - 1), config['MAX_RETRY_DELAY'])
+            cursor.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+            logger.warning("Outbox sink %s failed (attempt %d): %s", sink.name, cursor.failures, exc)
+            return 0
+        cursor.last_event_id = events[-1].id
+        cursor.delivered += len(batch)
+        cursor.failures = 0
+        cursor.last_error = ''
+        cursor.next_attempt_at = None
+        cursor.last_delivered_at = timezone.now()
+        return len(batch)
+    finally:
+        cursor.lease_until = None
+        cursor.save()
+
+
+def dispatch_all(sinks=None, max_seconds=None):
+    """
+    Drain every sink until each is caught up, failing, or ``max_seconds``
+    have passed. Returns events delivered per sink.
+    """
+    sinks = sinks if sinks is not None else load_sinks()
+    started = time.monotonic()
+    delivered = {sink.name: 0 for sink in sinks}
+    active = list(sinks)
+    while active and (max_seconds is None or time.monotonic() - started < max_seconds):
+        for sink in list(active):
+            count = dispatch(sink)
+            if not count:
+                active.remove(sink)
+            else:
+                delivered[sink.name] += count
+    return delivered
+
+
+def lag_metrics():
+    """
+    Per sink: events not yet delivered, age of the oldest of them, and the
+    delivery state
+    """
+    now = timezone.now()
+    latest = OutboxEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+    cursors = {cursor.sink: cursor for cursor in SinkCursor.objects.all()}
+    metrics = []
+    for name in get_outbox_settings()['SINKS']:
+        cursor = cursors.get(name) or SinkCursor(sink=name)
+        oldest = (OutboxEvent.objects.filter(id__gt=cursor.last_event_id)
+                  .order_by('id').values_list('created_at', flat=True).first())
+        metrics.append({
+            'sink': name,
+            'position': cursor.last_event_id,
+            'behind': OutboxEvent.objects.filter(id__gt=cursor.last_event_id).count(),
+            'lag_seconds': round((now - oldest).total_seconds()) if oldest else 0,
+            'delivered': cursor.delivered,
+            'last_delivered_at': cursor.last_delivered_at,
+            'failures': cursor.failures,
+            'last_error': cursor.last_error,
+            'next_attempt_at': cursor.next_attempt_at,
+        })
+    return {'latest_event': latest, 'sinks': metrics}
+
+
+def prune():
+    """
+    Delete events every configured sink has received and that are past
+    the retention period
+    """
+    config = get_outbox_settings()
+    positions = [SinkCursor.objects.filter(pk=name).values_list('last_event_id', flat=True).first() or 0
+                 for name in config['SINKS']]
+    cutoff = timezone.now() - timedelta(days=config['RETENTION_DAYS'])
+    deleted, _ = OutboxEvent.objects.filter(id__lte=min(positions, default=0), created_at__lt=cutoff).delete()
+    return deleted
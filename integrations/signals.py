@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+
+from consultations.models import Consultation, LabOrder
+from patients.models import Patient
+
+from .outbox import emit
+
+AGGREGATES = {
+    Patient: 'patient',
+    Consultation: 'consultation',
+    LabOrder: 'lab_order',
+}
+
+
+def publish_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return  # fixture loading
+    emit(AGGREGATES[sender], instance, 'created' if created else 'updated',
+         set(update_fields or ()) - {'updated_at'})
+
+
+def publish_delete(sender, instance, **kwargs):
+    emit(AGGREGATES[sender], instance, 'deleted')
+
+
+for model in AGGREGATES:
+    post_save.connect(publish_save, sender=model, dispatch_uid=f'outbox-save-{model._meta.label}')
+    post_delete.connect(publish_delete, sender=model, dispatch_uid=f'outbox-delete-{model._meta.label}')
@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import json
+import os
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+
+class DeliveryError(Exception):
+    pass
+
+
+class Sink:
+    """
+    Destination for outbox events. Subclasses implement ``deliver``, which
+    must either accept the whole batch or raise; a failed batch is offered
+    again, so consumers should ignore event ids they have already seen.
+    """
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.topics = tuple(options.get('TOPICS') or ())
+
+    def wants(self, topic):
+        # TOPICS are prefixes ('lab_order.', 'patient.created'); none means all
+        return not self.topics or topic.startswith(self.topics)
+
+    def deliver(self, events):
+        raise NotImplementedError
+
+
+class FileSink(Sink):
+    """
+    Appends events as JSON lines to one file per day, for integrations that
+    pick up files (county reporting exports, backups)
+    """
+    def deliver(self, events):
+        directory = self.options['DIRECTORY']
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}-{timezone.localdate():%Y%m%d}.jsonl")
+        with open(path, 'a', encoding='utf-8') as handle:
+            for event in events:
+                handle.write(json.dumps(event, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+class LocalEndpoint:
+    """
+    Stand-in for a webhook receiver, used when a webhook sink has no URL
+    and DEBUG is on.
+    Acknowledges batches the way a well-behaved consumer would: events it
+    has already seen are skipped, and events must arrive in order.
+    """
+    def __init__(self):
+        self.received = []
+        self.last_id = 0
+
+    def receive(self, body):
+        accepted = 0
+        for event in json.loads(body)['events']:
+            if event['id'] <= self.last_id:
+                continue
+            self.received.append(event)
+            self.last_id = event['id']
+            accepted += 1
+        return {'accepted': accepted, 'last_id': self.last_id}
+
+
+local_endpoints = {}
+
+
+class WebhookSink(Sink):
+    """
+    POSTs each batch as JSON to URL, signed with HMAC-SHA256 over the body
+    when a SECRET is configured. Any non-2xx answer fails the batch. Without
+    a URL every batch fails, so events wait for one to be configured;
+    under DEBUG they go to a LocalEndpoint instead.
+    """
+    def deliver(self, events):
+        body = json.dumps({'sink': self.name, 'events': events}, cls=DjangoJSONEncoder).encode()
+        url = self.options.get('URL')
+        if not url:
+            if not settings.DEBUG:
+                raise DeliveryError(f"Webhook sink {self.name} has no URL configured")
+            local_endpoints.setdefault(self.name, LocalEndpoint()).receive(body)
+            return
+        headers = {'Content-Type': 'application/json'}
+        if self.options.get('SECRET'):
+            signature = hmac.new(self.options['SECRET'].encode(), body, hashlib.sha256).hexdigest()
+            headers['X-Outbox-Signature'] = f'sha256={signature}'
+        request = urllib.request.Request(url, data=body, method='POST', headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.options.get('TIMEOUT', 30)) as response:
+                response.read()
+        except urllib.error.URLError as exc:
+            raise DeliveryError(f"Webhook {url} failed: {exc}") from exc
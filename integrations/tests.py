@@ -0,0 +1,130 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import outbox
+from .models import OutboxEvent, SinkCursor
+from .sinks import DeliveryError, Sink, WebhookSink, local_endpoints
+
+OUTBOX = {'SETTLE_SECONDS': 0, 'BATCH_SIZE': 2, 'RETRY_DELAY': 5, 'SINKS': {}}
+
+
+class RecordingSink(Sink):
+    def __init__(self, name='test', options=None, fail=False):
+        super().__init__(name, options or {})
+        self.fail = fail
+        self.batches = []
+
+    def deliver(self, events):
+        if self.fail:
+            raise DeliveryError('receiver down')
+        self.batches.append([event['id'] for event in events])
+
+
+def make_event(topic='patient.updated', object_id=1):
+    aggregate = topic.split('.')[0]
+    return OutboxEvent.objects.create(topic=topic, aggregate=aggregate, object_id=object_id, payload={})
+
+
+@override_settings(OUTBOX=OUTBOX)
+class DispatchTests(TestCase):
+    def test_delivers_in_batches_and_advances_the_cursor(self):
+        events = [make_event(object_id=i) for i in range(3)]
+        sink = RecordingSink()
+        self.assertEqual(outbox.dispatch(sink), 2)
+        self.assertEqual(outbox.dispatch(sink), 1)
+        self.assertIsNone(outbox.dispatch(sink))
+        self.assertEqual(sink.batches, [[events[0].pk, events[1].pk], [events[2].pk]])
+        cursor = SinkCursor.objects.get(pk='test')
+        self.assertEqual(cursor.last_event_id, events[2].pk)
+        self.assertEqual(cursor.delivered, 3)
+        self.assertIsNone(cursor.lease_until)
+
+    def test_topics_filter_but_the_cursor_still_moves(self):
+        make_event('patient.updated')
+        lab = make_event('lab_order.updated')
+        sink = RecordingSink(options={'TOPICS': ['lab_order.']})
+        outbox.dispatch(sink)
+        self.assertEqual(sink.batches, [[lab.pk]])
+        self.assertEqual(SinkCursor.objects.get(pk='test').last_event_id, lab.pk)
+
+    @override_settings(OUTBOX={**OUTBOX, 'SETTLE_SECONDS': 60})
+    def test_recent_events_wait_for_the_settle_window(self):
+        make_event()
+        self.assertIsNone(outbox.dispatch(RecordingSink()))
+
+    def test_leased_sink_is_skipped(self):
+        make_event()
+        SinkCursor.objects.create(sink='test', lease_until=timezone.now() + timedelta(minutes=1))
+        sink = RecordingSink()
+        self.assertIsNone(outbox.dispatch(sink))
+        self.assertEqual(sink.batches, [])
+
+    def test_expired_lease_is_taken_over(self):
+        make_event()
+        SinkCursor.objects.create(sink='test', lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(outbox.dispatch(RecordingSink()), 1)
+
+    def test_failure_keeps_the_batch_and_backs_off(self):
+        event = make_event()
+        failing = RecordingSink(fail=True)
+        with self.assertLogs('integrations.outbox', 'WARNING'):
+            self.assertEqual(outbox.dispatch(failing), 0)
+        cursor = SinkCursor.objects.get(pk='test')
+        self.assertEqual((cursor.last_event_id, cursor.failures, cursor.last_error), (0, 1, 'receiver down'))
+        self.assertGreater(cursor.next_attempt_at, timezone.now())
+
+        # Still backing off: nothing is attempted
+        self.assertIsNone(outbox.dispatch(failing))
+        SinkCursor.objects.filter(pk='test').update(next_attempt_at=timezone.now())
+        with self.assertLogs('integrations.outbox', 'WARNING'):
+            outbox.dispatch(failing)
+        cursor.refresh_from_db()
+        self.assertEqual(cursor.failures, 2)
+        self.assertAlmostEqual((cursor.next_attempt_at - timezone.now()).total_seconds(), 10, delta=2)
+
+        SinkCursor.objects.filter(pk='test').update(next_attempt_at=timezone.now())
+        sink = RecordingSink()
+        self.assertEqual(outbox.dispatch(sink), 1)
+        self.assertEqual(sink.batches, [[event.pk]])
+        cursor.refresh_from_db()
+        self.assertEqual((cursor.failures, cursor.last_error, cursor.next_attempt_at), (0, '', None))
+
+    def test_dispatch_all_drains_every_sink(self):
+        for i in range(5):
+            make_event(object_id=i)
+        first, second = RecordingSink('first'), RecordingSink('second', fail=True)
+        with self.assertLogs('integrations.outbox', 'WARNING'):
+            self.assertEqual(outbox.dispatch_all([first, second]), {'first': 5, 'second': 0})
+
+
+@override_settings(OUTBOX=OUTBOX)
+class WebhookSinkTests(TestCase):
+    def setUp(self):
+        local_endpoints.clear()
+        make_event('lab_order.updated')
+
+    @override_settings(DEBUG=False)
+    def test_without_url_events_stay_queued(self):
+        with self.assertLogs('integrations.outbox', 'WARNING'):
+            self.assertEqual(outbox.dispatch(WebhookSink('lab', {'URL': ''})), 0)
+        cursor = SinkCursor.objects.get(pk='lab')
+        self.assertEqual(cursor.last_event_id, 0)
+        self.assertIn('no URL', cursor.last_error)
+
+    @override_settings(DEBUG=True)
+    def test_without_url_under_debug_uses_the_local_stand_in(self):
+        self.assertEqual(outbox.dispatch(WebhookSink('lab', {'URL': ''})), 1)
+        self.assertEqual(len(local_endpoints['lab'].received), 1)
+
+
+@override_settings(OUTBOX={**OUTBOX, 'SINKS': {'a': {}, 'b': {}}, 'RETENTION_DAYS': 1})
+class PruneTests(TestCase):
+    def test_only_events_every_sink_has_received_are_pruned(self):
+        old = [make_event(object_id=i) for i in range(3)]
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(days=2))
+        SinkCursor.objects.create(sink='a', last_event_id=old[2].pk)
+        SinkCursor.objects.create(sink='b', last_event_id=old[0].pk)
+        self.assertEqual(outbox.prune(), 1)
+        self.assertEqual(list(OutboxEvent.objects.values_list('pk', flat=True)), [old[1].pk, old[2].pk])
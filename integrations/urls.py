@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.outbox_status, name='outbox_status'),
+    path('<str:sink>/retry/', views.retry_sink, name='outbox_retry_sink'),
+]
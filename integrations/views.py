@@ -0,0 +1,30 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_POST
+
+from accounts.decorators import role_required
+
+from .models import SinkCursor
+from .outbox import lag_metrics
+
+
+@login_required
+@role_required('integrations_view')
+def outbox_status(request):
+    """
+    Delivery position and lag of each integration sink
+    """
+    return render(request, 'integrations/outbox_status.html', lag_metrics())
+
+
+@login_required
+@role_required('integrations_view')
+@require_POST
+def retry_sink(request, sink):
+    """
+    Skip the remaining back-off and try a failing sink on the next dispatch
+    """
+    SinkCursor.objects.filter(pk=sink).update(next_attempt_at=None)
+    messages.success(request, f'{sink} will be retried on the next dispatch')
+    return redirect('outbox_status')
@@ -0,0 +1,330 @@
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import re
+import uuid
+
+from django.core import signing
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+
+from baringo_hms.batching import BatchWriter
+
+from .models import DocumentBlob, DocumentExtraction, DocumentUpload, PatientDocument
+from .storage import get_document_settings
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 1024 * 1024
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+SIGNING_SALT = 'patients.documents'
+
+
+class DocumentError(Exception):
+    pass
+
+
+def _hash_file(handle):
+    digest = hashlib.sha256()
+    size = 0
+    handle.seek(0)
+    for chunk in iter(lambda: handle.read(READ_CHUNK), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    handle.seek(0)
+    return digest.hexdigest(), size
+
+
+def _content_type(handle, declared, filename):
+    head = handle.read(8)
+    handle.seek(0)
+    if head.startswith(b'%PDF'):
+        return 'application/pdf'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG'):
+        return 'image/png'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'image/tiff'
+    if head.startswith(b'GIF8'):
+        return 'image/gif'
+    return declared or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def store_blob(handle, filename='', declared_type=''):
+    """
+    Store file content once, keyed by SHA-256.
+
+    Returns ``(blob, created)``; when the same bytes are already stored the
+    existing blob is returned and nothing is written.
+    """
+    config = get_document_settings()
+    sha256, size = _hash_file(handle)
+    if size > config['MAX_SIZE']:
+        raise DocumentError(f"File is larger than {config['MAX_SIZE'] // (1024 * 1024)} MB")
+    content_type = _content_type(handle, declared_type, filename)
+    if content_type not in config['ALLOWED_TYPES']:
+        raise DocumentError(f"{content_type} files are not accepted")
+
+    existing = DocumentBlob.objects.filter(pk=sha256).first()
+    if existing:
+        return existing, False
+    blob = DocumentBlob(sha256=sha256, size=size, content_type=content_type)
+    blob.file.save(sha256, File(handle), save=False)
+    try:
+        with transaction.atomic():
+            blob.save(force_insert=True)
+            # Queued for text extraction (patients/extraction.py)
+            DocumentExtraction.objects.create(blob=blob)
+    except IntegrityError:
+        # Same content stored concurrently: keep theirs, drop our copy
+        blob.file.delete(save=False)
+        return DocumentBlob.objects.get(pk=sha256), False
+    previews.submit(sha256)
+    return blob, True
+
+
+def attach_document(patient, handle, user, document_type, title, filename='', content_type='', description=''):
+    blob, created = store_blob(handle, filename, content_type)
+    document = PatientDocument.objects.create(
+        patient=patient,
+        document_type=document_type,
+        title=title,
+        blob=blob,
+        original_filename=filename[:255],
+        uploaded_by=user,
+        description=description,
+    )
+    return document, not created
+
+
+# Previews
+
+def _render_preview(blob, size):
+    from PIL import Image
+
+    with blob.file.open('rb') as handle:
+        if blob.content_type == 'application/pdf':
+            try:
+                import fitz  # PyMuPDF, optional
+            except ImportError:
+                return None
+            pdf = fitz.open(stream=handle.read(), filetype='pdf')
+            pixmap = pdf[0].get_pixmap(dpi=72)
+            image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        else:
+            image = Image.open(handle)
+            image.seek(0)  # first page of multi-page TIFF/GIF
+            image.load()
+    image = image.convert('RGB')
+    image.thumbnail(size)
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=80, optimize=True)
+    return output.getvalue()
+
+
+def generate_preview(sha256):
+    blob = DocumentBlob.objects.filter(pk=sha256, preview_status='pending').first()
+    if blob is None:
+        return
+    try:
+        data = _render_preview(blob, get_document_settings()['THUMBNAIL_SIZE'])
+    except Exception:
+        logger.exception("Preview generation failed for %s", sha256)
+        blob.preview_status = 'failed'
+        blob.save(update_fields=['preview_status'])
+        return
+    if data is None:
+        blob.preview_status = 'unsupported'
+        blob.save(update_fields=['preview_status'])
+        return
+    blob.thumbnail.save(f"thumbnails/{sha256[:2]}/{sha256}.jpg", ContentFile(data), save=False)
+    blob.preview_status = 'ready'
+    blob.save(update_fields=['thumbnail', 'preview_status'])
+
+
+class PreviewGenerator(BatchWriter):
+    """
+    Renders thumbnails off the request thread; uploads only enqueue the hash
+    """
+    name = 'document-previews'
+
+    def write_batch(self, batch):
+        for sha256 in dict.fromkeys(batch):
+            generate_preview(sha256)
+
+
+previews = PreviewGenerator(batch_size=10, flush_interval=0.5)
+
+
+# Chunked uploads
+
+def _part_path(upload_id):
+    directory = os.path.join(get_document_settings()['ROOT'], 'uploads')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{upload_id}.part")
+
+
+def start_upload(patient, user, filename, total_size, content_type, document_type, title):
+    config = get_document_settings()
+    if total_size <= 0 or total_size > config['MAX_SIZE']:
+        raise DocumentError(f"File size must be between 1 byte and {config['MAX_SIZE'] // (1024 * 1024)} MB")
+    upload = DocumentUpload.objects.create(
+        id=uuid.uuid4(), patient=patient, uploaded_by=user, filename=filename[:255],
+        content_type=content_type[:100], total_size=total_size,
+        document_type=document_type, title=title[:200] or filename[:200],
+    )
+    open(_part_path(upload.id), 'wb').close()
+    return upload
+
+
+def append_chunk(upload, offset, stream, length):
+    """
+    Copy ``length`` bytes from ``stream`` into the part file at ``offset``.
+
+    Offsets must match what has been received, so a client resuming after a
+    dropped connection first asks for ``upload.received`` and continues from
+    there. The body is copied in pieces and never held in memory whole.
+    """
+    if offset != upload.received:
+        raise DocumentError(f"Expected offset {upload.received}, got {offset}")
+    if length <= 0 or upload.received + length > upload.total_size:
+        raise DocumentError('Chunk is empty or runs past the declared file size')
+    written = 0
+    with open(_part_path(upload.id), 'r+b') as handle:
+        handle.seek(offset)
+        while written < length:
+            piece = stream.read(min(READ_CHUNK, length - written))
+            if not piece:
+                break
+            handle.write(piece)
+            written += len(piece)
+        handle.truncate()
+    upload.received += written
+    DocumentUpload.objects.filter(pk=upload.pk).update(received=upload.received)
+    if written != length:
+        raise DocumentError(f"Chunk truncated: {written} of {length} bytes received")
+    return upload.received
+
+
+def complete_upload(upload, description=''):
+    if upload.received != upload.total_size:
+        raise DocumentError(f"Upload incomplete: {upload.received} of {upload.total_size} bytes received")
+    path = _part_path(upload.id)
+    with open(path, 'rb') as handle:
+        document, deduplicated = attach_document(
+            upload.patient, handle, upload.uploaded_by, upload.document_type, upload.title,
+            filename=upload.filename, content_type=upload.content_type, description=description,
+        )
+    os.remove(path)
+    upload.delete()
+    return document, deduplicated
+
+
+def discard_upload(upload):
+    try:
+        os.remove(_part_path(upload.id))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+# Signed, access-controlled links
+
+def signed_url(document, user, variant='file'):
+    """
+    Short-lived download link bound to the requesting user
+    """
+    token = signing.dumps({'d': document.pk, 'u': user.pk, 'v': variant}, salt=SIGNING_SALT, compress=True)
+    return reverse('document_download', args=[token])
+
+
+def read_token(token, user):
+    try:
+        payload = signing.loads(token, salt=SIGNING_SALT, max_age=get_document_settings()['URL_MAX_AGE'])
+    except signing.BadSignature:
+        raise DocumentError('This link is invalid or has expired')
+    if payload.get('u') != user.pk:
+        raise DocumentError('This link was issued to another user')
+    return payload['d'], payload.get('v', 'file')
+
+
+def _parse_range(header, size):
+    match = RANGE_HEADER.match(header or '')
+    if not match:
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    elif end:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _ranged_stream(handle, start, length):
+    handle.seek(start)
+    remaining = length
+    try:
+        while remaining > 0:
+            chunk = handle.read(min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def serve_file(request, field, content_type, etag, filename, inline=True):
+    """
+    Send a stored file with HTTP range support, or hand it to the front-end
+    server with X-Accel-Redirect / X-Sendfile when configured. Content is
+    immutable (addressed by hash), so the hash doubles as a strong ETag.
+    """
+    config = get_document_settings()
+    quoted = f'"{etag}"'
+    if request.headers.get('If-None-Match') == quoted:
+        return HttpResponseNotModified()
+
+    disposition = 'inline' if inline else 'attachment'
+    if config['SENDFILE'] == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = config['ACCEL_PREFIX'] + field.name
+    elif config['SENDFILE'] == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field.path
+    else:
+        size = field.size
+        byte_range = _parse_range(request.headers.get('Range'), size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(_ranged_stream(field.open('rb'), start, end - start + 1),
+                                             status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(field.open('rb'), content_type=content_type)
+            response['Content-Length'] = str(size)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = quoted
+    response['Cache-Control'] = 'private, max-age=3600'
+    safe_name = re.sub(r'[^\w.\- ]', '_', filename) or 'document'
+    response['Content-Disposition'] = f'{disposition}; filename="{safe_name}"'
+    response['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -0,0 +1,263 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, Min, Q, Sum
+from django.utils import timezone
+
+from . import ocr
+from .models import DocumentBlob, DocumentExtraction, DocumentTerm, Patient, PatientDocument
+from .storage import get_document_settings
+
+logger = logging.getLogger(__name__)
+
+TERM_BATCH_SIZE = 1000
+PROPOSED_FIELDS = ('first_name', 'last_name', 'date_of_birth', 'gender', 'national_id', 'nhif_number')
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def enqueue(blob_ids):
+    """
+    Queue blobs for extraction; already queued or extracted blobs are skipped
+    """
+    DocumentExtraction.objects.bulk_create(
+        [DocumentExtraction(blob_id=blob_id) for blob_id in blob_ids], ignore_conflicts=True,
+    )
+
+
+def enqueue_missing():
+    """
+    Queue every stored blob that has never been through extraction (the
+    backlog of documents uploaded before the pipeline existed)
+    """
+    ids = list(DocumentBlob.objects.filter(extraction__isnull=True).values_list('pk', flat=True))
+    enqueue(ids)
+    return len(ids)
+
+
+def requeue_failed():
+    return (DocumentExtraction.objects
+            .filter(status='failed')
+            .update(status='pending', attempts=0, next_attempt_at=timezone.now(), error=''))
+
+
+def _ocr_options(config):
+    return {
+        'languages': config['OCR_LANGUAGES'],
+        'dpi': config['OCR_DPI'],
+        'page_timeout': config['OCR_PAGE_TIMEOUT'],
+        'max_pages': config['OCR_MAX_PAGES'],
+    }
+
+
+def claim_batch(size):
+    """
+    Take up to ``size`` due entries off the queue and mark them processing.
+
+    Entries left 'processing' past the lease (a worker that died mid-run)
+    are due again. Each claim is a conditional UPDATE, so two runners never
+    take the same entry.
+    """
+    now = timezone.now()
+    lease_expired = now - timedelta(seconds=get_document_settings()['OCR_LEASE'])
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', started_at__lt=lease_expired)
+    ids = list(DocumentExtraction.objects.filter(due).order_by('next_attempt_at').values_list('pk', flat=True)[:size])
+    claimed = [pk for pk in ids
+               if DocumentExtraction.objects.filter(due, pk=pk).update(status='processing', started_at=now)]
+    return list(DocumentExtraction.objects.filter(pk__in=claimed).select_related('blob'))
+
+
+def index_terms(blob_id, text):
+    with transaction.atomic():
+        DocumentTerm.objects.filter(blob_id=blob_id).delete()
+        DocumentTerm.objects.bulk_create(
+            [DocumentTerm(blob_id=blob_id, term=term) for term in sorted(ocr.terms(text))],
+            batch_size=TERM_BATCH_SIZE,
+        )
+
+
+def _record_success(extraction, text, pages, seconds):
+    extraction.text = text
+    extraction.fields = ocr.parse_fields(text)
+    extraction.pages = pages
+    extraction.seconds = round(seconds, 3)
+    extraction.status = 'done'
+    extraction.error = ''
+    extraction.attempts += 1
+    extraction.completed_at = timezone.now()
+    with transaction.atomic():
+        extraction.save()
+        index_terms(extraction.blob_id, text)
+
+
+def _record_failure(extraction, error, config):
+    """
+    Retry with exponential backoff until OCR_MAX_ATTEMPTS, then give up
+    """
+    extraction.attempts += 1
+    extraction.error = str(error)[:2000]
+    if extraction.attempts >= config['OCR_MAX_ATTEMPTS']:
+        extraction.status = 'failed'
+    else:
+        extraction.status = 'pending'
+        delay = config['OCR_RETRY_DELAY'] * 2 ** (extraction.attempts - 1)
+        extraction.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    extraction.save(update_fields=['attempts', 'error', 'status', 'next_attempt_at'])
+    return extraction.status == 'pending'
+
+
+def run(workers=None, batch_size=None, limit=None):
+    """
+    Drain the extraction queue across a process pool.
+
+    Entries are claimed in batches; each file is OCR'd in a worker process
+    and the result (text, parsed fields and search terms) written back by
+    this process as it completes. Returns throughput metrics for the run.
+    """
+    config = get_document_settings()
+    workers = workers or config['OCR_WORKERS']
+    batch_size = batch_size or config['OCR_BATCH_SIZE']
+    if not ocr.available():
+        raise ExtractionError('Tesseract OCR is not available (install tesseract and pytesseract)')
+
+    options = _ocr_options(config)
+    stats = {'processed': 0, 'failed': 0, 'retried': 0, 'pages': 0, 'ocr_seconds': 0.0}
+    handled = 0
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while limit is None or handled < limit:
+            batch = {extraction.pk: extraction
+                     for extraction in claim_batch(batch_size if limit is None else min(batch_size, limit - handled))}
+            if not batch:
+                break
+            futures = {
+                executor.submit(ocr.extract_text, pk, extraction.blob.file.path,
+                                extraction.blob.content_type, options): pk
+                for pk, extraction in batch.items()
+            }
+            for future in as_completed(futures):
+                extraction = batch[futures[future]]
+                handled += 1
+                try:
+                    _, text, pages, seconds = future.result()
+                except Exception as exc:
+                    logger.warning("Extraction of %s failed: %s", extraction.pk, exc)
+                    stats['retried' if _record_failure(extraction, exc, config) else 'failed'] += 1
+                    continue
+                _record_success(extraction, text, pages, seconds)
+                stats['processed'] += 1
+                stats['pages'] += pages
+                stats['ocr_seconds'] += seconds
+            logger.info("Extraction batch of %d done: %s", len(batch), stats)
+
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 2)
+    stats['ocr_seconds'] = round(stats['ocr_seconds'], 2)
+    stats['documents_per_second'] = round(stats['processed'] / elapsed, 2) if elapsed else 0
+    stats['pages_per_second'] = round(stats['pages'] / elapsed, 2) if elapsed else 0
+    return stats
+
+
+def queue_metrics():
+    """
+    Queue depth per status, age of the oldest due entry and recent
+    throughput, for the queue dashboard and monitoring
+    """
+    now = timezone.now()
+    counts = dict(DocumentExtraction.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    oldest = (DocumentExtraction.objects.filter(status='pending', next_attempt_at__lte=now)
+              .aggregate(oldest=Min('next_attempt_at'))['oldest'])
+    last_hour = (DocumentExtraction.objects
+                 .filter(status='done', completed_at__gte=now - timedelta(hours=1))
+                 .aggregate(documents=Count('pk'), pages=Sum('pages'), average=Avg('seconds')))
+    return {
+        'counts': {status: counts.get(status, 0) for status, _ in DocumentExtraction.STATUS_CHOICES},
+        'oldest_pending_seconds': round((now - oldest).total_seconds()) if oldest else 0,
+        'completed_last_hour': last_hour['documents'],
+        'pages_last_hour': last_hour['pages'] or 0,
+        'average_seconds': round(last_hour['average'] or 0, 2),
+    }
+
+
+# Search
+
+def search_documents(query, limit=None):
+    """
+    Documents whose extracted text contains every word of ``query``; the
+    last word may be a prefix. Each word is an index range scan on term.
+    """
+    words = sorted(ocr.terms(query))
+    if not words:
+        return PatientDocument.objects.none()
+    typed = ocr.WORD.findall(query.lower())[-1]
+    documents = PatientDocument.objects.all()
+    for word in words:
+        if word == typed:
+            matches = DocumentTerm.objects.filter(term__gte=word, term__lt=word + '\uffff')
+        else:
+            matches = DocumentTerm.objects.filter(term=word)
+        # One subquery per word; the database intersects them
+        documents = documents.filter(blob_id__in=matches.values('blob_id'))
+    return documents[:limit] if limit else documents
+
+
+def patients_with_text(query):
+    """
+    Patient ids with a document matching ``query``, as a subquery
+    """
+    return search_documents(query).values('patient_id')
+
+
+# Field proposals
+
+def _current(patient, field):
+    value = getattr(patient, field)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value or ''
+
+
+def proposals(patient):
+    """
+    Field values read from the patient's documents that differ from the
+    record, as [{field, value, current, document}], one per field and value
+    """
+    seen, results = set(), []
+    documents = (patient.documents
+                 .filter(blob__extraction__status='done')
+                 .select_related('blob__extraction')
+                 .order_by('-uploaded_at'))
+    for document in documents:
+        for field, value in document.blob.extraction.fields.items():
+            if field not in PROPOSED_FIELDS or (field, value) in seen:
+                continue
+            seen.add((field, value))
+            current = _current(patient, field)
+            if str(current).casefold() != str(value).casefold():
+                results.append({'field': field, 'value': value, 'current': current, 'document': document})
+    return results
+
+
+def apply_proposals(patient, values):
+    """
+    Write accepted {field: value} pairs to the patient record. Values are
+    validated by the model before saving. Returns the changed fields.
+    """
+    changed = {}
+    for field, value in values.items():
+        if field not in PROPOSED_FIELDS:
+            continue
+        if field == 'date_of_birth':
+            value = date.fromisoformat(value)
+        if _current(patient, field) != (value.isoformat() if isinstance(value, date) else value):
+            changed[field] = value
+            setattr(patient, field, value)
+    if changed:
+        patient.full_clean(exclude=[f.name for f in Patient._meta.fields if f.name not in changed])
+        patient.save(update_fields=[*changed, 'updated_at'])
+    return changed
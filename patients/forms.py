@@ -1,6 +1,8 @@
 from django import forms
+from baringo_hms.forms import styled_fields
 from .models import Patient, EmergencyContact, PatientDocument
 
+@styled_fields(optional=['email', 'middle_name', 'alternative_phone', 'national_id', 'nhif_number'])
 class PatientRegistrationForm(forms.ModelForm):
     """
     Form for registering new patients
@@ -14,17 +16,6 @@ class PatientRegistrationForm(forms.ModelForm):
             'allergies': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
             'chronic_conditions': forms.Textarea(attrs={'rows': 3, 'class': 'form-control'}),
         }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields:
-            self.fields[field].widget.attrs.update({'class': 'form-control'})
-        # Make some fields optional
-        self.fields['email'].required = False
-        self.fields['middle_name'].required = False
-        self.fields['alternative_phone'].required = False
-        self.fields['national_id'].required = False
-        self.fields['nhif_number'].required = False
 
 
 class PatientSearchForm(forms.Form):
@@ -46,11 +37,13 @@ class PatientSearchForm(forms.Form):
             ('name', 'Name'),
             ('id', 'National ID'),
             ('phone', 'Phone'),
+            ('documents', 'Document Text'),
         ],
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
 
+@styled_fields()
 class EmergencyContactForm(forms.ModelForm):
     """
     Form for emergency contacts
@@ -58,8 +51,17 @@ class EmergencyContactForm(forms.ModelForm):
     class Meta:
         model = EmergencyContact
         fields = ['name', 'relationship', 'phone_number', 'is_primary']
+
+@styled_fields()
+class PatientDocumentForm(forms.ModelForm):
+    """
+    Single-request upload for small documents; large scans use the chunked uploader
+    """
+    upload = forms.FileField()
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields:
-            self.fields[field].widget.attrs.update({'class': 'form-control'})
\ No newline at end of file
+    class Meta:
+        model = PatientDocument
+        fields = ['document_type', 'title', 'description']
+        widgets = {
+            'description': forms.Textarea(attrs={'rows': 2}),
+        }
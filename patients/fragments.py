@@ -0,0 +1,23 @@
+from baringo_hms import versions
+
+# Cached template fragments of the patient chart (see patient_detail.html).
+# The header and demographics are keyed on Patient.updated_at; the
+# sections below change through other models, so they carry a version that
+# signals move on whenever one of their rows is saved or deleted.
+FRAGMENT_TIMEOUT = 60 * 60
+SECTIONS = ('consultations', 'medications', 'documents')
+
+
+def chart_versions(patient_id):
+    """
+    Current version of each chart section, for use in fragment cache keys
+    """
+    return versions.get_versions('chart', patient_id, SECTIONS)
+
+
+def touch(patient_id, *sections):
+    """
+    Start new versions of chart sections so their cached fragments are
+    no longer used
+    """
+    versions.touch('chart', patient_id, *sections)
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.extraction import ExtractionError, enqueue_missing, queue_metrics, requeue_failed, run
+
+
+class Command(BaseCommand):
+    help = 'OCR queued patient documents across a process pool and index their text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='OCR processes (default: DOCUMENTS OCR_WORKERS)')
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--limit', type=int, help='Stop after this many documents')
+        parser.add_argument('--backlog', action='store_true', help='Queue stored documents never extracted')
+        parser.add_argument('--retry-failed', action='store_true', help='Give failed documents another round')
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='Keep running, polling the queue every SECONDS')
+        parser.add_argument('--stats', action='store_true', help='Print queue metrics and exit')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(str(queue_metrics()))
+            return
+        if options['backlog']:
+            self.stdout.write(f'Queued {enqueue_missing()} stored document(s)')
+        if options['retry_failed']:
+            self.stdout.write(f'Re-queued {requeue_failed()} failed document(s)')
+
+        while True:
+            try:
+                stats = run(options['workers'], options['batch_size'], options['limit'])
+            except ExtractionError as exc:
+                raise CommandError(exc)
+            if stats['processed'] or stats['failed'] or stats['retried']:
+                self.stdout.write(
+                    f"{stats['processed']} extracted ({stats['pages']} pages), {stats['retried']} to retry, "
+                    f"{stats['failed']} failed in {stats['seconds']}s - "
+                    f"{stats['documents_per_second']} docs/s, {stats['pages_per_second']} pages/s"
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+        self.stdout.write(self.style.SUCCESS(f'Queue: {queue_metrics()["counts"]}'))
@@ -0,0 +1,170 @@
+import asyncio
+import random
+import statistics
+import time
+from importlib import import_module
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from patients.models import Patient
+from prescriptions.models import Medication
+
+# (path, share of requests): clinicians search patients far more than drugs
+ENDPOINTS = (
+    ('/patients/api/search/?term=', 0.7),
+    ('/prescriptions/api/search-medications/?term=', 0.3),
+)
+TERM_SAMPLE = 200
+
+
+def typeahead_terms(model, fields, sample=TERM_SAMPLE):
+    """
+    The prefixes a clinician sends while typing real names: 'Ki', 'Kip', 'Kipc'...
+    """
+    terms = set()
+    for values in model.objects.order_by('?').values_list(*fields)[:sample]:
+        for value in values:
+            value = (value or '').strip()
+            terms.update(value[:length] for length in range(2, min(len(value), 8) + 1))
+    return sorted(terms)
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    return status, headers.get('connection') != 'close'
+
+
+async def client(base, cookie, terms, deadline, latencies, errors):
+    """
+    One clinician on a keep-alive connection, sending requests back to back
+    """
+    url = urlsplit(base)
+    host, port = url.hostname, url.port or 80
+    paths = [path for path, _ in ENDPOINTS]
+    weights = [share for _, share in ENDPOINTS]
+    reader = writer = None
+    while time.monotonic() < deadline:
+        path = random.choices(paths, weights)[0]
+        request = (f"GET {url.path.rstrip('/')}{path}{quote(random.choice(terms))} HTTP/1.1\r\n"
+                   f"Host: {url.netloc}\r\nCookie: {cookie}\r\nAccept: application/json\r\n\r\n")
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request.encode())
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            errors['connection'] = errors.get('connection', 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors[status] = errors.get(status, 0) + 1
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_target(base, cookie, terms, clients, seconds):
+    latencies, errors = [], {}
+    deadline = time.monotonic() + seconds
+    started = time.monotonic()
+    await asyncio.gather(*(client(base, cookie, terms, deadline, latencies, errors) for _ in range(clients)))
+    elapsed = time.monotonic() - started
+    result = {'requests': len(latencies), 'errors': errors, 'rps': len(latencies) / elapsed}
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        result.update(p50=cuts[49] * 1000, p95=cuts[94] * 1000, p99=cuts[98] * 1000)
+    return result
+
+
+class Command(BaseCommand):
+    """
+    Start both servers against the same database and settings, e.g.
+
+        gunicorn baringo_hms.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+        gunicorn baringo_hms.asgi -w 4 -k uvicorn.workers.UvicornWorker -b 127.0.0.1:8001
+
+    then run ``manage.py loadtest_typeahead wsgi=http://127.0.0.1:8000
+    asgi=http://127.0.0.1:8001 --username admin --clients 100``.
+    """
+    help = 'Compare typeahead search throughput of running WSGI and ASGI servers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('targets', nargs='+', metavar='NAME=URL',
+                            help='Servers to test, e.g. wsgi=http://127.0.0.1:8000 asgi=http://127.0.0.1:8001')
+        parser.add_argument('--username', required=True,
+                            help='User whose session the clients share (needs patient and prescription access)')
+        parser.add_argument('--clients', type=int, default=50, help='Concurrent clinicians (default 50)')
+        parser.add_argument('--seconds', type=float, default=20, help='Duration per target (default 20)')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds per target first')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['targets']:
+            name, sep, base = target.partition('=')
+            if not sep or not base.startswith('http://'):
+                raise CommandError(f"Expected NAME=http://host:port, got {target!r}")
+            targets.append((name, base))
+
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+        # The servers must share this database for the session to be valid
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        cookie = f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+        terms = (typeahead_terms(Patient, ('first_name', 'last_name', 'mrn'))
+                 + typeahead_terms(Medication, ('name', 'generic_name')))
+        if not terms:
+            raise CommandError('No patients or medications to build search terms from; run seed.py first')
+
+        results = []
+        try:
+            for name, base in targets:
+                if options['warmup']:
+                    asyncio.run(run_target(base, cookie, terms, options['clients'], options['warmup']))
+                result = asyncio.run(run_target(base, cookie, terms, options['clients'], options['seconds']))
+                results.append((name, result))
+                self.stdout.write(
+                    f"{name:<8} {result['rps']:8.1f} req/s  "
+                    f"p50 {result.get('p50', 0):7.1f} ms  p95 {result.get('p95', 0):7.1f} ms  "
+                    f"p99 {result.get('p99', 0):7.1f} ms  ok {result['requests']}  "
+                    f"errors {sum(result['errors'].values())} {result['errors'] or ''}"
+                )
+        finally:
+            session.delete()
+
+        if len(results) > 1 and results[0][1]['rps']:
+            baseline_name, baseline = results[0]
+            for name, result in results[1:]:
+                self.stdout.write(f"{name} / {baseline_name}: {result['rps'] / baseline['rps']:.2f}x throughput")
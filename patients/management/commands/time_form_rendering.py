@@ -0,0 +1,76 @@
+import statistics
+import time
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from baringo_hms.forms import skeletons
+from consultations.forms import ConsultationForm
+from patients.forms import PatientRegistrationForm
+from patients.models import Patient
+
+# name: (form class, page template)
+PAGES = {
+    'registration': (PatientRegistrationForm, 'patients/patient_register.html'),
+    'consultation': (ConsultationForm, 'consultations/consultation_form.html'),
+}
+
+
+def median_ms(func, repeat):
+    func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples) * 1000
+
+
+def styled_per_instance(form_class):
+    # What the forms did in __init__ before their widget attrs moved to the class
+    form = form_class()
+    for field in form.fields.values():
+        field.widget.attrs.update({'class': 'form-control'})
+    return form
+
+
+class Command(BaseCommand):
+    help = 'Time building and rendering the registration and consultation form pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User whose role and menu the pages render for')
+        parser.add_argument('--repeat', type=int, default=200, help='Timed runs per measurement (default 200)')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+        request = RequestFactory().get('/')
+        request.user = user
+        patient = Patient(mrn='BCH-0000-00000', first_name='Sample', last_name='Patient',
+                          date_of_birth=date(1990, 1, 1), gender='F')
+        repeat = options['repeat']
+
+        def page(template, form):
+            return lambda: render_to_string(template, {'form': form, 'patient': patient}, request)
+
+        self.stdout.write(f"{'page':<14}{'measurement':<34}{'median ms':>10}")
+        for name, (form_class, template) in PAGES.items():
+            rows = [
+                ('build, attrs per instance', median_ms(lambda: styled_per_instance(form_class), repeat)),
+                ('build, attrs on class', median_ms(form_class, repeat)),
+            ]
+            with override_settings(FORM_SKELETONS=False):
+                rows.append(('GET, live crispy render', median_ms(page(template, form_class()), repeat)))
+                rows.append(('invalid POST, live crispy render', median_ms(page(template, form_class(data={})), repeat)))
+            with override_settings(FORM_SKELETONS=True):
+                skeletons.clear()
+                rows.append(('GET, cached skeleton', median_ms(page(template, form_class()), repeat)))
+                rows.append(('invalid POST, cached skeleton', median_ms(page(template, form_class(data={})), repeat)))
+            for label, value in rows:
+                self.stdout.write(f"{name:<14}{label:<34}{value:>10.2f}")
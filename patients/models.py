@@ -1,7 +1,23 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import RegexValidator, MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from accounts.models import User
+from .storage import blob_path, document_storage
+
+def age_group(age):
+    if age < 1:
+        return 'Infant'
+    elif age < 5:
+        return 'Toddler'
+    elif age < 13:
+        return 'Child'
+    elif age < 18:
+        return 'Adolescent'
+    elif age < 60:
+        return 'Adult'
+    else:
+        return 'Elderly'
+
 
 class Patient(models.Model):
     """
@@ -74,11 +90,17 @@ class Patient(models.Model):
         indexes = [
             models.Index(fields=['mrn']),
             models.Index(fields=['last_name', 'first_name']),
+            models.Index(fields=['created_at', 'id']),
         ]
     
     def __str__(self):
         return f"{self.mrn} - {self.full_name}"
     
+    def save(self, *args, **kwargs):
+        # post_save handlers (outbox events, sync log) commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -90,19 +112,22 @@ class Patient(models.Model):
         return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
     
     def get_age_group(self):
-        age = self.age
-        if age < 1:
-            return 'Infant'
-        elif age < 5:
-            return 'Toddler'
-        elif age < 13:
-            return 'Child'
-        elif age < 18:
-            return 'Adolescent'
-        elif age < 60:
-            return 'Adult'
-        else:
-            return 'Elderly'
+        return age_group(self.age)
+
+
+class MRNSequence(models.Model):
+    """
+    Last MRN number issued per year. Online registration and the blocks
+    reserved for offline devices both draw from this counter.
+    """
+    year = models.PositiveSmallIntegerField(primary_key=True)
+    last_number = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'mrn_sequences'
+    
+    def __str__(self):
+        return f"{self.year}: {self.last_number}"
 
 
 class EmergencyContact(models.Model):
@@ -122,6 +147,105 @@ class EmergencyContact(models.Model):
         return f"{self.name} - {self.relationship}"
 
 
+class DocumentBlob(models.Model):
+    """
+    Stored document content, addressed by its SHA-256 so identical scans
+    are kept once however many times they are attached
+    """
+    PREVIEW_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('unsupported', 'Unsupported'),
+        ('failed', 'Failed'),
+    ]
+    
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(upload_to=blob_path, storage=document_storage, max_length=200)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)
+    thumbnail = models.FileField(storage=document_storage, max_length=200, blank=True)
+    preview_status = models.CharField(max_length=20, choices=PREVIEW_STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'document_blobs'
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+class DocumentExtraction(models.Model):
+    """
+    OCR queue entry and result for a stored blob. Text and parsed fields
+    belong to the content, so a scan attached to several records is read once.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    blob = models.OneToOneField(DocumentBlob, on_delete=models.CASCADE, primary_key=True, related_name='extraction')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    text = models.TextField(blank=True)
+    fields = models.JSONField(default=dict, blank=True)
+    pages = models.PositiveIntegerField(default=0)
+    seconds = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        db_table = 'document_extractions'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.blob_id[:12]} - {self.status}"
+
+
+class DocumentTerm(models.Model):
+    """
+    Inverted index of extracted document text: one row per distinct word
+    per blob
+    """
+    term = models.CharField(max_length=40)
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.CASCADE, related_name='terms')
+    
+    class Meta:
+        db_table = 'document_terms'
+        unique_together = ['term', 'blob']
+    
+    def __str__(self):
+        return self.term
+
+
+class DocumentUpload(models.Model):
+    """
+    Resumable chunked upload in progress; chunks are appended to a part file
+    """
+    id = models.UUIDField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='pending_uploads')
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    document_type = models.CharField(max_length=20)
+    title = models.CharField(max_length=200)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    total_size = models.BigIntegerField()
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'document_uploads'
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.total_size})"
+
+
 class PatientDocument(models.Model):
     """
     Store scanned documents, IDs, consent forms
@@ -138,7 +262,10 @@ class PatientDocument(models.Model):
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='documents')
     document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES)
     title = models.CharField(max_length=200)
-    file = models.FileField(upload_to='patient_docs/%Y/%m/')
+    file = models.FileField(upload_to='patient_docs/%Y/%m/', blank=True)
+    # Set for documents in the content-addressed store; ``file`` is the legacy upload
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='documents')
+    original_filename = models.CharField(max_length=255, blank=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     description = models.TextField(blank=True)
@@ -0,0 +1,47 @@
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MRNSequence, Patient
+
+MRN_FORMAT = 'BCH-{year}-{number:05d}'
+MRN_PATTERN = re.compile(r'^BCH-(\d{4})-(\d{5,})$')
+
+
+def format_mrn(year, number):
+    return MRN_FORMAT.format(year=year, number=number)
+
+
+def parse_mrn(mrn):
+    """
+    (year, number) for a well-formed MRN, otherwise None
+    """
+    match = MRN_PATTERN.match(mrn or '')
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def _highest_issued(year):
+    # Seeds a year's counter from MRNs issued before the sequence existed
+    last = Patient.objects.filter(mrn__startswith=f'BCH-{year}-').order_by('-mrn').values_list('mrn', flat=True).first()
+    parsed = parse_mrn(last)
+    return parsed[1] if parsed else 0
+
+
+def allocate(count=1, year=None):
+    """
+    Reserve ``count`` consecutive MRN numbers; returns (year, first number).
+    The sequence row is locked, so concurrent registrations never share one.
+    """
+    year = year or timezone.now().year
+    with transaction.atomic():
+        MRNSequence.objects.get_or_create(year=year, defaults={'last_number': _highest_issued(year)})
+        sequence = MRNSequence.objects.select_for_update().get(pk=year)
+        first = sequence.last_number + 1
+        sequence.last_number += count
+        sequence.save(update_fields=['last_number'])
+    return year, first
+
+
+def next_mrn():
+    return format_mrn(*allocate())
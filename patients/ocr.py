@@ -0,0 +1,139 @@
+"""
+Text extraction and field parsing for scanned documents.
+
+Kept free of Django imports: workers receive a file path and plain options,
+so this module can run in a process pool without app setup. The OCR engine
+is Tesseract through pytesseract; PDFs are read with PyMuPDF, using the
+embedded text layer where a page has one and OCR on the rendered page
+otherwise. Both packages are optional.
+"""
+import re
+import time
+from datetime import date
+
+WORD = re.compile(r'[a-z0-9]+')
+MAX_TERM_LENGTH = 40
+MIN_PAGE_TEXT = 20
+
+
+class OCRUnavailable(Exception):
+    pass
+
+
+def available():
+    """
+    Whether the OCR engine can run here (package installed, binary on PATH)
+    """
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return False
+    return True
+
+
+def _ocr_image(image, options):
+    try:
+        import pytesseract
+    except ImportError:
+        raise OCRUnavailable('pytesseract is not installed')
+    return pytesseract.image_to_string(image, lang=options['languages'], timeout=options['page_timeout'])
+
+
+def _pdf_pages(path, options):
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        raise OCRUnavailable('PyMuPDF is needed to read PDF documents')
+    from PIL import Image
+
+    with fitz.open(path) as pdf:
+        for page in pdf:
+            text = page.get_text()
+            if len(text.strip()) >= MIN_PAGE_TEXT:
+                yield text
+                continue
+            pixmap = page.get_pixmap(dpi=options['dpi'])
+            yield _ocr_image(Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples), options)
+
+
+def _image_pages(path, options):
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as image:
+        for frame in ImageSequence.Iterator(image):
+            # Greyscale helps Tesseract on phone photos of cards
+            yield _ocr_image(frame.convert('L'), options)
+
+
+def extract_text(key, path, content_type, options):
+    """
+    OCR one stored file. Returns (key, text, page count, seconds).
+    """
+    started = time.monotonic()
+    pages = _pdf_pages(path, options) if content_type == 'application/pdf' else _image_pages(path, options)
+    texts = []
+    for text in pages:
+        texts.append(text)
+        if len(texts) >= options['max_pages']:
+            break
+    return key, '\n\f'.join(texts), len(texts), time.monotonic() - started
+
+
+def terms(text):
+    """
+    Distinct index terms in extracted text
+    """
+    return {word for word in WORD.findall(text.lower()) if 1 < len(word) <= MAX_TERM_LENGTH}
+
+
+# Field parsing. Kenyan IDs and NHIF cards print labelled values, one per
+# line; OCR often mangles punctuation, so labels are matched loosely.
+
+NATIONAL_ID = re.compile(r'\bID\s*(?:NO|NUMBER|#)\W{0,3}(\d{7,8})\b', re.I)
+NHIF_NUMBER = re.compile(r'\b(?:NHIF|SHA|MEMBER(?:SHIP)?)\s*(?:NO|NUMBER|#)?\W{0,3}([A-Z0-9]{6,20})\b', re.I)
+DATE_OF_BIRTH = re.compile(r'\b(?:DATE\s*OF\s*BIRTH|D\.?O\.?B)\W{0,3}(\d{1,2})[./ -](\d{1,2})[./ -](\d{4})\b', re.I)
+SEX = re.compile(r'\bSEX\W{0,3}(MALE|FEMALE|M|F)\b', re.I)
+SURNAME = re.compile(r'\bSURNAME\W{0,3}([A-Z][A-Z\'-]+)', re.I)
+GIVEN_NAMES = re.compile(r'\b(?:GIVEN|OTHER|FIRST)\s*NAMES?\W{0,3}([A-Z][A-Z\'-]+)', re.I)
+FULL_NAMES = re.compile(r'\bFULL\s*NAMES?\W{0,3}([A-Z][A-Z\'-]+(?:[ \t]+[A-Z][A-Z\'-]+)+)', re.I)
+
+
+def _date(day, month, year):
+    try:
+        value = date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+    return value.isoformat() if 1900 <= value.year <= date.today().year else None
+
+
+def parse_fields(text):
+    """
+    Patient fields recognisable in document text, as strings keyed by
+    Patient field name
+    """
+    fields = {}
+    match = NATIONAL_ID.search(text)
+    if match:
+        fields['national_id'] = match.group(1)
+    match = NHIF_NUMBER.search(text)
+    if match and any(char.isdigit() for char in match.group(1)):
+        fields['nhif_number'] = match.group(1).upper()
+    match = DATE_OF_BIRTH.search(text)
+    if match and _date(*match.groups()):
+        fields['date_of_birth'] = _date(*match.groups())
+    match = SEX.search(text)
+    if match:
+        fields['gender'] = match.group(1)[0].upper()
+
+    surname, given = SURNAME.search(text), GIVEN_NAMES.search(text)
+    if surname and given:
+        fields['last_name'] = surname.group(1).title()
+        fields['first_name'] = given.group(1).title()
+    else:
+        match = FULL_NAMES.search(text)
+        if match:
+            names = match.group(1).split()
+            fields['first_name'] = names[0].title()
+            fields['last_name'] = names[-1].title()
+    return fields
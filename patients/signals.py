@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import fragments
+from .models import Patient, PatientDocument
+from .summary import summaries
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def drop_cached_summary(sender, instance, **kwargs):
+    summaries.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=PatientDocument)
+@receiver(post_delete, sender=PatientDocument)
+def refresh_chart_documents(sender, instance, **kwargs):
+    fragments.touch(instance.patient_id, 'documents')
@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+DEFAULT_DOCUMENT_SETTINGS = {
+    'ROOT': os.path.join(settings.BASE_DIR, 'private_documents'),  # never under MEDIA_ROOT
+    'CHUNK_SIZE': 5 * 1024 * 1024,     # upload chunk size offered to clients
+    'MAX_SIZE': 200 * 1024 * 1024,
+    'URL_MAX_AGE': 5 * 60,             # lifetime of signed download links (seconds)
+    'SENDFILE': None,                  # None, 'x-accel' (nginx) or 'x-sendfile' (Apache)
+    'ACCEL_PREFIX': '/protected-documents/',
+    'THUMBNAIL_SIZE': (320, 320),
+    'ALLOWED_TYPES': ('application/pdf', 'image/jpeg', 'image/png', 'image/tiff', 'image/gif'),
+    # Text extraction (see patients/extraction.py)
+    'OCR_WORKERS': os.cpu_count() or 2,
+    'OCR_BATCH_SIZE': 20,              # entries claimed per round; keep >= OCR_WORKERS
+    'OCR_LANGUAGES': 'eng',            # Tesseract language packs, e.g. 'eng+swa'
+    'OCR_DPI': 300,                    # render resolution for scanned PDF pages
+    'OCR_PAGE_TIMEOUT': 120,
+    'OCR_MAX_PAGES': 20,
+    'OCR_MAX_ATTEMPTS': 3,
+    'OCR_RETRY_DELAY': 60,             # seconds, doubled after each failed attempt
+    'OCR_LEASE': 30 * 60,              # 'processing' entries older than this are retried
+}
+
+
+def get_document_settings():
+    config = dict(DEFAULT_DOCUMENT_SETTINGS)
+    config.update(getattr(settings, 'DOCUMENTS', {}))
+    return config
+
+
+def document_storage():
+    """
+    Private storage for patient documents; files are only reachable through
+    the signed download views
+    """
+    return FileSystemStorage(location=get_document_settings()['ROOT'], base_url=None)
+
+
+def blob_path(instance, filename):
+    # Content addressed: blobs/ab/cd/<sha256>
+    digest = instance.sha256
+    return f"blobs/{digest[:2]}/{digest[2:4]}/{digest}"
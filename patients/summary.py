@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from .models import Patient, age_group
+
+CACHE_SIZE = 20000
+# Entries are dropped on save/delete in this process; other processes see
+# an edit once their copy expires
+CACHE_TIMEOUT = 300
+FETCH_CHUNK = 500
+
+GENDER_LABELS = dict(Patient.GENDER_CHOICES)
+
+
+class PatientSummary:
+    """
+    Immutable identity of a patient for search results, queue boards and
+    reports: built from a values_list row instead of a full Patient.
+    """
+    __slots__ = ('id', 'mrn', 'name', 'date_of_birth', 'gender')
+    columns = ('id', 'mrn', 'first_name', 'last_name', 'date_of_birth', 'gender')
+
+    def __init__(self, id, mrn, first_name, last_name, date_of_birth, gender):
+        setattr_ = object.__setattr__
+        setattr_(self, 'id', id)
+        setattr_(self, 'mrn', mrn)
+        setattr_(self, 'name', f"{first_name} {last_name}")
+        setattr_(self, 'date_of_birth', date_of_birth)
+        setattr_(self, 'gender', gender)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PatientSummary is read-only')
+
+    def __repr__(self):
+        return f"<PatientSummary {self.mrn}>"
+
+    @property
+    def full_name(self):
+        return self.name
+
+    @property
+    def age(self):
+        today = timezone.now().date()
+        born = self.date_of_birth
+        return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+    @property
+    def age_band(self):
+        return age_group(self.age)
+
+    def get_gender_display(self):
+        return GENDER_LABELS.get(self.gender, self.gender)
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'mrn': self.mrn,
+            'name': self.name,
+            'age': self.age,
+            'gender': self.get_gender_display(),
+        }
+
+
+class SummaryCache:
+    """
+    Process-local LRU of patient summaries by id
+    """
+    def __init__(self, size=CACHE_SIZE, timeout=CACHE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _store(self, summaries):
+        expires = time.monotonic() + self.timeout
+        with self._lock:
+            for summary in summaries:
+                self._entries[summary.id] = (summary, expires)
+                self._entries.move_to_end(summary.id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def from_queryset(self, queryset):
+        """
+        Summaries for a Patient queryset in its order, cached as they are read
+        """
+        summaries = [PatientSummary(*row) for row in queryset.values_list(*PatientSummary.columns)]
+        self._store(summaries)
+        return summaries
+
+    async def afrom_queryset(self, queryset):
+        """
+        from_queryset for async views
+        """
+        summaries = [PatientSummary(*row) async for row in queryset.values_list(*PatientSummary.columns)]
+        self._store(summaries)
+        return summaries
+
+    def get_many(self, ids):
+        """
+        {id: summary}; misses are read in chunked id lookups
+        """
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for patient_id in set(ids):
+                entry = self._entries.get(patient_id)
+                if entry and entry[1] > now:
+                    self._entries.move_to_end(patient_id)
+                    found[patient_id] = entry[0]
+                else:
+                    missing.append(patient_id)
+        for start in range(0, len(missing), FETCH_CHUNK):
+            chunk = missing[start:start + FETCH_CHUNK]
+            for summary in self.from_queryset(Patient.objects.filter(pk__in=chunk)):
+                found[summary.id] = summary
+        return found
+
+    def get(self, patient_id):
+        return self.get_many([patient_id]).get(patient_id)
+
+    def invalidate(self, patient_id):
+        with self._lock:
+            self._entries.pop(patient_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+summaries = SummaryCache()
@@ -7,4 +7,9 @@ urlpatterns = [
     path('<str:mrn>/', views.patient_detail, name='patient_detail'),
     path('<str:mrn>/edit/', views.patient_edit, name='patient_edit'),
     path('api/search/', views.patient_search_api, name='patient_search_api'),
+    path('documents/uploads/<uuid:upload_id>/', views.document_upload_chunk, name='document_upload_chunk'),
+    path('documents/<str:token>/', views.document_download, name='document_download'),
+    path('<str:mrn>/documents/', views.upload_document, name='upload_document'),
+    path('<str:mrn>/documents/proposals/', views.document_proposals, name='document_proposals'),
+    path('<str:mrn>/documents/uploads/', views.start_document_upload, name='start_document_upload'),
 ]
\ No newline at end of file
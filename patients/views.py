@@ -2,11 +2,24 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
-from django.core.paginator import Paginator
+import json
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import Http404, JsonResponse
 from django.utils import timezone
-from .models import Patient, PatientDocument
-from .forms import PatientRegistrationForm, PatientSearchForm, EmergencyContactForm
+from django.views.decorators.http import require_http_methods, require_POST
+from .models import Patient, PatientDocument, DocumentUpload
+from .forms import PatientRegistrationForm, PatientSearchForm, EmergencyContactForm, PatientDocumentForm
+from . import documents, extraction
+from .fragments import FRAGMENT_TIMEOUT, chart_versions
+from .mrn import next_mrn
+from .summary import summaries
+from .storage import get_document_settings
+from accounts.decorators import role_required
+from accounts.permissions import get_access
 from security.models import AuditLog
+from baringo_hms.conditional import PageState
+from baringo_hms.pagination import KeysetPaginator
+from prescriptions.models import PrescriptionItem
 
 @login_required
 def patient_list(request):
@@ -33,6 +46,8 @@ def patient_list(request):
                 patients = patients.filter(national_id__icontains=search_term)
             elif search_by == 'phone':
                 patients = patients.filter(phone_number__icontains=search_term)
+            elif search_by == 'documents':
+                patients = patients.filter(pk__in=extraction.patients_with_text(search_term))
             else:
                 # Search all fields
                 patients = patients.filter(
@@ -43,10 +58,12 @@ def patient_list(request):
                     Q(phone_number__icontains=search_term)
                 )
     
-    # Pagination
-    paginator = Paginator(patients, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on (created_at, id) - no OFFSET scans on deep pages
+    paginator = KeysetPaginator(patients, 20, ordering=('-created_at', '-id'))
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     
     context = {
         'form': form,
@@ -61,6 +78,24 @@ def patient_detail(request, mrn):
     """
     View patient details
     """
+    # Answer unchanged-page revalidations from one small query
+    current = (Patient.objects.filter(mrn=mrn, is_active=True)
+               .values_list('pk', 'updated_at', 'first_name', 'last_name').first())
+    if current:
+        patient_id, updated_at, first_name, last_name = current
+        versions = chart_versions(patient_id)
+        state = PageState(request, ('patients/patient_detail.html', 'base.html'), (updated_at,), versions)
+        not_modified = state.not_modified(request)
+        if not_modified:
+            AuditLog.objects.create(
+                user=request.user,
+                action='VIEW',
+                model_name='Patient',
+                object_id=patient_id,
+                details=f"Viewed patient: {first_name} {last_name}"
+            )
+            return not_modified
+    
     patient = get_object_or_404(Patient, mrn=mrn, is_active=True)
     
     # Log access for audit
@@ -72,12 +107,20 @@ def patient_detail(request, mrn):
         details=f"Viewed patient: {patient.full_name}"
     )
     
+    # Querysets are lazy: sections served from the fragment cache never run them
     context = {
         'patient': patient,
-        'recent_consultations': patient.consultation_set.all()[:5],
-        'documents': patient.documents.all(),
+        'chart_versions': versions,
+        'fragment_timeout': FRAGMENT_TIMEOUT,
+        'today': timezone.now().date(),
+        'recent_consultations': patient.consultation_set.select_related('doctor').order_by('-visit_date', '-visit_time')[:5],
+        'medications': (PrescriptionItem.objects
+                        .filter(prescription__patient=patient, prescription__status__in=('active', 'partial', 'dispensed'))
+                        .select_related('medication', 'prescription')
+                        .order_by('-prescription__prescribed_date')[:20]),
+        'documents': patient.documents.select_related('uploaded_by'),
     }
-    return render(request, 'patients/patient_detail.html', context)
+    return state.add_headers(render(request, 'patients/patient_detail.html', context))
 
 
 @login_required
@@ -91,18 +134,7 @@ def patient_register(request):
             patient = form.save(commit=False)
             
             # Generate MRN (format: BCH-YYYY-XXXXX)
-            year = timezone.now().year
-            last_patient = Patient.objects.filter(
-                mrn__startswith=f'BCH-{year}'
-            ).order_by('-mrn').first()
-            
-            if last_patient:
-                last_number = int(last_patient.mrn.split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            patient.mrn = f'BCH-{year}-{new_number:05d}'
+            patient.mrn = next_mrn()
             patient.created_by = request.user
             patient.save()
             
@@ -158,12 +190,11 @@ def patient_edit(request, mrn):
 
 
 @login_required
-def patient_search_api(request):
+async def patient_search_api(request):
     """
-    AJAX endpoint for patient search
+    AJAX endpoint for patient search. Async, so typeahead traffic under
+    ASGI waits on the database without holding a worker thread.
     """
-    from django.http import JsonResponse
-    
     term = request.GET.get('term', '')
     if len(term) < 2:
         return JsonResponse([], safe=False)
@@ -175,14 +206,198 @@ def patient_search_api(request):
         Q(national_id__icontains=term)
     )[:10]
     
-    results = []
-    for patient in patients:
-        results.append({
-            'id': patient.id,
-            'mrn': patient.mrn,
-            'name': patient.full_name,
-            'age': patient.age,
-            'gender': patient.get_gender_display(),
-        })
-    
-    return JsonResponse(results, safe=False)
\ No newline at end of file
+    results = [patient.as_dict() for patient in await summaries.afrom_queryset(patients)]
+    
+    return JsonResponse(results, safe=False)
+
+
+@login_required
+@role_required('document_upload')
+def upload_document(request, mrn):
+    """
+    Attach a document to a patient. Small files post here directly; the
+    page's uploader sends large scans in resumable chunks instead.
+    """
+    patient = get_object_or_404(Patient, mrn=mrn, is_active=True)
+    
+    if request.method == 'POST':
+        form = PatientDocumentForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['upload']
+            try:
+                document, deduplicated = documents.attach_document(
+                    patient, upload, request.user,
+                    form.cleaned_data['document_type'], form.cleaned_data['title'],
+                    filename=upload.name, content_type=upload.content_type,
+                    description=form.cleaned_data['description'],
+                )
+            except documents.DocumentError as exc:
+                messages.error(request, str(exc))
+            else:
+                _log_document_upload(request, document, deduplicated)
+                return redirect('upload_document', mrn=mrn)
+    else:
+        form = PatientDocumentForm()
+    
+    context = {
+        'patient': patient,
+        'form': form,
+        'chunk_size': get_document_settings()['CHUNK_SIZE'],
+        'documents': [
+            (document, documents.signed_url(document, request.user),
+             documents.signed_url(document, request.user, 'thumbnail')
+             if document.blob and document.blob.preview_status == 'ready' else None)
+            for document in patient.documents.select_related('blob__extraction', 'uploaded_by')
+        ],
+        'proposal_count': len(extraction.proposals(patient)),
+    }
+    return render(request, 'patients/document_upload.html', context)
+
+
+def _log_document_upload(request, document, deduplicated):
+    if deduplicated:
+        messages.info(request, 'An identical file was already stored; it has been linked instead of copied')
+    messages.success(request, 'Document uploaded')
+    AuditLog.objects.create(
+        user=request.user,
+        action='CREATE',
+        model_name='PatientDocument',
+        object_id=document.id,
+        details=f"Uploaded {document.get_document_type_display()} for patient: {document.patient.full_name}"
+    )
+
+
+@login_required
+@role_required('document_upload')
+@require_POST
+def start_document_upload(request, mrn):
+    """
+    Open a chunked upload: {filename, size, content_type, document_type, title}
+    """
+    patient = get_object_or_404(Patient, mrn=mrn, is_active=True)
+    try:
+        data = json.loads(request.body)
+        upload = documents.start_upload(
+            patient, request.user,
+            filename=str(data.get('filename', '')),
+            total_size=int(data.get('size', 0)),
+            content_type=str(data.get('content_type', '')),
+            document_type=data.get('document_type') if data.get('document_type') in dict(PatientDocument.DOCUMENT_TYPES) else 'other',
+            title=str(data.get('title', '')),
+        )
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid upload request'}, status=400)
+    except documents.DocumentError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    
+    return JsonResponse({
+        'upload_id': str(upload.id),
+        'chunk_size': get_document_settings()['CHUNK_SIZE'],
+        'received': 0,
+    }, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'POST', 'DELETE'])
+def document_upload_chunk(request, upload_id):
+    """
+    GET: bytes received so far (to resume). PUT: append the body at the
+    Upload-Offset header. POST: finish and attach. DELETE: abandon.
+    """
+    upload = get_object_or_404(DocumentUpload.objects.select_related('patient'),
+                               pk=upload_id, uploaded_by=request.user)
+    try:
+        if request.method == 'PUT':
+            received = documents.append_chunk(
+                upload, int(request.headers.get('Upload-Offset', -1)),
+                request, int(request.headers.get('Content-Length') or 0),
+            )
+            return JsonResponse({'received': received, 'total': upload.total_size})
+        if request.method == 'POST':
+            document, deduplicated = documents.complete_upload(upload)
+            _log_document_upload(request, document, deduplicated)
+            return JsonResponse({'document_id': document.id, 'deduplicated': deduplicated})
+        if request.method == 'DELETE':
+            documents.discard_upload(upload)
+            return JsonResponse({'discarded': True})
+    except ValueError:
+        return JsonResponse({'error': 'Invalid Upload-Offset'}, status=400)
+    except documents.DocumentError as exc:
+        return JsonResponse({'error': str(exc), 'received': upload.received}, status=409)
+    
+    return JsonResponse({'received': upload.received, 'total': upload.total_size})
+
+
+@login_required
+def document_download(request, token):
+    """
+    Serve a document (or its thumbnail) from a signed, user-bound link
+    """
+    try:
+        document_id, variant = documents.read_token(token, request.user)
+    except documents.DocumentError:
+        raise PermissionDenied
+    if 'patient_view' not in get_access(request):
+        raise PermissionDenied
+    document = get_object_or_404(PatientDocument.objects.select_related('blob', 'patient'), pk=document_id)
+    
+    if variant == 'thumbnail':
+        if not document.blob or not document.blob.thumbnail:
+            raise Http404
+        return documents.serve_file(request, document.blob.thumbnail, 'image/jpeg',
+                                    f"{document.blob.sha256}-thumb", f"{document.pk}.jpg")
+    
+    AuditLog.objects.create(
+        user=request.user,
+        action='VIEW',
+        model_name='PatientDocument',
+        object_id=document.id,
+        details=f"Viewed document '{document.title}' for patient: {document.patient.full_name}"
+    )
+    if document.blob:
+        return documents.serve_file(request, document.blob.file, document.blob.content_type,
+                                    document.blob.sha256, document.original_filename or document.title)
+    if not document.file:
+        raise Http404
+    # Legacy upload outside the content-addressed store
+    return documents.serve_file(request, document.file, 'application/octet-stream',
+                                f"legacy-{document.pk}-{document.file.size}", document.file.name.rsplit('/', 1)[-1],
+                                inline=False)
+
+
+@login_required
+@role_required('patient_edit')
+def document_proposals(request, mrn):
+    """
+    Review patient fields read from scanned documents and copy accepted
+    values onto the record
+    """
+    patient = get_object_or_404(Patient, mrn=mrn, is_active=True)
+    
+    if request.method == 'POST':
+        values = {}
+        for accepted in request.POST.getlist('accept'):
+            field, _, value = accepted.partition(':')
+            values[field] = value
+        try:
+            changed = extraction.apply_proposals(patient, values)
+        except (ValueError, ValidationError) as exc:
+            messages.error(request, f'Record not updated: {exc}')
+        else:
+            if changed:
+                AuditLog.objects.create(
+                    user=request.user,
+                    action='UPDATE',
+                    model_name='Patient',
+                    object_id=patient.id,
+                    details=f"Applied document values for {', '.join(changed)} to patient: {patient.full_name}"
+                )
+                messages.success(request, f"Updated {', '.join(changed)}")
+            return redirect('document_proposals', mrn=mrn)
+    
+    context = {
+        'patient': patient,
+        'proposals': extraction.proposals(patient),
+        'metrics': extraction.queue_metrics(),
+    }
+    return render(request, 'patients/document_proposals.html', context)
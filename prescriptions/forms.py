@@ -1,4 +1,5 @@
 from django import forms
+from baringo_hms.forms import styled_fields
 from .models import Prescription, PrescriptionItem, Medication
 
 class PrescriptionForm(forms.ModelForm):
@@ -13,6 +14,7 @@ class PrescriptionForm(forms.ModelForm):
         }
 
 
+@styled_fields()
 class PrescriptionItemForm(forms.ModelForm):
     """
     Form for individual prescription items
@@ -27,9 +29,6 @@ class PrescriptionItemForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        for field in self.fields:
-            self.fields[field].widget.attrs.update({'class': 'form-control'})
-        
         # Limit medication choices to active ones
         self.fields['medication'].queryset = Medication.objects.filter(is_active=True)
 
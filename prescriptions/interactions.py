@@ -0,0 +1,235 @@
+import re
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from itertools import combinations, product
+
+from django.core.cache import cache
+from django.utils import timezone
+
+SEVERITY_RANK = {'minor': 1, 'moderate': 2, 'major': 3, 'contraindicated': 4}
+BLOCKING_SEVERITIES = ('major', 'contraindicated')
+ACTIVE_STATUSES = ('active', 'partial', 'dispensed')
+ACTIVE_WINDOW_DAYS = 90
+MATRIX_VERSION_KEY = 'interactions:version'
+ALLERGY_CACHE_TIMEOUT = 60 * 60
+MIN_TOKEN_LENGTH = 3
+
+SALT_WORDS = {
+    'hydrochloride', 'hcl', 'sodium', 'potassium', 'calcium', 'sulfate', 'sulphate',
+    'phosphate', 'maleate', 'besylate', 'tartrate', 'citrate', 'acetate', 'trihydrate',
+}
+TOKEN_SPLIT = re.compile(r'[,;/\n]+|\band\b', re.IGNORECASE)
+NO_ALLERGY = {'', 'none', 'nil', 'nka', 'nkda', 'no known allergies', 'no known drug allergies', 'n/a'}
+
+# Drug classes that the catalogue's categories don't name (Lisinopril is
+# filed under 'Antihypertensive'), so class:... interaction rows still apply
+DRUG_CLASSES = {
+    'lisinopril': 'ace inhibitor',
+    'enalapril': 'ace inhibitor',
+    'captopril': 'ace inhibitor',
+    'ramipril': 'ace inhibitor',
+    'ibuprofen': 'nsaid',
+    'diclofenac': 'nsaid',
+    'aspirin': 'nsaid',
+    'naproxen': 'nsaid',
+    'indomethacin': 'nsaid',
+    'meloxicam': 'nsaid',
+    'prednisolone': 'corticosteroid',
+    'dexamethasone': 'corticosteroid',
+    'hydrocortisone': 'corticosteroid',
+    'fluoxetine': 'ssri',
+    'sertraline': 'ssri',
+    'paroxetine': 'ssri',
+    'magnesium trisilicate': 'antacid',
+    'aluminium hydroxide': 'antacid',
+}
+
+Alert = namedtuple('Alert', 'kind severity medication other message')
+
+
+def normalize_drug_name(name):
+    words = [w for w in re.split(r'\s+', (name or '').strip().lower().replace('/', '-')) if w and w not in SALT_WORDS]
+    return ' '.join(words)
+
+
+def mentions(text, phrase):
+    """
+    Whether ``phrase`` appears in ``text`` as whole words ('ors' is not
+    in 'horse serum')
+    """
+    return bool(text and phrase) and re.search(rf'\b{re.escape(phrase)}\b', text) is not None
+
+
+def medication_keys(medication):
+    """
+    Matrix keys a medication answers to: its generic, catalogue and brand
+    names (the catalogue files Artemether/Lumefantrine under 'Coartem')
+    and its classes
+    """
+    keys = set()
+    for name in (medication.generic_name, medication.name, medication.brand_name):
+        generic = normalize_drug_name(name)
+        if generic:
+            keys.add(f'generic:{generic}')
+            if generic in DRUG_CLASSES:
+                keys.add(f'class:{DRUG_CLASSES[generic]}')
+    if medication.category:
+        keys.add(f'class:{medication.category.strip().lower()}')
+    return keys
+
+
+class InteractionMatrix:
+    """
+    All DrugInteraction rows held in memory as {frozenset(key_a, key_b): row}.
+
+    Loaded once per process and reloaded only when the shared version
+    counter changes (bumped whenever an interaction is saved or deleted),
+    so a check costs a cache get plus dictionary lookups.
+    """
+    def __init__(self):
+        self._pairs = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from .models import DrugInteraction
+
+        pairs = {}
+        for drug_a, drug_b, severity, description in DrugInteraction.objects.values_list(
+                'drug_a', 'drug_b', 'severity', 'description'):
+            pairs[frozenset((drug_a, drug_b))] = (severity, description)
+        return pairs
+
+    @property
+    def pairs(self):
+        version = cache.get(MATRIX_VERSION_KEY, 0)
+        if self._pairs is None or version != self._version:
+            with self._lock:
+                if self._pairs is None or version != self._version:
+                    self._pairs = self._load()
+                    self._version = version
+        return self._pairs
+
+    def lookup(self, keys_a, keys_b):
+        pairs = self.pairs
+        worst = None
+        for key_a, key_b in product(keys_a, keys_b):
+            if key_a == key_b:
+                continue
+            hit = pairs.get(frozenset((key_a, key_b)))
+            if hit and (worst is None or SEVERITY_RANK[hit[0]] > SEVERITY_RANK[worst[0]]):
+                worst = hit
+        return worst
+
+
+def invalidate_matrix():
+    try:
+        cache.incr(MATRIX_VERSION_KEY)
+    except ValueError:
+        cache.set(MATRIX_VERSION_KEY, 1, timeout=None)
+
+
+def allergy_tokens(patient):
+    """
+    Normalised allergy tokens for a patient, cached per patient version
+    (the key includes updated_at, so editing the record invalidates it)
+    """
+    stamp = patient.updated_at.timestamp() if patient.updated_at else 0
+    key = f'allergies:{patient.pk}:{stamp}'
+    tokens = cache.get(key)
+    if tokens is None:
+        tokens = set()
+        for raw in TOKEN_SPLIT.split(patient.allergies or ''):
+            token = re.sub(r'\s+', ' ', raw.strip().lower().strip('.'))
+            if token not in NO_ALLERGY and len(token) >= MIN_TOKEN_LENGTH:
+                tokens.add(token)
+                tokens.add(normalize_drug_name(token) or token)
+        tokens = frozenset(tokens)
+        cache.set(key, tokens, ALLERGY_CACHE_TIMEOUT)
+    return tokens
+
+
+def _condition_tokens(patient):
+    return {t.strip().lower() for t in TOKEN_SPLIT.split(patient.chronic_conditions or '') if t.strip()}
+
+
+def _names(medication):
+    return {normalize_drug_name(n) for n in (medication.name, medication.generic_name,
+                                              medication.brand_name, medication.category) if n}
+
+
+def active_medications(patient, exclude_prescription=None):
+    """
+    Medications from the patient's current prescriptions (one query)
+    """
+    from .models import Medication
+
+    since = timezone.now() - timedelta(days=ACTIVE_WINDOW_DAYS)
+    queryset = Medication.objects.filter(
+        prescriptionitem__prescription__patient=patient,
+        prescriptionitem__prescription__status__in=ACTIVE_STATUSES,
+        prescriptionitem__prescription__prescribed_date__gte=since,
+    )
+    if exclude_prescription is not None:
+        queryset = queryset.exclude(prescriptionitem__prescription=exclude_prescription)
+    return list(queryset.distinct())
+
+
+def check_medications(patient, new_medications, current_medications=()):
+    """
+    Validate ``new_medications`` in one pass against each other, against
+    ``current_medications`` and against the patient's allergies and chronic
+    conditions. Returns alerts sorted most severe first.
+    """
+    allergies = allergy_tokens(patient)
+    conditions = _condition_tokens(patient)
+    keys = {m.pk: medication_keys(m) for m in list(new_medications) + list(current_medications)}
+    alerts = []
+
+    for medication in new_medications:
+        names = _names(medication)
+        for token in allergies:
+            if any(mentions(name, token) or mentions(token, name) for name in names):
+                alerts.append(Alert('allergy', 'contraindicated', medication, None,
+                                    f"Patient is allergic to '{token}'"))
+                break
+        contraindications = (medication.contraindications or '').lower()
+        for condition in conditions:
+            if mentions(contraindications, condition):
+                alerts.append(Alert('contraindication', 'major', medication, None,
+                                    f"Contraindicated in {condition}"))
+
+    pairs = list(combinations(new_medications, 2)) + [
+        (new, current) for new in new_medications for current in current_medications
+    ]
+    for first, second in pairs:
+        if first.pk == second.pk:
+            alerts.append(Alert('duplicate', 'moderate', first, second,
+                                f"{first.name} is already prescribed"))
+            continue
+        hit = matrix.lookup(keys[first.pk], keys[second.pk])
+        if hit:
+            alerts.append(Alert('interaction', hit[0], first, second, hit[1]))
+
+    alerts.sort(key=lambda a: -SEVERITY_RANK[a.severity])
+    return alerts
+
+
+def check_prescription(prescription, extra_medications=()):
+    """
+    Whole-prescription check: every item (plus any about to be added)
+    against each other and the patient's other active medications
+    """
+    from .models import Medication
+
+    items = list(Medication.objects.filter(prescriptionitem__prescription=prescription).distinct())
+    current = active_medications(prescription.patient, exclude_prescription=prescription)
+    return check_medications(prescription.patient, items + list(extra_medications), current)
+
+
+def is_blocking(alerts):
+    return any(alert.severity in BLOCKING_SEVERITIES for alert in alerts)
+
+
+matrix = InteractionMatrix()
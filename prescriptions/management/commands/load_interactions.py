@@ -0,0 +1,45 @@
+import csv
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from prescriptions.interactions import SEVERITY_RANK, invalidate_matrix
+from prescriptions.models import DrugInteraction
+
+DEFAULT_FILE = Path(__file__).resolve().parents[2] / 'data' / 'interactions.csv'
+
+
+class Command(BaseCommand):
+    help = 'Load or update the drug interaction table from a CSV (drug_a, drug_b, severity, description)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_FILE))
+
+    def handle(self, *args, **options):
+        try:
+            handle = open(options['path'], newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+
+        rows = {}
+        with handle:
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                severity = (row.get('severity') or '').strip().lower()
+                if severity not in SEVERITY_RANK:
+                    self.stderr.write(f'Line {line}: unknown severity {severity!r}, skipped')
+                    continue
+                drug_a, drug_b = sorted([row['drug_a'].strip().lower(), row['drug_b'].strip().lower()])
+                rows[(drug_a, drug_b)] = DrugInteraction(
+                    drug_a=drug_a, drug_b=drug_b, severity=severity,
+                    description=(row.get('description') or '').strip(),
+                )
+
+        DrugInteraction.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['drug_a', 'drug_b'],
+            update_fields=['severity', 'description'],
+        )
+        # bulk_create sends no signals
+        invalidate_matrix()
+        self.stdout.write(self.style.SUCCESS(f'Loaded {len(rows)} drug interactions'))
@@ -114,4 +114,34 @@ class PrescriptionItem(models.Model):
         db_table = 'prescription_items'
     
     def __str__(self):
-        return f"{self.medication.name} - {self.dosage} {self.frequency}"
\ No newline at end of file
+        return f"{self.medication.name} - {self.dosage} {self.frequency}"
+
+class DrugInteraction(models.Model):
+    """
+    Known interaction between two drugs or drug classes.
+    
+    Keys are normalised: 'generic:<generic name>' or 'class:<category>',
+    stored with drug_a < drug_b so each pair appears once.
+    """
+    SEVERITY_CHOICES = [
+        ('minor', 'Minor'),
+        ('moderate', 'Moderate'),
+        ('major', 'Major'),
+        ('contraindicated', 'Contraindicated'),
+    ]
+    
+    drug_a = models.CharField(max_length=200)
+    drug_b = models.CharField(max_length=200)
+    severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='moderate')
+    description = models.TextField()
+    
+    class Meta:
+        db_table = 'drug_interactions'
+        unique_together = [('drug_a', 'drug_b')]
+    
+    def __str__(self):
+        return f"{self.drug_a} + {self.drug_b} ({self.severity})"
+    
+    def save(self, *args, **kwargs):
+        self.drug_a, self.drug_b = sorted([self.drug_a.strip().lower(), self.drug_b.strip().lower()])
+        super().save(*args, **kwargs)
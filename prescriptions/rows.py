@@ -0,0 +1,35 @@
+from django.db.models import Count
+
+from baringo_hms.rows import Row, full_name
+
+from .models import Prescription
+
+STATUS_LABELS = dict(Prescription.STATUS_CHOICES)
+
+
+class PrescriptionRow(Row):
+    """
+    Prescription list entry
+    """
+    __slots__ = ('id', 'prescribed_date', 'status', 'consultation_id', 'item_count',
+                 'patient_mrn', 'patient_first_name', 'patient_last_name',
+                 'prescriber_first_name', 'prescriber_last_name')
+    columns = {
+        'item_count': Count('items'),
+        'patient_mrn': 'patient__mrn',
+        'patient_first_name': 'patient__first_name',
+        'patient_last_name': 'patient__last_name',
+        'prescriber_first_name': 'prescribed_by__first_name',
+        'prescriber_last_name': 'prescribed_by__last_name',
+    }
+
+    @property
+    def patient_name(self):
+        return full_name(self.patient_first_name, self.patient_last_name)
+
+    @property
+    def prescriber_name(self):
+        return full_name(self.prescriber_first_name, self.prescriber_last_name)
+
+    def get_status_display(self):
+        return STATUS_LABELS.get(self.status, self.status)
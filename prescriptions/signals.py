@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from baringo_hms import versions
+from patients import fragments
+
+from .interactions import invalidate_matrix
+from .models import DrugInteraction, Prescription, PrescriptionItem
+
+
+@receiver(post_save, sender=DrugInteraction)
+@receiver(post_delete, sender=DrugInteraction)
+def interactions_changed(sender, **kwargs):
+    invalidate_matrix()
+
+
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+def refresh_chart_medications(sender, instance, **kwargs):
+    fragments.touch(instance.patient_id, 'medications')
+    versions.touch('prescription', instance.pk, 'items')
+    versions.touch('consultation', instance.consultation_id, 'related')
+
+
+@receiver(post_save, sender=PrescriptionItem)
+@receiver(post_delete, sender=PrescriptionItem)
+def refresh_chart_medication_items(sender, instance, **kwargs):
+    versions.touch('prescription', instance.prescription_id, 'items')
+    patient_id = Prescription.objects.filter(pk=instance.prescription_id).values_list('patient_id', flat=True).first()
+    if patient_id:
+        fragments.touch(patient_id, 'medications')
@@ -6,6 +6,7 @@ urlpatterns = [
     path('<int:pk>/', views.prescription_detail, name='prescription_detail'),
     path('new/<int:consultation_id>/', views.new_prescription, name='new_prescription'),
     path('<int:prescription_id>/add-item/', views.add_prescription_item, name='add_prescription_item'),
+    path('<int:prescription_id>/check/', views.check_prescription_api, name='check_prescription_api'),
     path('item/<int:item_id>/dispense/', views.dispense_medication, name='dispense_medication'),
     path('api/search-medications/', views.search_medications_api, name='search_medications_api'),
 ]
\ No newline at end of file
@@ -1,18 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.db import models
+from django.http import Http404, JsonResponse
 from consultations.models import Consultation
 from .models import Prescription, PrescriptionItem, Medication
 from .forms import PrescriptionForm, PrescriptionItemForm, MedicationSearchForm
+from .interactions import check_prescription, is_blocking
+from .rows import PrescriptionRow
 from security.models import AuditLog
+from baringo_hms import versions
+from baringo_hms.conditional import PageState
 
 @login_required
 def prescription_list(request):
     """
     List all prescriptions
     """
-    prescriptions = Prescription.objects.all().select_related('patient', 'prescribed_by')
+    prescriptions = Prescription.objects.all()
     
     # Filter by status
     status = request.GET.get('status')
@@ -20,7 +25,8 @@ def prescription_list(request):
         prescriptions = prescriptions.filter(status=status)
     
     context = {
-        'prescriptions': prescriptions.order_by('-prescribed_date')[:50],
+        'prescriptions': PrescriptionRow.fetch(prescriptions.order_by('-prescribed_date')[:50]),
+        'statuses': Prescription.STATUS_CHOICES,
     }
     return render(request, 'prescriptions/prescription_list.html', context)
 
@@ -30,13 +36,23 @@ def prescription_detail(request, pk):
     """
     View prescription details
     """
+    current = Prescription.objects.filter(pk=pk).values_list('patient__updated_at', 'consultation__updated_at').first()
+    if current is None:
+        raise Http404('No prescription matches the given query.')
+    # Prescription has no updated_at; its own saves and its items move this version on
+    state = PageState(request, ('prescriptions/prescription_detail.html', 'base.html'), current,
+                      versions.get_versions('prescription', pk, ('items',)))
+    not_modified = state.not_modified(request)
+    if not_modified:
+        return not_modified
+    
     prescription = get_object_or_404(Prescription, pk=pk)
     
     context = {
         'prescription': prescription,
         'items': prescription.items.all(),
     }
-    return render(request, 'prescriptions/prescription_detail.html', context)
+    return state.add_headers(render(request, 'prescriptions/prescription_detail.html', context))
 
 
 @login_required
@@ -92,8 +108,37 @@ def add_prescription_item(request, prescription_id):
         if form.is_valid():
             item = form.save(commit=False)
             item.prescription = prescription
+            
+            # Only alerts involving the new medication; the rest were seen already
+            alerts = [a for a in check_prescription(prescription, [item.medication])
+                      if item.medication in (a.medication, a.other)]
+            override = bool(request.POST.get('override'))
+            if is_blocking(alerts) and not override:
+                for alert in alerts:
+                    messages.error(request, f"{alert.severity.title()}: {_alert_text(alert)}")
+                messages.error(request, 'Medication not added. Review the alerts and resubmit with override to proceed.')
+                return render(request, 'prescriptions/add_item.html', {
+                    'form': form,
+                    'prescription': prescription,
+                    'items': prescription.items.all(),
+                    'alerts': alerts,
+                    'blocking': True,
+                })
+            
             item.save()
             
+            for alert in alerts:
+                messages.warning(request, f"{alert.severity.title()}: {_alert_text(alert)}")
+            if alerts and override:
+                AuditLog.objects.create(
+                    user=request.user,
+                    action='UPDATE',
+                    model_name='PrescriptionItem',
+                    object_id=item.id,
+                    details=f"Interaction alerts overridden for {item.medication.name}: "
+                            + '; '.join(_alert_text(a) for a in alerts)
+                )
+            
             messages.success(request, 'Medication added to prescription')
             return redirect('add_prescription_item', prescription_id=prescription_id)
     else:
@@ -110,6 +155,37 @@ def add_prescription_item(request, prescription_id):
     return render(request, 'prescriptions/add_item.html', context)
 
 
+def _alert_text(alert):
+    if alert.other is not None:
+        return f"{alert.medication.name} + {alert.other.name}: {alert.message}"
+    return f"{alert.medication.name}: {alert.message}"
+
+
+@login_required
+def check_prescription_api(request, prescription_id):
+    """
+    Interaction, allergy and duplicate-therapy alerts for a whole prescription.
+    
+    ?medication=<id> (repeatable) checks medications before they are added.
+    """
+    prescription = get_object_or_404(Prescription.objects.select_related('patient'), pk=prescription_id)
+    extra_ids = [pk for pk in request.GET.getlist('medication') if pk.isdigit()]
+    extra = list(Medication.objects.filter(pk__in=extra_ids)) if extra_ids else []
+    alerts = check_prescription(prescription, extra)
+    
+    return JsonResponse({
+        'prescription': prescription.id,
+        'blocking': is_blocking(alerts),
+        'alerts': [{
+            'kind': alert.kind,
+            'severity': alert.severity,
+            'medication': alert.medication.id,
+            'other': alert.other.id if alert.other is not None else None,
+            'message': _alert_text(alert),
+        } for alert in alerts],
+    })
+
+
 @login_required
 def dispense_medication(request, item_id):
     """
@@ -141,9 +217,9 @@ def dispense_medication(request, item_id):
 
 
 @login_required
-def search_medications_api(request):
+async def search_medications_api(request):
     """
-    AJAX endpoint for medication search
+    AJAX endpoint for medication search (async, see patient_search_api)
     """
     term = request.GET.get('term', '')
     if len(term) < 2:
@@ -154,16 +230,11 @@ def search_medications_api(request):
         models.Q(generic_name__icontains=term) |
         models.Q(brand_name__icontains=term),
         is_active=True
-    )[:15]
-    
-    results = []
-    for med in medications:
-        results.append({
-            'id': med.id,
-            'name': f"{med.name} {med.strength}",
-            'strength': med.strength,
-            'unit': med.unit,
-            'route': med.route,
-        })
-    
-    return JsonResponse(results, safe=False)
\ No newline at end of file
+    ).values_list('id', 'name', 'strength', 'unit', 'route')[:15]
+    
+    results = [
+        {'id': pk, 'name': f"{name} {strength}", 'strength': strength, 'unit': unit, 'route': route}
+        async for pk, name, strength, unit, route in medications
+    ]
+    
+    return JsonResponse(results, safe=False)
@@ -0,0 +1,303 @@
+import calendar
+import csv
+import hashlib
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.utils import timezone
+
+from consultations.models import Consultation, Diagnosis
+
+DEFAULT_DHIS2_SETTINGS = {
+    'ORG_UNIT': '',                 # facility org unit UID
+    'DATA_SET': '',
+    'ATTRIBUTE_OPTION_COMBO': '',
+    # indicator code / category option combo -> DHIS2 UID; unmapped
+    # entries are exported under their own codes
+    'DATA_ELEMENTS': {},
+    'CATEGORY_OPTION_COMBOS': {},
+    'OPEN_PERIOD_TIMEOUT': 5 * 60,  # cache lifetime while the month is still running
+    'CLOSED_PERIOD_TIMEOUT': 24 * 60 * 60,
+}
+
+# (key, label, from age, below age); age in whole years on the last day of the period
+AGE_BANDS = (
+    ('lt5', 'Under 5 years', 0, 5),
+    ('ge5', '5 years and over', 5, None),
+)
+GENDERS = (
+    ('M', 'Male'),
+    ('F', 'Female'),
+    ('O', 'Other'),
+)
+
+# source -> (model, date field, path to the patient)
+SOURCES = {
+    'visit': (Consultation, 'visit_date', 'patient__'),
+    'diagnosis': (Diagnosis, 'diagnosed_on', 'consultation__patient__'),
+}
+# Booked but never seen, or cancelled: not a visit
+EXCLUDED_VISIT_STATUSES = ('scheduled', 'cancelled')
+
+
+class Indicator:
+    """
+    One reported data element.
+
+    ``source`` says what is counted: 'visit' (consultations) or
+    'diagnosis' (coded diagnoses). ``codes`` are ICD-10 prefixes ('B5'
+    matches B50-B59) and ``visit_types`` restrict either source to some
+    visit types. Values are broken down by ``disaggregate``, any of 'age'
+    and 'gender'; ``age_bands`` limits which bands are reported.
+    """
+    def __init__(self, code, name, form, source, codes=(), visit_types=(), age_bands=None,
+                 disaggregate=('age',)):
+        self.code = code
+        self.name = name
+        self.form = form
+        self.source = source
+        self.codes = tuple(codes)
+        self.visit_types = tuple(visit_types)
+        self.age_bands = tuple(age_bands or [key for key, _, _, _ in AGE_BANDS])
+        self.disaggregate = tuple(disaggregate)
+
+    def __repr__(self):
+        return (f"Indicator({self.code!r}, {self.source!r}, {self.codes!r}, {self.visit_types!r}, "
+                f"{self.age_bands!r}, {self.disaggregate!r})")
+
+    def condition(self):
+        """
+        Row filter for this indicator, relative to its source model
+        """
+        condition = Q()
+        if self.codes:
+            prefixes = Q()
+            for prefix in self.codes:
+                prefixes |= Q(code__startswith=prefix)
+            condition &= prefixes
+        if self.visit_types:
+            field = 'visit_type__in' if self.source == 'visit' else 'consultation__visit_type__in'
+            condition &= Q(**{field: self.visit_types})
+        return condition
+
+    def combos(self):
+        """
+        Category option combos reported, as (key, label, age band, gender)
+        """
+        bands = [(key, label) for key, label, _, _ in AGE_BANDS if key in self.age_bands]
+        if 'age' in self.disaggregate and 'gender' in self.disaggregate:
+            return [(f'{band}_{sex}', f'{band_label}, {sex_label}', band, sex)
+                    for band, band_label in bands for sex, sex_label in GENDERS]
+        if 'age' in self.disaggregate:
+            return [(band, band_label, band, None) for band, band_label in bands]
+        if 'gender' in self.disaggregate:
+            return [(sex, sex_label, None, sex) for sex, sex_label in GENDERS]
+        return [('default', 'Total', None, None)]
+
+
+# MOH 717 (service workload) and MOH 705 (outpatient morbidity, 705A under
+# five / 705B five and over) figures
+INDICATORS = [
+    Indicator('OPD_VISITS', 'Outpatient attendances', 'MOH 717', 'visit', disaggregate=('age', 'gender')),
+    Indicator('OPD_NEW', 'New outpatient attendances', 'MOH 717', 'visit', visit_types=('new',)),
+    Indicator('OPD_REVISIT', 'Outpatient re-attendances', 'MOH 717', 'visit',
+              visit_types=('follow_up', 'review')),
+    Indicator('OPD_EMERGENCY', 'Emergency attendances', 'MOH 717', 'visit', visit_types=('emergency',)),
+    Indicator('OPD_REFERRAL_IN', 'Referrals in', 'MOH 717', 'visit', visit_types=('referral',)),
+    Indicator('DX_DIARRHOEA', 'Diarrhoea', 'MOH 705', 'diagnosis', codes=('A09',)),
+    Indicator('DX_TYPHOID', 'Typhoid fever', 'MOH 705', 'diagnosis', codes=('A01.0',)),
+    Indicator('DX_TUBERCULOSIS', 'Tuberculosis', 'MOH 705', 'diagnosis', codes=('A15', 'A16', 'A17', 'A18', 'A19')),
+    Indicator('DX_MALARIA', 'Malaria', 'MOH 705', 'diagnosis', codes=('B50', 'B51', 'B52', 'B53', 'B54')),
+    Indicator('DX_HIV', 'HIV disease', 'MOH 705', 'diagnosis', codes=('B20', 'B21', 'B22', 'B23', 'B24')),
+    Indicator('DX_INTESTINAL_WORMS', 'Intestinal worms', 'MOH 705', 'diagnosis',
+              codes=('B65', 'B76', 'B77', 'B79', 'B82')),
+    Indicator('DX_MALNUTRITION', 'Malnutrition', 'MOH 705', 'diagnosis', codes=('E40', 'E41', 'E42', 'E43', 'E44', 'E46')),
+    Indicator('DX_ANAEMIA', 'Anaemia', 'MOH 705', 'diagnosis', codes=('D50', 'D51', 'D52', 'D53', 'D6')),
+    Indicator('DX_URTI', 'Upper respiratory tract infections', 'MOH 705', 'diagnosis',
+              codes=('J00', 'J01', 'J02', 'J03', 'J04', 'J05', 'J06')),
+    Indicator('DX_PNEUMONIA', 'Pneumonia', 'MOH 705', 'diagnosis', codes=('J12', 'J13', 'J14', 'J15', 'J16', 'J17', 'J18')),
+    Indicator('DX_ASTHMA', 'Asthma', 'MOH 705', 'diagnosis', codes=('J45',)),
+    Indicator('DX_EAR_INFECTION', 'Ear infections', 'MOH 705', 'diagnosis', codes=('H65', 'H66')),
+    Indicator('DX_EYE_INFECTION', 'Eye infections', 'MOH 705', 'diagnosis', codes=('H10',)),
+    Indicator('DX_SKIN', 'Skin diseases', 'MOH 705', 'diagnosis', codes=('B35', 'B86', 'L')),
+    Indicator('DX_UTI', 'Urinary tract infection', 'MOH 705', 'diagnosis', codes=('N39.0',)),
+    Indicator('DX_DENTAL', 'Dental disorders', 'MOH 705', 'diagnosis', codes=('K02', 'K03', 'K04', 'K05', 'K08')),
+    Indicator('DX_HYPERTENSION', 'Hypertension', 'MOH 705', 'diagnosis', codes=('I10', 'I11', 'I12', 'I13', 'I15'),
+              age_bands=('ge5',)),
+    Indicator('DX_DIABETES', 'Diabetes', 'MOH 705', 'diagnosis', codes=('E10', 'E11', 'E12', 'E13', 'E14')),
+    Indicator('DX_MENTAL', 'Mental disorders', 'MOH 705', 'diagnosis', codes=('F',)),
+    Indicator('DX_INJURIES', 'Injuries and poisoning', 'MOH 705', 'diagnosis', codes=('S', 'T')),
+]
+
+# Cached results carry the definitions they were computed from
+DEFINITIONS_VERSION = hashlib.md5(repr((AGE_BANDS, INDICATORS)).encode()).hexdigest()[:12]
+
+
+def get_dhis2_settings():
+    config = dict(DEFAULT_DHIS2_SETTINGS)
+    config.update(getattr(settings, 'DHIS2', {}))
+    return config
+
+
+def format_period(year, month):
+    return f'{year:04d}{month:02d}'
+
+
+def parse_period(period):
+    """
+    DHIS2 monthly period ('202610') -> (first day, last day)
+    """
+    try:
+        if len(period) != 6:
+            raise ValueError
+        year, month = int(period[:4]), int(period[4:])
+        start = date(year, month, 1)
+    except (TypeError, ValueError):
+        raise ValueError(f"Not a monthly period: {period!r}")
+    return start, date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def _age_band(field, on):
+    """
+    CASE over date of birth putting each row in its age band on ``on``
+    """
+    whens = []
+    for key, _, low, high in AGE_BANDS:
+        condition = Q(**{f'{field}__lte': _years_before(on, low)})
+        if high is not None:
+            condition &= Q(**{f'{field}__gt': _years_before(on, high)})
+        whens.append(When(condition, then=Value(key)))
+    return Case(*whens, default=Value(''), output_field=CharField())
+
+
+def _tally(source, indicators, start, end):
+    """
+    One grouped query for all indicators of a source: a conditional count
+    per indicator, grouped by age band and gender.
+    Returns {(band, gender): {indicator code: count}}.
+    """
+    model, date_field, patient = SOURCES[source]
+    queryset = model.objects.filter(**{f'{date_field}__range': (start, end)})
+    if source == 'visit':
+        queryset = queryset.exclude(status__in=EXCLUDED_VISIT_STATUSES)
+    else:
+        queryset = queryset.exclude(code='')
+    aliases = {f'n{position}': indicator for position, indicator in enumerate(indicators)}
+    rows = (queryset
+            .annotate(band=_age_band(f'{patient}date_of_birth', end), sex=F(f'{patient}gender'))
+            .values('band', 'sex')
+            .annotate(**{alias: Count('pk', filter=indicator.condition() or None) for alias, indicator in aliases.items()})
+            .order_by())
+    return {(row['band'], row['sex']): {indicator.code: row[alias] for alias, indicator in aliases.items()}
+            for row in rows}
+
+
+def compute(period, refresh=False):
+    """
+    All indicators for a monthly period, cached. A handful of grouped
+    queries cover every indicator; closed months are cached for a day,
+    the running month for a few minutes. ``refresh`` recomputes.
+    """
+    config = get_dhis2_settings()
+    start, end = parse_period(period)
+    key = f'indicators:{DEFINITIONS_VERSION}:{period}'
+    if not refresh:
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+    started = time.monotonic()
+    cells = {}
+    for source in SOURCES:
+        indicators = [indicator for indicator in INDICATORS if indicator.source == source]
+        if indicators:
+            cells[source] = _tally(source, indicators, start, end)
+
+    values = {}
+    for indicator in INDICATORS:
+        tally = cells[indicator.source]
+        values[indicator.code] = {
+            combo: sum(counts[indicator.code] for (band, sex), counts in tally.items()
+                       if band in indicator.age_bands
+                       and (combo_band is None or band == combo_band)
+                       and (combo_sex is None or sex == combo_sex))
+            for combo, _, combo_band, combo_sex in indicator.combos()
+        }
+
+    result = {
+        'period': period,
+        'start': start,
+        'end': end,
+        'values': values,
+        'computed_at': timezone.now(),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    closed = end < timezone.localdate()
+    cache.set(key, result, config['CLOSED_PERIOD_TIMEOUT'] if closed else config['OPEN_PERIOD_TIMEOUT'])
+    return result
+
+
+def report_rows(result):
+    """
+    Report rows for display: each indicator with its combos and values
+    """
+    return [{
+        'code': indicator.code,
+        'name': indicator.name,
+        'form': indicator.form,
+        'cells': [(label, result['values'][indicator.code][combo]) for combo, label, _, _ in indicator.combos()],
+        'total': sum(result['values'][indicator.code].values()),
+    } for indicator in INDICATORS]
+
+
+def _data_values(result, config):
+    for indicator in INDICATORS:
+        for combo, _, _, _ in indicator.combos():
+            yield (
+                config['DATA_ELEMENTS'].get(indicator.code, indicator.code),
+                config['CATEGORY_OPTION_COMBOS'].get(combo, combo),
+                result['values'][indicator.code][combo],
+            )
+
+
+def data_value_set(result):
+    """
+    DHIS2 dataValueSet (JSON import format). Zeros are included so a
+    resubmission overwrites figures that have since gone to zero.
+    """
+    config = get_dhis2_settings()
+    value_set = {
+        'dataSet': config['DATA_SET'],
+        'period': result['period'],
+        'orgUnit': config['ORG_UNIT'],
+        'completeDate': timezone.localdate().isoformat(),
+        'dataValues': [],
+    }
+    if config['ATTRIBUTE_OPTION_COMBO']:
+        value_set['attributeOptionCombo'] = config['ATTRIBUTE_OPTION_COMBO']
+    for data_element, combo, value in _data_values(result, config):
+        value_set['dataValues'].append(
+            {'dataElement': data_element, 'categoryOptionCombo': combo, 'value': str(value)})
+    return value_set
+
+
+def write_csv(result, stream):
+    """
+    DHIS2 CSV import format, one data value per line
+    """
+    config = get_dhis2_settings()
+    writer = csv.writer(stream)
+    writer.writerow(['dataelement', 'period', 'orgunit', 'categoryoptioncombo', 'attributeoptioncombo', 'value'])
+    for data_element, combo, value in _data_values(result, config):
+        writer.writerow([data_element, result['period'], config['ORG_UNIT'], combo,
+                         config['ATTRIBUTE_OPTION_COMBO'], value])
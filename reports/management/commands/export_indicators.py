@@ -0,0 +1,35 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from reports.indicators import compute, data_value_set, write_csv
+
+
+class Command(BaseCommand):
+    help = 'Compute the monthly MOH 705/717 indicators and write them in DHIS2 import format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', required=True, help='DHIS2 monthly period, YYYYMM')
+        parser.add_argument('--format', choices=['json', 'csv'], default='json')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--refresh', action='store_true', help='Recompute instead of using cached figures')
+
+    def handle(self, *args, **options):
+        try:
+            result = compute(options['period'], refresh=options['refresh'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        stream = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            if options['format'] == 'json':
+                json.dump(data_value_set(result), stream, cls=DjangoJSONEncoder, indent=2)
+                stream.write('\n')
+            else:
+                write_csv(result, stream)
+        finally:
+            if options['output']:
+                stream.close()
+        self.stderr.write(f"Indicators for {result['period']} computed in {result['seconds']}s")
@@ -12,6 +12,9 @@ urlpatterns = [
     # Monthly reports
     path('monthly/', views.monthly_report, name='monthly_report'),
     
+    # MOH 705/717 indicators for DHIS2
+    path('indicators/', views.indicator_report, name='indicator_report'),
+    
     # You can add more report types as needed
     # path('weekly/', views.weekly_report, name='weekly_report'),
     # path('custom/', views.custom_report, name='custom_report'),
@@ -1,12 +1,18 @@
-from django.shortcuts import render
+from django.contrib import messages
+from django.shortcuts import redirect, render
 from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Sum, Avg
 from django.utils import timezone
 from datetime import timedelta, datetime
 from patients.models import Patient
 from consultations.models import Consultation
+from consultations.icd10 import chapter_counts, top_codes
+from patients.summary import summaries
+from security.models import AuditLog
+from .indicators import compute, data_value_set, format_period, report_rows, write_csv
 from prescriptions.models import Prescription
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from accounts.decorators import role_required
 import csv
 import json
 from reportlab.pdfgen import canvas
@@ -17,6 +23,7 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 
 @login_required
+@role_required('report_view')
 def report_dashboard(request):
     """
     Main reporting dashboard
@@ -31,6 +38,7 @@ def report_dashboard(request):
 
 
 @login_required
+@role_required('report_view')
 def daily_report(request):
     """
     Generate daily statistics
@@ -51,7 +59,8 @@ def daily_report(request):
         'emergencies': consultations.filter(visit_type='emergency').count(),
         'follow_ups': consultations.filter(visit_type='follow_up').count(),
         'by_department': consultations.values('doctor__department').annotate(count=Count('id')),
-        'top_diagnoses': consultations.values('diagnosis').annotate(count=Count('id')).order_by('-count')[:5],
+        'top_diagnoses': top_codes(report_date, report_date, limit=5),
+        'diagnosis_chapters': chapter_counts(report_date, report_date),
     }
     
     if request.GET.get('format') == 'csv':
@@ -63,6 +72,7 @@ def daily_report(request):
 
 
 @login_required
+@role_required('report_view')
 def monthly_report(request):
     """
     Generate monthly statistics
@@ -88,11 +98,54 @@ def monthly_report(request):
         'gender_distribution': consultations.values('patient__gender').annotate(count=Count('id')),
         'age_groups': get_age_distribution(consultations),
         'daily_trend': consultations.values('visit_date').annotate(count=Count('id')).order_by('visit_date'),
+        'top_diagnoses': top_codes(start_date, end_date),
+        'diagnosis_chapters': chapter_counts(start_date, end_date),
     }
     
     return render(request, 'reports/monthly_report.html', {'stats': stats})
 
 
+@login_required
+@role_required('report_view')
+def indicator_report(request):
+    """
+    Monthly MOH 705/717 indicators, with DHIS2 JSON and CSV export
+    """
+    today = timezone.now().date()
+    try:
+        period = format_period(int(request.GET.get('year', today.year)), int(request.GET.get('month', today.month)))
+        result = compute(period, refresh=request.GET.get('refresh') == '1')
+    except ValueError:
+        messages.error(request, 'Invalid reporting period')
+        return redirect('indicator_report')
+    
+    export = request.GET.get('format')
+    if export in ('json', 'csv'):
+        AuditLog.objects.create(
+            user=request.user,
+            action='EXPORT',
+            model_name='Indicator',
+            object_id=None,
+            details=f"Exported DHIS2 indicators for {period} as {export}"
+        )
+        if export == 'json':
+            response = JsonResponse(data_value_set(result))
+        else:
+            response = HttpResponse(content_type='text/csv')
+            write_csv(result, response)
+        response['Content-Disposition'] = f'attachment; filename="dhis2_{period}.{export}"'
+        return response
+    
+    context = {
+        'result': result,
+        'rows': report_rows(result),
+        'year': result['start'].year,
+        'month': result['start'].month,
+        'months': [(number, datetime(2000, number, 1).strftime('%B')) for number in range(1, 13)],
+    }
+    return render(request, 'reports/indicator_report.html', context)
+
+
 def generate_csv_report(stats):
     """
     Generate CSV report
@@ -107,6 +160,11 @@ def generate_csv_report(stats):
     writer.writerow(['New Patients', stats['new_patients']])
     writer.writerow(['Emergencies', stats['emergencies']])
     
+    writer.writerow([])
+    writer.writerow(['ICD-10', 'Diagnosis', 'Count'])
+    for row in stats['top_diagnoses']:
+        writer.writerow([row['code'], row['title'], row['count']])
+    
     return response
 
 
@@ -157,8 +215,10 @@ def get_age_distribution(consultations):
     """
     age_groups = {'0-18': 0, '19-35': 0, '36-50': 0, '51+': 0}
     
-    for consultation in consultations:
-        age = consultation.patient.age
+    patient_ids = list(consultations.values_list('patient_id', flat=True))
+    patients = summaries.get_many(patient_ids)
+    for patient_id in patient_ids:
+        age = patients[patient_id].age
         if age <= 18:
             age_groups['0-18'] += 1
         elif age <= 35:
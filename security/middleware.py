@@ -1,14 +1,27 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from django.utils import timezone
 from .models import AuditLog
+from .throttling import client_ip
+
+UNAUDITED_URLS = {'heartbeat', 'consultation_autosave'}
+
 
 class AuditMiddleware:
     """
     Middleware to log all requests
     """
+    sync_capable = True
+    async_capable = True
+    
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
     
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
         # Code to be executed for each request before the view is called
         response = self.get_response(request)
         
@@ -18,11 +31,23 @@ class AuditMiddleware:
         
         return response
     
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        
+        if request.method in ['POST', 'PUT', 'PATCH', 'DELETE'] and (await request.auser()).is_authenticated:
+            await sync_to_async(self.log_action)(request)
+        
+        return response
+    
     def log_action(self, request):
         # Don't log for static files
         if request.path.startswith('/static/') or request.path.startswith('/media/'):
             return
         
+        # Presence keep-alives and form autosaves are not user actions
+        if request.resolver_match and request.resolver_match.url_name in UNAUDITED_URLS:
+            return
+        
         # Determine action based on method and path
         if 'delete' in request.path.lower():
             action = 'DELETE'
@@ -38,14 +63,6 @@ class AuditMiddleware:
             action=action,
             model_name=request.resolver_match.app_name if request.resolver_match else 'Unknown',
             details=f"{request.method} {request.path}",
-            ip_address=self.get_client_ip(request),
+            ip_address=client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
         )
-    
-    def get_client_ip(self, request):
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
\ No newline at end of file
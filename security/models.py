@@ -31,6 +31,7 @@ class AuditLog(models.Model):
         indexes = [
             models.Index(fields=['user', 'timestamp']),
             models.Index(fields=['action', 'timestamp']),
+            models.Index(fields=['timestamp', 'id']),
         ]
     
     def __str__(self):
@@ -0,0 +1,217 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from baringo_hms.batching import BatchWriter
+
+DEFAULT_THROTTLE_SETTINGS = {
+    'CACHE_ALIAS': 'default',
+    'WINDOW': 15 * 60,          # sliding window for failure counters (seconds)
+    'USERNAME_LIMIT': 5,        # failures per username before lockout
+    'IP_LIMIT': 20,             # failures per client IP before lockout
+    'FREE_ATTEMPTS': 2,         # failures allowed before delays kick in
+    'BASE_DELAY': 2,            # first progressive delay (seconds), doubles each failure
+    'MAX_DELAY': 60,
+    'LOCKOUT': 15 * 60,         # cool-down before automatic unlock (seconds)
+    'ASYNC_PERSIST': True,      # write LoginAttempt rows from a background thread
+    'PERSIST_BATCH_SIZE': 100,
+    'PERSIST_INTERVAL': 2.0,
+    'TRUSTED_PROXIES': 0,       # reverse proxies in front of the app that append to X-Forwarded-For
+}
+
+
+def get_throttle_settings():
+    config = dict(DEFAULT_THROTTLE_SETTINGS)
+    config.update(getattr(settings, 'LOGIN_THROTTLE', {}))
+    return config
+
+
+def client_ip(request, config=None):
+    """
+    Address to throttle a request by. X-Forwarded-For entries are only
+    trusted as far as the configured proxies appended them; anything to
+    their left is supplied by the client.
+    """
+    proxies = (config or get_throttle_settings())['TRUSTED_PROXIES']
+    forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _token(value):
+    # Cache keys must be short and free of whitespace/control characters
+    return hashlib.sha1((value or '').strip().lower().encode()).hexdigest()[:20]
+
+
+class SlidingWindowCounter:
+    """
+    Approximate sliding-window counter stored in the cache.
+
+    Keeps one counter per fixed window and weights the previous window by
+    how much of it still overlaps the sliding window, so each hit costs a
+    single INCR plus one multi-get.
+    """
+    def __init__(self, cache, prefix, window):
+        self.cache = cache
+        self.prefix = prefix
+        self.window = window
+
+    def _key(self, token, bucket):
+        return f"{self.prefix}:{token}:{bucket}"
+
+    def _weighted(self, token, now, current=None):
+        bucket = int(now // self.window)
+        keys = [self._key(token, bucket - 1)]
+        if current is None:
+            keys.append(self._key(token, bucket))
+        values = self.cache.get_many(keys)
+        previous = values.get(keys[0], 0)
+        if current is None:
+            current = values.get(keys[1], 0)
+        overlap = 1 - (now % self.window) / self.window
+        return current + previous * overlap
+
+    def hit(self, token, now=None):
+        now = now or time.time()
+        key = self._key(token, int(now // self.window))
+        self.cache.add(key, 0, timeout=self.window * 2)
+        try:
+            current = self.cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(key, 1, timeout=self.window * 2)
+            current = 1
+        return self._weighted(token, now, current)
+
+    def count(self, token, now=None):
+        return self._weighted(token, now or time.time())
+
+    def reset(self, token, now=None):
+        bucket = int((now or time.time()) // self.window)
+        self.cache.delete_many([self._key(token, bucket), self._key(token, bucket - 1)])
+
+
+class LoginThrottle:
+    """
+    Brute-force protection for the login form.
+
+    Failures are counted per username and per client IP in the cache.
+    After FREE_ATTEMPTS failures each further attempt is delayed
+    exponentially; reaching a limit locks the username or IP out until the
+    cool-down expires. Nothing here touches the database.
+    """
+    def __init__(self, config=None):
+        self.config = config or get_throttle_settings()
+        self.cache = caches[self.config['CACHE_ALIAS']]
+        window = self.config['WINDOW']
+        self.user_counter = SlidingWindowCounter(self.cache, 'login:fail:user', window)
+        self.ip_counter = SlidingWindowCounter(self.cache, 'login:fail:ip', window)
+
+    def _block_keys(self, username, ip):
+        user_token, ip_token = _token(username), _token(ip)
+        return [
+            f"login:lock:user:{user_token}",
+            f"login:lock:ip:{ip_token}",
+            f"login:delay:user:{user_token}",
+        ]
+
+    def retry_after(self, username, ip):
+        """
+        Seconds until this username/IP may try again (0 if allowed)
+        """
+        now = time.time()
+        blocked_until = self.cache.get_many(self._block_keys(username, ip)).values()
+        remaining = max([until - now for until in blocked_until] or [0])
+        return max(0, int(remaining + 0.999))
+
+    def register_failure(self, username, ip):
+        """
+        Count a failed attempt and return the resulting retry-after in seconds
+        """
+        config = self.config
+        now = time.time()
+        user_failures = self.user_counter.hit(_token(username), now)
+        ip_failures = self.ip_counter.hit(_token(ip), now)
+        lock_user, lock_ip, delay_user = self._block_keys(username, ip)
+
+        lockout = config['LOCKOUT']
+        if user_failures >= config['USERNAME_LIMIT']:
+            self.cache.set(lock_user, now + lockout, timeout=lockout)
+            return lockout
+        if ip_failures >= config['IP_LIMIT']:
+            self.cache.set(lock_ip, now + lockout, timeout=lockout)
+            return lockout
+        if user_failures > config['FREE_ATTEMPTS']:
+            exponent = int(user_failures) - config['FREE_ATTEMPTS'] - 1
+            delay = min(config['BASE_DELAY'] * 2 ** exponent, config['MAX_DELAY'])
+            self.cache.set(delay_user, now + delay, timeout=delay)
+            return delay
+        return 0
+
+    def register_success(self, username):
+        lock_user, _, delay_user = self._block_keys(username, '')
+        self.user_counter.reset(_token(username))
+        self.cache.delete_many([lock_user, delay_user])
+
+    def unlock(self, username=None, ip=None):
+        """
+        Clear a lockout before its cool-down expires (admin action)
+        """
+        lock_user, lock_ip, delay_user = self._block_keys(username, ip)
+        if username:
+            self.user_counter.reset(_token(username))
+            self.cache.delete_many([lock_user, delay_user])
+        if ip:
+            self.ip_counter.reset(_token(ip))
+            self.cache.delete(lock_ip)
+
+
+class LoginAttemptRecorder(BatchWriter):
+    """
+    Buffers LoginAttempt rows and bulk-inserts them from a daemon thread,
+    so a password spray costs a queue append per request instead of an INSERT.
+    """
+    name = 'login-attempt-writer'
+
+    def record(self, username, ip_address, was_successful):
+        from .models import LoginAttempt
+
+        attempt = LoginAttempt(
+            username=(username or '')[:150],
+            ip_address=ip_address,
+            was_successful=was_successful,
+        )
+        if not get_throttle_settings()['ASYNC_PERSIST']:
+            attempt.save()
+            return
+        self.submit(attempt)
+
+    def write_batch(self, batch):
+        from .models import LoginAttempt
+
+        LoginAttempt.objects.bulk_create(batch)
+
+
+_throttle = None
+_recorder = None
+
+
+def get_login_throttle():
+    global _throttle
+    if _throttle is None:
+        _throttle = LoginThrottle()
+    return _throttle
+
+
+def get_attempt_recorder():
+    global _recorder
+    if _recorder is None:
+        config = get_throttle_settings()
+        _recorder = LoginAttemptRecorder(
+            batch_size=config['PERSIST_BATCH_SIZE'],
+            flush_interval=config['PERSIST_INTERVAL'],
+        )
+    return _recorder
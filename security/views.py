@@ -1,8 +1,8 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.core.paginator import Paginator
 from .models import AuditLog, LoginAttempt, DataBackup
+from baringo_hms.pagination import KeysetPaginator
 from django.http import HttpResponse
 import os
 import subprocess
@@ -32,12 +32,15 @@ def audit_logs(request):
     if date:
         logs = logs.filter(timestamp__date=date)
     
-    paginator = Paginator(logs, 50)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(logs, 50, ordering=('-timestamp', '-id'))
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     
     context = {
         'logs': page_obj,
+        'page_obj': page_obj,
         'actions': AuditLog.ACTION_CHOICES,
     }
     return render(request, 'security/audit_logs.html', context)
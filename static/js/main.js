@@ -48,4 +48,22 @@ function searchPatient() {
             }
         });
     }
-}
\ No newline at end of file
+}
+
+// Presence heartbeat - keeps idle but open pages on the "On Shift" board
+(function() {
+    let heartbeatUrl = $('meta[name="heartbeat-url"]').attr('content');
+    if (!heartbeatUrl) {
+        return;
+    }
+    setInterval(function() {
+        if (document.hidden) {
+            return;
+        }
+        $.ajax({
+            url: heartbeatUrl,
+            method: 'POST',
+            headers: {'X-CSRFToken': $('input[name="csrfmiddlewaretoken"]').val()}
+        });
+    }, 120000);
+})();
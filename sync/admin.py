@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from .models import MRNBlock, SyncConflict, SyncDevice
+
+
+@admin.register(SyncDevice)
+class SyncDeviceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'sub_county', 'last_pull_at', 'last_push_at', 'is_active')
+    list_filter = ('is_active', 'sub_county')
+    search_fields = ('name', 'user__username')
+
+
+@admin.register(MRNBlock)
+class MRNBlockAdmin(admin.ModelAdmin):
+    list_display = ('device', 'year', 'start', 'end', 'issued_at')
+    list_filter = ('year',)
+
+
+@admin.register(SyncConflict)
+class SyncConflictAdmin(admin.ModelAdmin):
+    list_display = ('table', 'object_id', 'field', 'resolution', 'needs_review', 'device', 'created_at')
+    list_filter = ('resolution', 'needs_review', 'table')
@@ -0,0 +1,31 @@
+import threading
+from contextlib import contextmanager
+
+from .models import ChangeLog
+
+_origin = threading.local()
+
+
+@contextmanager
+def applying_from(device):
+    """
+    Tag changes written inside the block with the device they came from
+    """
+    previous = getattr(_origin, 'device', None)
+    _origin.device = device
+    try:
+        yield
+    finally:
+        _origin.device = previous
+
+
+def record(table, object_ids, operation='upsert', fields=()):
+    """
+    Append change-log rows for ``object_ids`` of a synced table. Bulk
+    writes, which send no signals, call this directly.
+    """
+    device = getattr(_origin, 'device', None)
+    ChangeLog.objects.bulk_create([
+        ChangeLog(table=table, object_id=object_id, operation=operation, fields=list(fields), device=device)
+        for object_id in object_ids
+    ], batch_size=1000)
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from sync.changes import record
+from sync.models import ChangeLog
+from sync.tables import TABLES
+
+SEED_BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Log existing rows of synced tables so devices download them on first sync'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', choices=list(TABLES), action='append',
+                            help='Only these tables (repeatable); default all')
+        parser.add_argument('--force', action='store_true',
+                            help='Log rows even if the table already has change-log entries')
+
+    def handle(self, *args, **options):
+        for name in options['table'] or TABLES:
+            if ChangeLog.objects.filter(table=name).exists() and not options['force']:
+                self.stdout.write(f'{name}: already has change-log entries, skipped (use --force)')
+                continue
+            ids = TABLES[name].model.objects.order_by('pk').values_list('pk', flat=True)
+            total, batch = 0, []
+            for pk in ids.iterator(chunk_size=SEED_BATCH_SIZE):
+                batch.append(pk)
+                if len(batch) >= SEED_BATCH_SIZE:
+                    record(name, batch)
+                    total += len(batch)
+                    batch = []
+            record(name, batch)
+            total += len(batch)
+            self.stdout.write(f'{name}: {total} row(s) logged')
+        self.stdout.write(self.style.SUCCESS('Change log seeded'))
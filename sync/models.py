@@ -0,0 +1,125 @@
+from django.db import models
+from accounts.models import User
+
+
+class SyncDevice(models.Model):
+    """
+    Field laptop registered for offline work
+    """
+    id = models.UUIDField(primary_key=True)
+    name = models.CharField(max_length=100)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_devices')
+    sub_county = models.CharField(max_length=100, blank=True, help_text="Limit downloads to this sub-county; blank for all")
+    checkpoints = models.JSONField(default=dict, blank=True)
+    last_pull_at = models.DateTimeField(null=True, blank=True)
+    last_push_at = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_devices'
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+
+class ChangeLog(models.Model):
+    """
+    One row per change to a synced table. The id is the change version:
+    it only ever increases, so a device's checkpoint per table is the last
+    id it has applied.
+    """
+    OPERATION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    table = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES, default='upsert')
+    # Changed field names; empty when unknown (creation, bulk writes)
+    fields = models.JSONField(default=list, blank=True)
+    device = models.ForeignKey(SyncDevice, on_delete=models.SET_NULL, null=True, blank=True)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_changelog'
+        indexes = [
+            models.Index(fields=['table', 'id']),
+            models.Index(fields=['table', 'object_id', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.table}#{self.object_id} v{self.id} {self.operation}"
+
+
+class MRNBlock(models.Model):
+    """
+    Consecutive MRN numbers reserved for a device to register patients offline
+    """
+    device = models.ForeignKey(SyncDevice, on_delete=models.CASCADE, related_name='mrn_blocks')
+    year = models.PositiveSmallIntegerField()
+    start = models.PositiveIntegerField()
+    end = models.PositiveIntegerField()
+    issued_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_mrn_blocks'
+        ordering = ['year', 'start']
+    
+    def __str__(self):
+        return f"{self.device.name}: {self.year} {self.start}-{self.end}"
+    
+    @property
+    def size(self):
+        return self.end - self.start + 1
+
+
+class AppliedChange(models.Model):
+    """
+    Client changes already applied, so a push retried after a dropped
+    connection is not applied twice
+    """
+    change_id = models.UUIDField(primary_key=True)
+    device = models.ForeignKey(SyncDevice, on_delete=models.CASCADE, related_name='applied_changes')
+    table = models.CharField(max_length=50)
+    object_id = models.BigIntegerField(null=True)
+    result = models.JSONField(default=dict)
+    applied_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_applied_changes'
+
+
+class SyncConflict(models.Model):
+    """
+    Field edited both offline and on the server, with how it was resolved
+    """
+    RESOLUTION_CHOICES = [
+        ('server', 'Server value kept'),
+        ('client', 'Device value applied'),
+        ('merged', 'Values merged'),
+    ]
+    
+    device = models.ForeignKey(SyncDevice, on_delete=models.CASCADE, related_name='conflicts')
+    table = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    field = models.CharField(max_length=50)
+    server_value = models.TextField(blank=True)
+    client_value = models.TextField(blank=True)
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    needs_review = models.BooleanField(default=False)
+    reviewed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'sync_conflicts'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['needs_review', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.table}#{self.object_id}.{self.field} ({self.resolution})"
@@ -0,0 +1,326 @@
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from consultations.models import Consultation
+from patients.models import EmergencyContact, Patient
+from patients.mrn import allocate, format_mrn, parse_mrn
+
+from .changes import applying_from
+from .models import AppliedChange, ChangeLog, MRNBlock, SyncConflict
+from .tables import TABLE_FOR_MODEL, TABLES
+
+DEFAULT_SYNC_SETTINGS = {
+    'PULL_LIMIT': 5000,             # changes per table per pull; devices repeat while 'more'
+    # Only changes at least this old are pulled: a change-log id is taken at
+    # insert, so one whose transaction commits after a later id would be
+    # skipped by a device that already pulled past it
+    'SETTLE_SECONDS': 2,
+    'PUSH_LIMIT': 2000,             # changes accepted per push
+    'MAX_PUSH_BYTES': 50 * 1024 * 1024,
+    'COMPRESS_MIN_BYTES': 1024,
+    'MRN_BLOCK_SIZE': 100,
+    'MAX_OPEN_BLOCKS': 2,           # unused blocks a device may hold at once
+    # Patient conflict rules, for fields changed both offline and on the server.
+    # Identity fields keep the server value and are flagged for review; list
+    # fields are merged line by line; anything else goes to the later edit.
+    'SERVER_WINS_FIELDS': ('first_name', 'last_name', 'middle_name', 'date_of_birth', 'gender',
+                           'national_id', 'nhif_number'),
+    'MERGE_FIELDS': ('allergies', 'chronic_conditions', 'disabilities'),
+}
+
+ID_CHUNK = 500
+
+# Fields devices may write; system fields are always set by the server
+PATIENT_FIELDS = [field.name for field in Patient._meta.concrete_fields
+                  if field.name not in ('id', 'mrn', 'created_by', 'created_at', 'updated_at', 'is_active')]
+CONTACT_FIELDS = ['name', 'relationship', 'phone_number', 'is_primary']
+CONSULTATION_FIELDS = [field.name for field in Consultation._meta.concrete_fields
+                       if field.name not in ('id', 'patient', 'doctor', 'status', 'visit_time',
+                                             'created_by', 'created_at', 'updated_at')]
+
+
+class SyncError(Exception):
+    pass
+
+
+def get_sync_settings():
+    config = dict(DEFAULT_SYNC_SETTINGS)
+    config.update(getattr(settings, 'SYNC', {}))
+    return config
+
+
+# Pull
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def pull(device, checkpoints):
+    """
+    Changes since the device's per-table checkpoints.
+
+    Each table ships the current state of rows changed after its
+    checkpoint, read in one pass over the change log: several edits to a
+    row collapse into one, and rows are sent as value lists under a shared
+    column header. At most PULL_LIMIT changes per table are read; ``more``
+    tells the device to pull again from the returned checkpoints.
+    Changes younger than SETTLE_SECONDS wait for the next pull.
+    """
+    config = get_sync_settings()
+    limit = config['PULL_LIMIT']
+    settled = timezone.now() - timedelta(seconds=config['SETTLE_SECONDS'])
+    response = {'tables': {}, 'checkpoints': {}, 'more': False}
+    for name, table in TABLES.items():
+        since = int(checkpoints.get(name) or 0)
+        log = list(ChangeLog.objects
+                   .filter(table=name, id__gt=since, changed_at__lte=settled)
+                   .order_by('id')
+                   .values_list('id', 'object_id', 'operation')[:limit])
+        response['checkpoints'][name] = log[-1][0] if log else since
+        if not log:
+            continue
+        response['more'] = response['more'] or len(log) == limit
+
+        latest = {}
+        for _, object_id, operation in log:
+            latest[object_id] = operation
+        changed = [object_id for object_id, operation in latest.items() if operation == 'upsert']
+        columns = table.columns
+        rows = []
+        for chunk in _chunks(changed, ID_CHUNK):
+            rows.extend(table.scoped(device).filter(pk__in=chunk).order_by('pk').values_list(*columns))
+        # Deleted since, or outside the device's sub-county
+        found = {row[0] for row in rows}
+        deleted = [object_id for object_id, operation in latest.items()
+                   if operation == 'delete' or object_id not in found]
+        response['tables'][name] = {'columns': columns, 'rows': rows, 'deleted': deleted}
+
+    device.checkpoints = response['checkpoints']
+    device.last_pull_at = timezone.now()
+    device.save(update_fields=['checkpoints', 'last_pull_at'])
+    return response
+
+
+# Push
+
+def _resolve(device, change, mrn_key, ref_key, model):
+    """
+    Object referenced by a pushed change: an MRN, or the id of an earlier
+    change by the same device that created it (possibly in the same push)
+    """
+    if change.get(ref_key):
+        object_id = (AppliedChange.objects
+                     .filter(pk=change[ref_key], device=device, table=TABLE_FOR_MODEL[model].name)
+                     .values_list('object_id', flat=True).first())
+        if object_id is None:
+            raise SyncError(f"Unknown reference {change[ref_key]}")
+        return model.objects.get(pk=object_id)
+    if change.get(mrn_key):
+        patient = Patient.objects.filter(mrn=change[mrn_key]).first()
+        if patient is None:
+            raise SyncError(f"Unknown MRN {change[mrn_key]}")
+        return patient
+    raise SyncError('Change does not say which record it applies to')
+
+
+def _check_fields(data, allowed):
+    unknown = set(data) - set(allowed)
+    if unknown:
+        raise SyncError(f"Fields not accepted: {', '.join(sorted(unknown))}")
+
+
+def _assign(instance, data, allowed):
+    _check_fields(data, allowed)
+    for field, value in data.items():
+        setattr(instance, field, value)
+
+
+def _check_mrn(device, mrn):
+    parsed = parse_mrn(mrn)
+    if parsed is None:
+        raise SyncError(f"Malformed MRN {mrn!r}")
+    year, number = parsed
+    if not device.mrn_blocks.filter(year=year, start__lte=number, end__gte=number).exists():
+        raise SyncError(f"MRN {mrn} is not in a block reserved for this device")
+
+
+def create_patient(device, user, change):
+    _check_mrn(device, change.get('mrn'))
+    patient = Patient(mrn=change['mrn'], created_by=user)
+    _assign(patient, change['data'], PATIENT_FIELDS)
+    patient.full_clean(exclude=['created_by'])
+    patient.save()
+    return {'status': 'applied', 'pk': patient.pk}
+
+
+def _merge_lines(server, client):
+    lines = [line.strip() for line in f"{server or ''}\n{client or ''}".splitlines() if line.strip()]
+    return '\n'.join(dict.fromkeys(lines))
+
+
+def _as_text(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else str(value or '')
+
+
+def update_patient(device, user, change):
+    """
+    Apply an offline edit. ``base_version`` is the patient's last change
+    version the device had seen; fields the server also changed since then
+    are resolved by the rules in SYNC settings and recorded as conflicts.
+    """
+    config = get_sync_settings()
+    patient = _resolve(device, change, 'mrn', 'ref', Patient)
+    data = change['data']
+    _check_fields(data, PATIENT_FIELDS)
+
+    server_changes = (ChangeLog.objects
+                      .filter(table='patient', object_id=patient.pk, id__gt=int(change.get('base_version') or 0))
+                      .exclude(device=device))
+    server_fields, server_at = set(), None
+    for fields, changed_at in server_changes.values_list('fields', 'changed_at'):
+        server_fields.update(fields or PATIENT_FIELDS)
+        server_at = max(server_at, changed_at) if server_at else changed_at
+    modified_at = parse_datetime(change.get('modified_at') or '') or timezone.now()
+    if timezone.is_naive(modified_at):
+        modified_at = timezone.make_aware(modified_at)
+
+    conflicts, applied = [], {}
+    for field, value in data.items():
+        if field not in server_fields:
+            applied[field] = value
+            continue
+        current = getattr(patient, field)
+        if field in config['MERGE_FIELDS']:
+            resolution, applied[field] = 'merged', _merge_lines(current, value)
+        elif field in config['SERVER_WINS_FIELDS']:
+            resolution = 'server'
+        elif modified_at > server_at:
+            resolution, applied[field] = 'client', value
+        else:
+            resolution = 'server'
+        if _as_text(current) != _as_text(value):
+            conflicts.append(SyncConflict(
+                device=device, table='patient', object_id=patient.pk, field=field,
+                server_value=_as_text(current), client_value=_as_text(value),
+                resolution=resolution, needs_review=field in config['SERVER_WINS_FIELDS'],
+            ))
+
+    _assign(patient, applied, PATIENT_FIELDS)
+    if applied:
+        patient.full_clean(exclude=[field.name for field in Patient._meta.fields if field.name not in applied])
+        patient.save(update_fields=[*applied, 'updated_at'])
+    SyncConflict.objects.bulk_create(conflicts)
+    return {
+        'status': 'conflict' if conflicts else 'applied',
+        'pk': patient.pk,
+        'conflicts': [{'field': c.field, 'resolution': c.resolution, 'server_value': c.server_value}
+                      for c in conflicts],
+    }
+
+
+def create_emergency_contact(device, user, change):
+    contact = EmergencyContact(patient=_resolve(device, change, 'patient_mrn', 'patient_ref', Patient))
+    _assign(contact, change['data'], CONTACT_FIELDS)
+    contact.full_clean()
+    contact.save()
+    return {'status': 'applied', 'pk': contact.pk}
+
+
+def create_consultation(device, user, change):
+    data = dict(change['data'])
+    visit_date = data.pop('visit_date', None)
+    consultation = Consultation(
+        patient=_resolve(device, change, 'patient_mrn', 'patient_ref', Patient),
+        doctor=user if user.role == 'doctor' else None,
+        status='completed',
+        created_by=user,
+    )
+    _assign(consultation, data, CONSULTATION_FIELDS)
+    consultation.full_clean(exclude=['visit_date', 'doctor', 'created_by'])
+    consultation.save()
+    if visit_date:
+        # visit_date is auto_now_add; keep the day the visit happened offline
+        Consultation.objects.filter(pk=consultation.pk).update(visit_date=date.fromisoformat(visit_date))
+    return {'status': 'applied', 'pk': consultation.pk}
+
+
+HANDLERS = {
+    ('patient', 'create'): create_patient,
+    ('patient', 'update'): update_patient,
+    ('emergency_contact', 'create'): create_emergency_contact,
+    ('consultation', 'create'): create_consultation,
+}
+
+
+def push(device, user, changes):
+    """
+    Apply changes recorded offline, in order. Each change commits on its
+    own and is remembered by id, so a retried push skips what was already
+    applied. Returns one result per change.
+    """
+    config = get_sync_settings()
+    if len(changes) > config['PUSH_LIMIT']:
+        raise SyncError(f"At most {config['PUSH_LIMIT']} changes per push")
+    results = []
+    for change in changes:
+        change_id = change.get('id')
+        previous = AppliedChange.objects.filter(pk=change_id).values_list('result', flat=True).first()
+        if previous is not None:
+            results.append({**previous, 'duplicate': True})
+            continue
+        handler = HANDLERS.get((change.get('table'), change.get('op')))
+        try:
+            if handler is None:
+                raise SyncError(f"Unsupported change {change.get('table')}/{change.get('op')}")
+            with transaction.atomic(), applying_from(device):
+                result = {'id': change_id, **handler(device, user, change)}
+                AppliedChange.objects.create(change_id=change_id, device=device, table=change['table'],
+                                             object_id=result['pk'], result=result)
+        except (SyncError, ValidationError, IntegrityError, KeyError, TypeError, ValueError) as exc:
+            detail = exc.message_dict if isinstance(exc, ValidationError) and hasattr(exc, 'error_dict') else str(exc)
+            result = {'id': change_id, 'status': 'rejected', 'error': detail}
+        results.append(result)
+
+    device.last_push_at = timezone.now()
+    device.save(update_fields=['last_push_at'])
+    return results
+
+
+# MRN blocks
+
+def _used(block):
+    return Patient.objects.filter(mrn__gte=format_mrn(block.year, block.start),
+                                  mrn__lte=format_mrn(block.year, block.end)).count()
+
+
+def open_blocks(device):
+    year = timezone.now().year
+    return [block for block in device.mrn_blocks.filter(year=year) if _used(block) < block.size]
+
+
+def reserve_mrn_block(device):
+    """
+    Reserve the next MRN_BLOCK_SIZE numbers of the shared sequence for a
+    device. Refused while it still holds MAX_OPEN_BLOCKS unused blocks.
+    """
+    config = get_sync_settings()
+    current = open_blocks(device)
+    if len(current) >= config['MAX_OPEN_BLOCKS']:
+        raise SyncError(f"Device already holds {len(current)} unused MRN blocks")
+    year, start = allocate(config['MRN_BLOCK_SIZE'])
+    block = MRNBlock.objects.create(device=device, year=year, start=start, end=start + config['MRN_BLOCK_SIZE'] - 1)
+    return current + [block]
+
+
+def pending_changes(device):
+    """
+    Change-log entries the device has not pulled yet, across all tables
+    """
+    return sum(ChangeLog.objects.filter(table=name, id__gt=int(device.checkpoints.get(name) or 0)).count()
+               for name in TABLES)
@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from patients.models import Patient
+
+from .changes import record
+from .tables import TABLE_FOR_MODEL, TABLES
+
+# Always rewritten on save; not a change worth shipping on its own
+IGNORED_FIELDS = {'updated_at'}
+
+
+@receiver(pre_save, sender=Patient)
+def remember_patient_changes(sender, instance, update_fields=None, **kwargs):
+    # Field-level changes drive conflict resolution for offline edits
+    if instance.pk is None:
+        instance._sync_fields = []
+    elif update_fields:
+        instance._sync_fields = sorted(set(update_fields) - IGNORED_FIELDS)
+    else:
+        columns = [c for c in TABLES['patient'].columns if c not in IGNORED_FIELDS]
+        old = Patient.objects.filter(pk=instance.pk).values(*columns).first()
+        instance._sync_fields = [c for c in columns if old[c] != getattr(instance, c)] if old else []
+
+
+def log_save(sender, instance, created, update_fields=None, **kwargs):
+    fields = getattr(instance, '_sync_fields', None)
+    if not created and fields == []:
+        return  # saved without changing anything
+    if fields is None:
+        fields = sorted(set(update_fields or ()) - IGNORED_FIELDS)
+    record(TABLE_FOR_MODEL[sender].name, [instance.pk], fields=[] if created else fields)
+
+
+def log_delete(sender, instance, **kwargs):
+    record(TABLE_FOR_MODEL[sender].name, [instance.pk], operation='delete')
+
+
+for model in TABLE_FOR_MODEL:
+    post_save.connect(log_save, sender=model, dispatch_uid=f'sync-save-{model._meta.label}')
+    post_delete.connect(log_delete, sender=model, dispatch_uid=f'sync-delete-{model._meta.label}')
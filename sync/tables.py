@@ -0,0 +1,39 @@
+from consultations.models import Consultation, Diagnosis, VitalSigns
+from patients.models import EmergencyContact, Patient
+
+
+class SyncTable:
+    """
+    A table shipped to devices: its model, the columns sent and how rows
+    are limited to a device's sub-county
+    """
+    def __init__(self, name, model, exclude=(), patient_path=None):
+        self.name = name
+        self.model = model
+        self.exclude = set(exclude)
+        self.patient_path = patient_path
+
+    @property
+    def columns(self):
+        return [field.attname for field in self.model._meta.concrete_fields if field.name not in self.exclude]
+
+    def scoped(self, device):
+        queryset = self.model.objects.all()
+        if device.sub_county and self.patient_path is not None:
+            prefix = f'{self.patient_path}__' if self.patient_path else ''
+            queryset = queryset.filter(**{f'{prefix}sub_county': device.sub_county})
+        return queryset
+
+
+# Order matters: devices apply tables in this order, parents first
+TABLES = {
+    table.name: table for table in (
+        SyncTable('patient', Patient, exclude=('created_by',), patient_path=''),
+        SyncTable('emergency_contact', EmergencyContact, patient_path='patient'),
+        SyncTable('consultation', Consultation, exclude=('created_by',), patient_path='patient'),
+        SyncTable('diagnosis', Diagnosis, patient_path='consultation__patient'),
+        SyncTable('vital_signs', VitalSigns, patient_path='patient'),
+    )
+}
+
+TABLE_FOR_MODEL = {table.model: table for table in TABLES.values()}
@@ -0,0 +1,200 @@
+import json
+import uuid
+from datetime import date, timedelta
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import User
+from consultations.models import Consultation
+from patients.models import Patient
+from patients.mrn import format_mrn
+
+from . import views
+from .models import AppliedChange, ChangeLog, SyncConflict, SyncDevice
+from .protocol import SyncError, pull, push, reserve_mrn_block
+
+PATIENT = {
+    'first_name': 'Chebet',
+    'last_name': 'Kiprop',
+    'date_of_birth': '1990-01-01',
+    'gender': 'F',
+    'phone_number': '+254700000000',
+    'sub_county': 'Marigat',
+    'village': 'Kampi ya Samaki',
+    'next_of_kin_name': 'Kibet',
+    'next_of_kin_relationship': 'Spouse',
+    'next_of_kin_phone': '+254700000001',
+}
+
+
+def make_patient(mrn, **fields):
+    data = {**PATIENT, 'date_of_birth': date(1990, 1, 1), **fields}
+    return Patient.objects.create(mrn=mrn, **data)
+
+
+class SyncTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='nurse', password='x', role='nurse')
+        self.device = SyncDevice.objects.create(id=uuid.uuid4(), name='Laptop', user=self.user, sub_county='Marigat')
+
+    def settle(self):
+        # Age every change past the settle window
+        ChangeLog.objects.update(changed_at=timezone.now() - timedelta(minutes=1))
+
+
+class PullTests(SyncTestCase):
+    def test_ships_changed_rows_and_advances_checkpoints(self):
+        patient = make_patient('BCH-2026-00001')
+        self.settle()
+        response = pull(self.device, {})
+        table = response['tables']['patient']
+        self.assertEqual([row[0] for row in table['rows']], [patient.pk])
+        self.assertEqual(response['checkpoints']['patient'], ChangeLog.objects.get(table='patient').pk)
+        self.assertFalse(response['more'])
+
+        again = pull(self.device, response['checkpoints'])
+        self.assertNotIn('patient', again['tables'])
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.checkpoints, response['checkpoints'])
+
+    def test_several_edits_collapse_into_one_row(self):
+        patient = make_patient('BCH-2026-00001')
+        patient.village = 'Loboi'
+        patient.save()
+        self.settle()
+        rows = pull(self.device, {})['tables']['patient']['rows']
+        self.assertEqual(len(rows), 1)
+
+    def test_recent_changes_wait_for_the_settle_window(self):
+        make_patient('BCH-2026-00001')
+        response = pull(self.device, {})
+        self.assertNotIn('patient', response['tables'])
+        self.assertEqual(response['checkpoints']['patient'], 0)
+
+    def test_rows_outside_the_sub_county_are_sent_as_deleted(self):
+        patient = make_patient('BCH-2026-00001', sub_county='Mogotio')
+        self.settle()
+        table = pull(self.device, {})['tables']['patient']
+        self.assertEqual(table['rows'], [])
+        self.assertEqual(table['deleted'], [patient.pk])
+
+    @override_settings(SYNC={'PULL_LIMIT': 1})
+    def test_more_when_the_limit_is_reached(self):
+        make_patient('BCH-2026-00001')
+        make_patient('BCH-2026-00002')
+        self.settle()
+        response = pull(self.device, {})
+        self.assertTrue(response['more'])
+        self.assertEqual(len(response['tables']['patient']['rows']), 1)
+
+    def test_non_numeric_checkpoint_is_a_bad_request(self):
+        request = RequestFactory().post('/sync/pull/', json.dumps({
+            'device': str(self.device.pk), 'checkpoints': {'patient': 'latest'},
+        }), content_type='application/json')
+        request.user = self.user
+        response = views.pull_changes(request)
+        self.assertEqual(response.status_code, 400)
+
+
+class PushTests(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.block = reserve_mrn_block(self.device)[0]
+
+    def create_change(self, mrn=None, **data):
+        return {'id': str(uuid.uuid4()), 'table': 'patient', 'op': 'create',
+                'mrn': mrn or format_mrn(self.block.year, self.block.start), 'data': {**PATIENT, **data}}
+
+    def test_creates_patient_with_reserved_mrn(self):
+        change = self.create_change()
+        [result] = push(self.device, self.user, [change])
+        self.assertEqual(result['status'], 'applied')
+        self.assertTrue(Patient.objects.filter(mrn=change['mrn']).exists())
+        self.assertEqual(ChangeLog.objects.get(table='patient').device, self.device)
+
+    def test_rejects_mrn_outside_the_devices_blocks(self):
+        [result] = push(self.device, self.user, [self.create_change(mrn=format_mrn(self.block.year, 99999))])
+        self.assertEqual(result['status'], 'rejected')
+        self.assertFalse(Patient.objects.exists())
+
+    def test_retried_push_is_not_applied_twice(self):
+        change = self.create_change()
+        push(self.device, self.user, [change])
+        [result] = push(self.device, self.user, [change])
+        self.assertTrue(result['duplicate'])
+        self.assertEqual(Patient.objects.count(), 1)
+        self.assertEqual(AppliedChange.objects.count(), 1)
+
+    def test_later_change_can_reference_an_earlier_one(self):
+        change = self.create_change()
+        consultation = {'id': str(uuid.uuid4()), 'table': 'consultation', 'op': 'create', 'patient_ref': change['id'],
+                        'data': {'chief_complaint': 'Fever', 'diagnosis': 'Malaria', 'visit_date': '2026-10-10'}}
+        results = push(self.device, self.user, [change, consultation])
+        self.assertEqual([result['status'] for result in results], ['applied', 'applied'])
+        patient = Patient.objects.get(mrn=change['mrn'])
+        self.assertEqual(Consultation.objects.get(patient=patient).visit_date, date(2026, 10, 10))
+
+    def test_references_are_limited_to_the_devices_own_changes(self):
+        change = self.create_change()
+        push(self.device, self.user, [change])
+        other = SyncDevice.objects.create(id=uuid.uuid4(), name='Tablet', user=self.user, sub_county='Marigat')
+        consultation = {'id': str(uuid.uuid4()), 'table': 'consultation', 'op': 'create', 'patient_ref': change['id'],
+                        'data': {'chief_complaint': 'Fever', 'diagnosis': 'Malaria'}}
+        [result] = push(other, self.user, [consultation])
+        self.assertEqual(result['status'], 'rejected')
+        self.assertFalse(Consultation.objects.exists())
+
+    def test_unknown_fields_are_rejected(self):
+        [result] = push(self.device, self.user, [self.create_change(is_active=False)])
+        self.assertEqual(result['status'], 'rejected')
+
+
+class ConflictTests(SyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patient = make_patient('BCH-2026-00001', allergies='Penicillin')
+        self.base_version = ChangeLog.objects.latest('id').pk
+        # The server edits the record after the device last pulled it
+        self.patient.national_id = '1234567'
+        self.patient.allergies = 'Penicillin\nSulfa'
+        self.patient.phone_number = '+254711111111'
+        self.patient.save()
+
+    def update(self, modified_at, **data):
+        change = {'id': str(uuid.uuid4()), 'table': 'patient', 'op': 'update', 'mrn': self.patient.mrn,
+                  'base_version': self.base_version, 'modified_at': modified_at.isoformat(), 'data': data}
+        [result] = push(self.device, self.user, [change])
+        self.patient.refresh_from_db()
+        return result
+
+    def test_identity_fields_keep_the_server_value_for_review(self):
+        result = self.update(timezone.now() + timedelta(minutes=5), national_id='7654321')
+        self.assertEqual(result['status'], 'conflict')
+        self.assertEqual(self.patient.national_id, '1234567')
+        self.assertTrue(SyncConflict.objects.get(field='national_id').needs_review)
+
+    def test_list_fields_are_merged(self):
+        self.update(timezone.now(), allergies='Penicillin\nAspirin')
+        self.assertEqual(self.patient.allergies, 'Penicillin\nSulfa\nAspirin')
+
+    def test_other_fields_go_to_the_later_edit(self):
+        self.update(timezone.now() - timedelta(hours=1), phone_number='+254722222222')
+        self.assertEqual(self.patient.phone_number, '+254711111111')
+        self.update(timezone.now() + timedelta(hours=1), phone_number='+254733333333')
+        self.assertEqual(self.patient.phone_number, '+254733333333')
+
+    def test_fields_the_server_did_not_touch_apply_without_conflict(self):
+        result = self.update(timezone.now(), village='Loboi')
+        self.assertEqual(result['status'], 'applied')
+        self.assertEqual(self.patient.village, 'Loboi')
+
+
+class MRNBlockTests(SyncTestCase):
+    @override_settings(SYNC={'MRN_BLOCK_SIZE': 10, 'MAX_OPEN_BLOCKS': 2})
+    def test_blocks_do_not_overlap_and_are_capped(self):
+        reserve_mrn_block(self.device)
+        first, second = reserve_mrn_block(self.device)
+        self.assertEqual(second.start, first.end + 1)
+        with self.assertRaises(SyncError):
+            reserve_mrn_block(self.device)
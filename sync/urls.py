@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('', views.device_list, name='sync_device_list'),
+    path('devices/', views.register_device, name='sync_register_device'),
+    path('devices/<uuid:pk>/toggle/', views.device_action, name='sync_device_action'),
+    path('conflicts/<int:pk>/review/', views.review_conflict, name='sync_review_conflict'),
+    path('pull/', views.pull_changes, name='sync_pull'),
+    path('push/', views.push_changes, name='sync_push'),
+    path('mrn-blocks/', views.mrn_block, name='sync_mrn_block'),
+]
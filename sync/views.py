@@ -0,0 +1,184 @@
+import gzip
+import json
+import uuid
+from functools import wraps
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+
+from accounts.decorators import role_required
+from accounts.permissions import get_access
+from patients.mrn import format_mrn
+from security.models import AuditLog
+
+from .models import SyncConflict, SyncDevice
+from .protocol import SyncError, get_sync_settings, pull, push, pending_changes, reserve_mrn_block
+from .tables import TABLES
+
+
+def _read_json(request):
+    """
+    Request body as JSON, gunzipped when the device compressed it. Read
+    from the stream so large pushes are not held against the form upload limit.
+    """
+    limit = get_sync_settings()['MAX_PUSH_BYTES']
+    stream = gzip.GzipFile(fileobj=request) if request.headers.get('Content-Encoding') == 'gzip' else request
+    body = stream.read(limit + 1)
+    if len(body) > limit:
+        raise SyncError('Request body too large')
+    return json.loads(body or b'{}')
+
+
+def _json(request, payload, status=200):
+    """
+    Compact JSON, gzipped when the device accepts it and it is worth it
+    """
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    response = HttpResponse(content_type='application/json', status=status)
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and len(body) >= get_sync_settings()['COMPRESS_MIN_BYTES']:
+        body = gzip.compress(body, compresslevel=6)
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response.content = body
+    return response
+
+
+def sync_endpoint(device_required=True):
+    """
+    JSON endpoint for field devices: parses the body and loads the
+    caller's device from its ``device`` id
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        @login_required
+        @require_POST
+        def _wrapped(request, *args, **kwargs):
+            if 'offline_sync' not in get_access(request):
+                return JsonResponse({'error': 'Access denied'}, status=403)
+            try:
+                payload = _read_json(request)
+            except (SyncError, ValueError, OSError) as exc:
+                return JsonResponse({'error': f'Invalid request: {exc}'}, status=400)
+            if not isinstance(payload, dict):
+                return JsonResponse({'error': 'Invalid request: expected a JSON object'}, status=400)
+            device = None
+            if device_required:
+                try:
+                    device = SyncDevice.objects.get(pk=payload.get('device'), user=request.user, is_active=True)
+                except (SyncDevice.DoesNotExist, ValidationError):
+                    return JsonResponse({'error': 'Unknown or inactive device'}, status=403)
+            try:
+                return view_func(request, payload, device, *args, **kwargs)
+            except SyncError as exc:
+                return JsonResponse({'error': str(exc)}, status=409)
+        return _wrapped
+    return decorator
+
+
+@sync_endpoint(device_required=False)
+def register_device(request, payload, device):
+    """
+    Register a laptop: {name, sub_county}
+    """
+    device = SyncDevice.objects.create(
+        id=uuid.uuid4(),
+        name=str(payload.get('name') or 'Field device')[:100],
+        sub_county=str(payload.get('sub_county') or '')[:100],
+        user=request.user,
+    )
+    AuditLog.objects.create(
+        user=request.user,
+        action='CREATE',
+        model_name='SyncDevice',
+        object_id=None,
+        details=f"Registered sync device {device.name} ({device.pk})"
+    )
+    return _json(request, {'device': str(device.pk), 'checkpoints': {}}, status=201)
+
+
+@sync_endpoint()
+def pull_changes(request, payload, device):
+    """
+    Changes since {checkpoints: {table: version}}
+    """
+    checkpoints = payload.get('checkpoints') or {}
+    try:
+        checkpoints = {name: int(checkpoints.get(name) or 0) for name in TABLES}
+    except (AttributeError, TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid request: checkpoints must be change versions'}, status=400)
+    return _json(request, pull(device, checkpoints))
+
+
+@sync_endpoint()
+def push_changes(request, payload, device):
+    """
+    Apply offline changes: {changes: [{id, table, op, data, ...}]}
+    """
+    results = push(device, request.user, payload.get('changes') or [])
+    applied = sum(1 for result in results if result['status'] != 'rejected' and not result.get('duplicate'))
+    if applied:
+        AuditLog.objects.create(
+            user=request.user,
+            action='UPDATE',
+            model_name='SyncDevice',
+            object_id=None,
+            details=f"Synced {applied} offline change(s) from {device.name}"
+        )
+    return _json(request, {'results': results})
+
+
+@sync_endpoint()
+def mrn_block(request, payload, device):
+    """
+    Reserve MRNs for offline registration
+    """
+    blocks = reserve_mrn_block(device)
+    return _json(request, {'blocks': [
+        {'year': block.year, 'start': block.start, 'end': block.end,
+         'first': format_mrn(block.year, block.start), 'last': format_mrn(block.year, block.end)}
+        for block in blocks
+    ]}, status=201)
+
+
+@login_required
+@role_required('sync_manage')
+def device_list(request):
+    """
+    Registered devices with how far behind they are, and conflicts waiting
+    for review
+    """
+    devices = list(SyncDevice.objects.select_related('user'))
+    for device in devices:
+        device.behind = pending_changes(device) if device.last_pull_at else None
+    
+    context = {
+        'devices': devices,
+        'conflicts': SyncConflict.objects.filter(needs_review=True).select_related('device')[:100],
+    }
+    return render(request, 'sync/device_list.html', context)
+
+
+@login_required
+@role_required('sync_manage')
+@require_POST
+def device_action(request, pk):
+    device = get_object_or_404(SyncDevice, pk=pk)
+    device.is_active = not device.is_active
+    device.save(update_fields=['is_active'])
+    messages.success(request, f"{device.name} {'enabled' if device.is_active else 'disabled'}")
+    return redirect('sync_device_list')
+
+
+@login_required
+@role_required('sync_manage')
+@require_POST
+def review_conflict(request, pk):
+    updated = SyncConflict.objects.filter(pk=pk, needs_review=True).update(needs_review=False, reviewed_by=request.user)
+    if updated:
+        messages.success(request, 'Conflict marked as reviewed')
+    return redirect('sync_device_list')